@@ -0,0 +1,433 @@
+"""
+Versioned JSON API for todos.
+
+This blueprint exposes the same operations as the HTML routes in `main`, but
+mutations answer with just the changed todo and the refreshed dashboard
+counters, so a client can patch its view instead of reloading `/list`.
+
+Blueprint
+---------
+api : Flask Blueprint mounted at `/api/v1`
+
+Routes
+------
+- `GET /api/v1/todos` : A page of todos (`todo_status`, `sort`, `limit`, `after`, `before`).
+- `POST /api/v1/todos` : Creates a todo from `{"title", "due_time"}`.
+- `GET /api/v1/todos/<id>` : A single todo.
+- `PATCH /api/v1/todos/<id>` : Updates `title` and/or `due_time`.
+- `PUT /api/v1/todos/<id>/status` : Moves a todo to `{"status": "p" | "s" | "f"}`.
+- `DELETE /api/v1/todos/<id>` : Deletes a todo.
+- `POST /api/v1/todos/bulk/status` : Moves `{"ids": [...]}` or `{"filter": ...}` to `{"status"}`.
+- `POST /api/v1/todos/bulk/delete` : Deletes `{"ids": [...]}` or `{"filter": ...}`.
+- `POST /api/v1/todos/import` : Creates todos from a CSV (`text/csv`) or JSON Lines body.
+- `GET /api/v1/todos/export` : Streams the todos as CSV or JSON Lines (`format`, `todo_status`, `sort`).
+- `GET /api/v1/todos/search` : A page of todos whose title matches `q`, best first (`todo_status`, `page`, `limit`).
+- `GET /api/v1/todos/archive` : A page of archived todos, most recently due first (`todo_status`, `limit`, `after`, `before`).
+- `GET /api/v1/counters` : The dashboard counters.
+
+Conventions
+-----------
+- Authentication uses the Flask-Login session; unauthenticated calls get 401.
+- Mutations need the CSRF token in the `X-CSRFToken` header.
+- Request bodies are JSON objects; a body of another type, or a field of the
+  wrong type, gets a 400.
+- Times are ISO 8601 strings (`YYYY-MM-DDTHH:MM[:SS]`). A time with a UTC
+  offset (`Z`, `+02:00`) is converted to the server's local time.
+- Errors are returned as `{"error": "<message>"}` with a 4xx status, or a
+  503 with `Retry-After` when a group-committed write waited too long and
+  was not applied.
+"""
+
+import csv
+from datetime import datetime
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
+from flask_login import login_required, current_user
+from . import services, importer, export, search
+from .groupcommit import WriteTimeout
+from .models import db
+from .queries import todo_page, archive_page
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+LIST_STATUSES = ('p', 's', 'f', 'u', 'd')
+LIST_SORTS = ('due_time', 'created_time')
+
+
+def todo_to_dict(todo):
+    """Serializes a todo for the API."""
+    return {
+        'todo_id': todo.todo_id,
+        'title': todo.title,
+        'status': todo.status,
+        'created_time': todo.created_time.isoformat(),
+        'due_time': todo.due_time.isoformat()
+    }
+
+
+def json_body():
+    """
+    The JSON object sent with the request, empty if there is none.
+
+    Raises:
+        - ValueError if the body is JSON of another type (e.g. a list).
+    """
+    data = request.get_json(silent=True)
+    if data is None:
+        return {}
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    return data
+
+
+def parse_due_time(value):
+    """
+    Parses an ISO 8601 due time from a request body, converting one with a
+    UTC offset to the server's local time.
+
+    Raises:
+        - ValueError if the value is missing or malformed.
+    """
+    if not isinstance(value, str) or not value:
+        raise ValueError("'due_time' must be an ISO 8601 date time")
+    due_time = datetime.fromisoformat(value)
+    if due_time.tzinfo is not None:
+        due_time = due_time.astimezone().replace(tzinfo=None)
+    return due_time
+
+
+def parse_status(value):
+    """
+    Checks a target status from a request body.
+
+    Raises:
+        - ValueError unless it is 'p', 's' or 'f'.
+    """
+    if not isinstance(value, str) or value not in services.STATUS_COUNTERS:
+        raise ValueError("'status' must be one of 'p', 's' or 'f'")
+    return value
+
+
+def mutation_response(todo=None, status=200, **extra):
+    """JSON body returned by every mutation: the todo and the refreshed counters."""
+    body = {'counters': services.dashboard_counters(current_user), **extra}
+    if todo is not None:
+        body['todo'] = todo_to_dict(todo)
+    return jsonify(body), status
+
+
+def error(message, status):
+    return jsonify({"error": message}), status
+
+
+@api.errorhandler(401)
+def unauthorized(e):
+    return error("Authentication required", 401)
+
+
+@api.errorhandler(WriteTimeout)
+def write_timeout(e):
+    return jsonify({"error": "Server busy, please try again"}), 503, {"Retry-After": "1"}
+
+
+@api.route("/todos", methods=['GET'])
+@login_required
+def list_todos():
+    """
+    Lists one keyset page of the user's todos.
+
+    Returns:
+        - JSON with `todos`, `next_cursor`, `prev_cursor` and `counters`.
+    """
+    todo_status = request.args.get('todo_status', 'p')
+    sort_by = request.args.get('sort', 'due_time')
+    if todo_status not in LIST_STATUSES or sort_by not in LIST_SORTS:
+        return error("Invalid 'todo_status' or 'sort'", 400)
+
+    max_page_size = current_app.config['TODO_MAX_PAGE_SIZE']
+    limit = request.args.get('limit', current_app.config['TODO_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, max_page_size))
+
+    now = datetime.now()
+    page = todo_page(
+        current_user.id, todo_status, sort_by, now, limit,
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    return jsonify({
+        'todos': [todo_to_dict(todo) for todo in page.todos],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'counters': services.dashboard_counters(current_user)
+    })
+
+
+@api.route("/todos", methods=['POST'])
+@login_required
+def create_todo():
+    """
+    Creates a pending todo.
+
+    Returns:
+        - 201 with the new todo and the counters.
+        - 400 if the title or due time is invalid.
+    """
+    try:
+        data = json_body()
+        todo = services.create_todo(current_user, data.get('title') or '', parse_due_time(data.get('due_time')))
+    except (ValueError, TypeError) as e:
+        return error(str(e), 400)
+    return mutation_response(todo, 201)
+
+
+@api.route("/todos/<int:id>", methods=['GET'])
+@login_required
+def get_todo(id):
+    todo = services.get_user_todo(current_user, id)
+    if not todo:
+        return error("Todo not found", 404)
+    return jsonify({'todo': todo_to_dict(todo)})
+
+
+@api.route("/todos/<int:id>", methods=['PATCH'])
+@login_required
+def update_todo(id):
+    """
+    Updates the title and/or due time of a todo.
+
+    Returns:
+        - The updated todo and the counters.
+        - 400 if a field is invalid, 404 if the todo does not exist.
+    """
+    todo = services.get_user_todo(current_user, id)
+    if not todo:
+        return error("Todo not found", 404)
+    try:
+        data = json_body()
+        title = data.get('title', todo.title)
+        due_time = parse_due_time(data['due_time']) if 'due_time' in data else todo.due_time
+        services.update_todo(current_user, todo, title, due_time)
+    except (ValueError, TypeError) as e:
+        db.session.rollback()
+        return error(str(e), 400)
+    return mutation_response(todo)
+
+
+@api.route("/todos/<int:id>/status", methods=['PUT'])
+@login_required
+def change_status(id):
+    """
+    Moves a todo to another status.
+
+    Returns:
+        - The todo and the counters (unchanged if it already had that status).
+        - 400 for an unknown status, 404 if the todo does not exist.
+    """
+    try:
+        to_status = parse_status(json_body().get('status'))
+    except ValueError as e:
+        return error(str(e), 400)
+    if services.change_status(current_user, id, to_status) is None:
+        return error("Todo not found", 404)
+    return mutation_response(services.get_user_todo(current_user, id))
+
+
+@api.route("/todos/<int:id>", methods=['DELETE'])
+@login_required
+def delete_todo(id):
+    """
+    Deletes a todo.
+
+    Returns:
+        - The deleted todo id and the counters, 404 if the todo does not exist.
+    """
+    if services.delete_todo(current_user, id) is None:
+        return error("Todo not found", 404)
+    return mutation_response(todo_id=id)
+
+
+def bulk_target(data):
+    """
+    Reads the todos a bulk request applies to: a list of `ids`, or a `/list`
+    `filter` ('p', 's', 'f', 'u' urgent, 'd' overdue) meaning all matching todos.
+
+    Raises:
+        - ValueError if neither or an invalid one is given.
+
+    Returns:
+        - `(todo_ids, todo_status)`, one of them None.
+    """
+    ids = data.get('ids')
+    if ids is not None:
+        if not isinstance(ids, list) or not all(
+            isinstance(todo_id, int) and not isinstance(todo_id, bool) for todo_id in ids
+        ):
+            raise ValueError("'ids' must be a list of todo ids")
+        if len(ids) > current_app.config['BULK_MAX_IDS']:
+            raise ValueError(f"At most {current_app.config['BULK_MAX_IDS']} ids per request, use a 'filter' instead")
+        return ids, None
+    todo_status = data.get('filter')
+    if isinstance(todo_status, str) and todo_status in LIST_STATUSES:
+        return None, todo_status
+    raise ValueError("Give either 'ids' or a 'filter' of 'p', 's', 'f', 'u' or 'd'")
+
+
+@api.route("/todos/bulk/status", methods=['POST'])
+@login_required
+def bulk_change_status():
+    """
+    Moves many todos to another status in one transaction.
+
+    Returns:
+        - The number of changed todos and the counters.
+        - 400 for an unknown status or an invalid selection.
+    """
+    try:
+        data = json_body()
+        to_status = parse_status(data.get('status'))
+        todo_ids, todo_status = bulk_target(data)
+    except ValueError as e:
+        return error(str(e), 400)
+    changed = services.bulk_change_status(current_user, to_status, todo_ids, todo_status)
+    return mutation_response(changed=changed)
+
+
+@api.route("/todos/bulk/delete", methods=['POST'])
+@login_required
+def bulk_delete():
+    """
+    Deletes many todos in one transaction.
+
+    Returns:
+        - The number of deleted todos and the counters, 400 for an invalid selection.
+    """
+    try:
+        todo_ids, todo_status = bulk_target(json_body())
+    except ValueError as e:
+        return error(str(e), 400)
+    deleted = services.bulk_delete(current_user, todo_ids, todo_status)
+    return mutation_response(deleted=deleted)
+
+
+@api.route("/todos/import", methods=['POST'])
+@login_required
+def import_todos():
+    """
+    Imports todos from the request body, streamed row by row. The format is
+    taken from `?format=csv|jsonl` or the `Content-Type` (`text/csv`, else JSON Lines).
+
+    Returns:
+        - The imported and rejected row counts, the first row errors and the counters.
+    """
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'jsonl')
+    if fmt not in ('csv', 'jsonl'):
+        return error("'format' must be 'csv' or 'jsonl'", 400)
+    reader = importer.read_csv if fmt == 'csv' else importer.read_jsonl
+    try:
+        result = importer.import_todos(
+            current_user,
+            reader(request.stream),
+            batch_size=current_app.config['IMPORT_BATCH_SIZE'],
+            max_rows=current_app.config['IMPORT_MAX_ROWS']
+        )
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        return error(f"Unreadable {fmt} body: {e}", 400)
+    return mutation_response(status=201 if result.imported else 200, **result._asdict())
+
+
+@api.route("/todos/export", methods=['GET'])
+@login_required
+def export_todos():
+    """
+    Streams every todo of the user, or those matching `todo_status` with the
+    `/list` semantics, as a CSV or JSON Lines download.
+
+    Returns:
+        - A chunked `text/csv` or `application/x-ndjson` attachment.
+        - 400 for an unknown format, filter or sort.
+    """
+    fmt = request.args.get('format', 'csv')
+    todo_status = request.args.get('todo_status') or None
+    sort_by = request.args.get('sort', 'due_time')
+    if fmt not in export.MIMETYPES:
+        return error("'format' must be 'csv' or 'jsonl'", 400)
+    if (todo_status is not None and todo_status not in LIST_STATUSES) or sort_by not in LIST_SORTS:
+        return error("Invalid 'todo_status' or 'sort'", 400)
+
+    now = datetime.now()
+    chunks = export.export_chunks(
+        current_user.id, todo_status, sort_by, now, fmt,
+        fetch_size=current_app.config['EXPORT_FETCH_SIZE']
+    )
+    response = current_app.response_class(stream_with_context(chunks), mimetype=export.MIMETYPES[fmt])
+    filename = f"todos-{todo_status or 'all'}-{now:%Y%m%d-%H%M}.{fmt}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Let proxies pass chunks through as they come instead of buffering the whole export
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api.route("/todos/search", methods=['GET'])
+@login_required
+def search_todos():
+    """
+    Searches the user's todo titles; every word of `q` is matched as a
+    prefix, and `todo_status` narrows the search to a `/list` filter.
+
+    Returns:
+        - JSON with `todos` (best match first), `page` and `next_page`.
+        - 400 for a missing query or an unknown filter.
+    """
+    query = request.args.get('q', '').strip()
+    todo_status = request.args.get('todo_status') or None
+    if not search.search_terms(query):
+        return error("'q' must contain at least one word", 400)
+    if todo_status is not None and todo_status not in LIST_STATUSES:
+        return error("Invalid 'todo_status'", 400)
+
+    max_page_size = current_app.config['TODO_MAX_PAGE_SIZE']
+    limit = request.args.get('limit', current_app.config['TODO_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, max_page_size))
+    result = search.search_todos(
+        current_user.id, query, todo_status, datetime.now(),
+        page=request.args.get('page', 1, type=int),
+        page_size=limit
+    )
+    return jsonify({
+        'todos': [todo_to_dict(todo) for todo in result.todos],
+        'page': result.page,
+        'next_page': result.page + 1 if result.has_next else None
+    })
+
+
+@api.route("/todos/archive", methods=['GET'])
+@login_required
+def list_archived_todos():
+    """
+    Lists one keyset page of the user's archived todos with status `s` or `f`.
+
+    Returns:
+        - JSON with `todos`, `next_cursor` and `prev_cursor`.
+    """
+    todo_status = request.args.get('todo_status', 's')
+    if todo_status not in ('s', 'f'):
+        return error("Invalid 'todo_status', must be 's' or 'f'", 400)
+
+    limit = request.args.get('limit', current_app.config['TODO_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['TODO_MAX_PAGE_SIZE']))
+    page = archive_page(
+        current_user.id, todo_status, limit,
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+    return jsonify({
+        'todos': [{**todo_to_dict(todo), 'archived_time': todo.archived_time.isoformat()} for todo in page.todos],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
+    })
+
+
+@api.route("/counters", methods=['GET'])
+@login_required
+def counters():
+    return jsonify({'counters': services.dashboard_counters(current_user)})
@@ -0,0 +1,126 @@
+"""
+Archival policy moving old completed todos out of the `todo` table.
+
+Succeeded and failed todos used to stay in `todo` forever, next to the
+pending ones every `/list` query and deadline scan reads, so the table grew
+with a user's whole history. With `ARCHIVE_AFTER_DAYS` set, todos with
+status 's' or 'f' whose due time is more than that many days ago are moved
+to the `todo_archive` table (`ArchivedTodo`) by a periodic job:
+- Every `ARCHIVE_INTERVAL_SECONDS` the deadline scheduler's thread runs the
+  policy (`flask archive-todos` runs it once, e.g. from a cron job).
+- A run works in chunks of `ARCHIVE_BATCH_SIZE` todos of one status, each
+  one short transaction (`services.archive_completed`).
+- At most `ARCHIVE_MAX_BATCHES` chunks run per pass; a backlog left over is
+  picked up by the next pass right away.
+
+The due time is the age used, since todos record no completion time. The
+success/failure counters keep counting archived todos, so archiving never
+changes them. Archived todos are read-only and listed by the `/archive` view.
+
+Classes
+-------
+- `ArchivePolicy` : Runs the policy in chunks and tracks when it is due.
+
+Functions
+---------
+- `init_archive(app)` : Configures the policy and registers it with the scheduler.
+"""
+
+import time
+from datetime import timedelta
+from prometheus_client import Counter, Histogram
+from . import services
+from .scheduler import scheduler
+
+# Statuses whose todos are archived
+ARCHIVED_STATUSES = ('s', 'f')
+
+# Prometheus Metrics
+archive_rows_total = Counter('archive_rows_total', 'Completed todos moved to the archive', ['status'])
+archive_run_rows = Histogram(
+    'archive_run_rows', 'Completed todos moved to the archive per run',
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000)
+)
+archive_run_seconds = Histogram('archive_run_seconds', 'Duration of an archival run')
+
+
+class ArchivePolicy:
+    """
+    Moves succeeded and failed todos due more than `after_days` ago to the archive.
+
+    Args:
+        after_days: days past the due time before a completed todo is archived (0 disables the policy).
+        batch_size: todos per chunk and transaction.
+        max_batches: chunks per run before yielding to the scheduler.
+        interval: seconds between runs.
+    """
+
+    def __init__(self, after_days=0, batch_size=500, max_batches=20, interval=3600):
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.interval = interval
+        self._next_run = None
+
+    @property
+    def enabled(self):
+        return self.after_days > 0
+
+    def run(self, now):
+        """
+        Archives completed todos due before `now - after_days`, chunk by
+        chunk and status by status. Must run inside an app context.
+
+        Returns:
+            - `(moved, finished)`: todos archived, and False if `max_batches`
+              chunks ran and more may be left.
+        """
+        cutoff = now - timedelta(days=self.after_days)
+        started = time.perf_counter()
+        moved = 0
+        batches = 0
+        finished = True
+        for status in ARCHIVED_STATUSES:
+            count = self.batch_size
+            while count == self.batch_size:
+                if batches >= self.max_batches:
+                    finished = False
+                    break
+                count = services.archive_completed(status, cutoff, self.batch_size)
+                archive_rows_total.labels(status=status).inc(count)
+                batches += 1
+                moved += count
+
+        archive_run_rows.observe(moved)
+        archive_run_seconds.observe(time.perf_counter() - started)
+        return moved, finished
+
+    def __call__(self, now):
+        """
+        Scheduler job: runs the policy when it is due.
+
+        Returns:
+            - When the policy next wants to run, or None when disabled.
+        """
+        if not self.enabled:
+            return None
+        if self._next_run is None or now >= self._next_run:
+            # Set first, so a failing run waits for the next interval
+            self._next_run = now + timedelta(seconds=self.interval)
+            moved, finished = self.run(now)
+            if not finished:
+                self._next_run = now
+        return self._next_run
+
+
+policy = ArchivePolicy()
+
+
+def init_archive(app):
+    """Configures the policy from `ARCHIVE_*` settings and adds it to the scheduler's jobs."""
+    policy.after_days = app.config['ARCHIVE_AFTER_DAYS']
+    policy.batch_size = app.config['ARCHIVE_BATCH_SIZE']
+    policy.max_batches = app.config['ARCHIVE_MAX_BATCHES']
+    policy.interval = app.config['ARCHIVE_INTERVAL_SECONDS']
+    if policy not in scheduler.jobs:
+        scheduler.jobs.append(policy)
@@ -16,20 +16,25 @@ Routes
 - `/check_user_name` (POST) : Checks if a username already exists in the database.
 - `/login` (GET, POST) : Authenticates users and handles login attempts.
 - `/logout` (GET) : Logs out the current user and redirects to login.
-- `/delete_users` (GET) : Deletes all users and associated todos (for admin use).
+- `/delete_users` (GET) : Queues the deletion of all users and associated todos (admins only).
 
 Dependencies
 ------------
 - Flask, Flask-Login, Flask-SQLAlchemy, Flask-WTF
-- Werkzeug for password hashing
+- Werkzeug for password hashing, run on the `hashing` process pool
 - `User` and `Todo` models for database interactions
 - `LoginForm` and `SignupForm` for form validation
 
 Security
 --------
-- Passwords are securely hashed using `pbkdf2:sha256`.
+- Passwords are securely hashed using `PASSWORD_HASH_METHOD` (`pbkdf2:sha256` by default)
+  off the request thread; outdated hashes are upgraded on the next successful login.
+- Hashing is bounded: a saturated hashing pool answers 503 instead of queueing forever.
+- `/login` (per IP, and per username for failed attempts) and `/check_user_name`
+  (per IP) are rate limited with token buckets (`ratelimit`); excess requests get a 429.
 - CSRF protection is enabled via Flask-WTF.
 - Login required for logout to prevent unauthorized access.
+- `/delete_users` needs a logged-in user with `admin` set; anyone else gets a 403.
 
 WARNING
 -------
@@ -38,10 +43,12 @@ Use it with caution.
 """
 
 from flask import render_template, redirect, url_for, request, flash, Blueprint, jsonify
-from .models import User, db, Todo
+from .models import User, db
 from .forms import LoginForm, SignupForm
-from flask_login import login_user, logout_user, login_required
-from werkzeug.security import generate_password_hash, check_password_hash
+from . import hashing, ratelimit, purge
+from .usernames import index as username_index
+from sqlalchemy.exc import IntegrityError
+from flask_login import login_user, logout_user, login_required, current_user
 from prometheus_client import Counter
 
 # Define Blueprint for authentication routes
@@ -76,7 +83,10 @@ def signup():
         last_name = form.last_name.data
         user_name = form.user_name.data
         password = form.password.data
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+        try:
+            hashed_password = hashing.hash_password(password)
+        except hashing.HashingBusy:
+            return "Server busy, please try again", 503
         
         user = User(
             first_name=first_name,
@@ -90,7 +100,13 @@ def signup():
         )
         
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Taken by a concurrent signup the availability check could not see yet
+            db.session.rollback()
+            return "Username already taken", 409
+        username_index.add(user_name)
         
         # Increment signup counter
         user_signups_total.inc()
@@ -104,6 +120,8 @@ def signup():
 def check_user_name():
     """
     Checks if a given username already exists in the database in realtime.
+    Names that were never registered are answered from the in-memory
+    `usernames` index without a query.
 
     Returns:
         - JSON response indicating whether the username exists.
@@ -116,7 +134,10 @@ def check_user_name():
                 return jsonify({"error": "Invalid request, missing 'userName'"}), 400
 
             user_name = data['userName']
-            user_exists = User.query.filter(User.user_name == user_name).first() is not None
+            limited = ratelimit.limit_request('check_user_name')
+            if limited:
+                return limited
+            user_exists = username_index.exists(user_name)
             return jsonify({'exists': user_exists})
 
         except Exception as e:
@@ -143,9 +164,13 @@ def login():
 
             user_name = data.get('user_name')
             password = data.get('password')
+            limited = ratelimit.limit_request('login', user_name)
+            if limited:
+                return limited
             user = User.query.filter(User.user_name == user_name).first()
 
-            if user and check_password_hash(user.password, password):
+            if user and hashing.verify_password(user.password, password):
+                upgrade_password_hash(user, password)
                 login_user(user)
                 # Increment successful login counter
                 user_logins_success_total.inc()
@@ -153,13 +178,29 @@ def login():
             else:
                 # Increment failed login counter
                 user_logins_failure_total.inc()
+                ratelimit.record_failure('login', user_name)
                 return jsonify({"valid": False, "redirect": "login"})
+        except hashing.HashingBusy:
+            return jsonify({"error": "Server busy, please try again"}), 503, {"Retry-After": "1"}
         except Exception as e:
             print(f"Error: {str(e)}")
             return jsonify({"error": "Server error"}), 500
 
     return render_template("login.html", form=form)
 
+def upgrade_password_hash(user, password):
+    """
+    Rehashes a just-verified password if its stored hash uses an outdated
+    method or iteration count. Failures are ignored, the old hash still works.
+    """
+    if not hashing.needs_rehash(user.password):
+        return
+    try:
+        user.password = hashing.hash_password(password)
+        db.session.commit()
+    except (hashing.HashingBusy, ValueError):
+        db.session.rollback()
+
 @auth.route("/logout")
 @login_required
 def logout():
@@ -175,19 +216,25 @@ def logout():
     return redirect(url_for("auth.login"))
 
 @auth.route("/delete_users")
+@login_required
 def delete_users():
     """
-    Deletes all users and associated todo records from the database.
+    Queues the deletion of all users and associated todo records from the
+    database, run in chunks in the background (`purge`).
 
     WARNING: This will remove all user data and todos permanently.
     Used only for development period.
 
     Returns:
-        A simple HTML response confirming deletion.
+        A `202` HTML response linking to the job's progress (`/purges/<id>`),
+        or `403` for a user who is not an admin.
     """
+    if not current_user.admin:
+        return "Only admins can delete all users", 403
     # Increment user deletion counter
     user_deletions_total.inc()
-    db.session.query(Todo).delete()
-    db.session.query(User).delete()
-    db.session.commit()
-    return "<h1> Deleted all users </h1>"
+    # Deleted in chunks by the scheduler (or by this request when the process runs none),
+    # which also clears the user caches
+    job = purge.queue_user_purge()
+    status_url = url_for('main.purge_status', job_id=job.id)
+    return f"<h1> Deleting all users, progress at <a href=\"{status_url}\">{status_url}</a></h1>", 202, {'Location': status_url}
@@ -0,0 +1,120 @@
+"""
+Optional auto-fail policy for long-overdue todos.
+
+A pending todo whose due time has passed stays pending until someone marks
+it, so the pending set and the overdue range the dashboard scans keep
+growing. With `AUTO_FAIL_AFTER_HOURS` set, todos overdue by more than that
+many hours are moved to failure by a periodic job, never by a request:
+- Every `AUTO_FAIL_INTERVAL_SECONDS` the deadline scheduler's thread runs
+  the policy (`flask auto-fail-overdue` runs it once, e.g. from a cron job).
+- A run works in chunks of `AUTO_FAIL_BATCH_SIZE` todos, each one
+  transaction with a single counter update per user (`services.fail_overdue`),
+  so the write lock is only held briefly.
+- At most `AUTO_FAIL_MAX_BATCHES` chunks run per pass; a backlog left over
+  is picked up by the next pass right away instead of stalling the
+  scheduler's deadline updates.
+
+The updates are guarded by status and due time, so runs in several
+processes at once never fail a todo twice or one that was just completed.
+
+Classes
+-------
+- `AutoFailPolicy` : Runs the policy in chunks and tracks when it is due.
+
+Functions
+---------
+- `init_auto_fail(app)` : Configures the policy and registers it with the scheduler.
+"""
+
+import time
+from datetime import timedelta
+from prometheus_client import Counter, Histogram
+from . import services
+from .scheduler import scheduler
+
+# Prometheus Metrics
+auto_fail_rows_total = Counter('auto_fail_rows_total', 'Overdue todos moved to failure by the auto-fail policy')
+auto_fail_run_rows = Histogram(
+    'auto_fail_run_rows', 'Overdue todos moved to failure per auto-fail run',
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000)
+)
+auto_fail_run_seconds = Histogram('auto_fail_run_seconds', 'Duration of an auto-fail run')
+
+
+class AutoFailPolicy:
+    """
+    Moves pending todos overdue by more than `after_hours` to failure.
+
+    Args:
+        after_hours: hours past the due time before a todo fails (0 disables the policy).
+        batch_size: todos per chunk and transaction.
+        max_batches: chunks per run before yielding to the scheduler.
+        interval: seconds between runs.
+    """
+
+    def __init__(self, after_hours=0, batch_size=500, max_batches=20, interval=300):
+        self.after_hours = after_hours
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.interval = interval
+        self._next_run = None
+
+    @property
+    def enabled(self):
+        return self.after_hours > 0
+
+    def run(self, now):
+        """
+        Fails todos due before `now - after_hours`, chunk by chunk. Must run
+        inside an app context.
+
+        Returns:
+            - `(moved, finished)`: todos moved, and False if `max_batches`
+              chunks ran and more may be left.
+        """
+        cutoff = now - timedelta(hours=self.after_hours)
+        started = time.perf_counter()
+        moved = 0
+        finished = True
+        for _ in range(self.max_batches):
+            count = services.fail_overdue(cutoff, self.batch_size)
+            moved += count
+            if count < self.batch_size:
+                break
+        else:
+            finished = False
+
+        auto_fail_rows_total.inc(moved)
+        auto_fail_run_rows.observe(moved)
+        auto_fail_run_seconds.observe(time.perf_counter() - started)
+        return moved, finished
+
+    def __call__(self, now):
+        """
+        Scheduler job: runs the policy when it is due.
+
+        Returns:
+            - When the policy next wants to run, or None when disabled.
+        """
+        if not self.enabled:
+            return None
+        if self._next_run is None or now >= self._next_run:
+            # Set first, so a failing run waits for the next interval
+            self._next_run = now + timedelta(seconds=self.interval)
+            moved, finished = self.run(now)
+            if not finished:
+                self._next_run = now
+        return self._next_run
+
+
+policy = AutoFailPolicy()
+
+
+def init_auto_fail(app):
+    """Configures the policy from `AUTO_FAIL_*` settings and adds it to the scheduler's jobs."""
+    policy.after_hours = app.config['AUTO_FAIL_AFTER_HOURS']
+    policy.batch_size = app.config['AUTO_FAIL_BATCH_SIZE']
+    policy.max_batches = app.config['AUTO_FAIL_MAX_BATCHES']
+    policy.interval = app.config['AUTO_FAIL_INTERVAL_SECONDS']
+    if policy not in scheduler.jobs:
+        scheduler.jobs.append(policy)
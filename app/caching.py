@@ -0,0 +1,111 @@
+"""
+HTTP caching for the dashboard and the static assets.
+
+`/list` ETag:
+The ETag of a `/list` page is derived from a cheap per-user version token
+instead of the rendered HTML, so an unchanged page is answered with a `304`
+before any todo query or template rendering happens. The token changes when:
+- `User.todo_version` changes. It is bumped by every todo mutation and by
+  the deadline scheduler when one of the user's todos becomes urgent or
+  overdue, which changes which cards are highlighted and what the
+  urgent/deadlined filters return.
+- The requested view (filter, sort, page cursor) changes.
+- The templates or static files change (new deployment).
+- A new CSRF token is due, so a revalidated page never embeds an expired one.
+
+Static assets:
+`url_for('static', ...)` URLs carry a `v=<content hash>` query argument, and
+responses for such URLs are cacheable for a year since a new file content
+always gets a new URL.
+
+Functions:
+- `init_static_caching(app)`: Registers the hashed static URLs and their cache headers.
+- `list_etag(user, view, now)`: ETag for a user's `/list` page.
+"""
+
+import hashlib
+import os
+from flask import request, current_app
+
+# Static responses with a content hash in the URL never change
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+# The page embeds a CSRF token, which expires after WTF_CSRF_TIME_LIMIT (1 hour by default)
+CSRF_BUCKET_SECONDS = 1800
+
+_static_hashes = {}
+
+
+def static_hash(app, filename):
+    """
+    Short content hash of a static file, recomputed only when its mtime changes.
+    """
+    path = os.path.join(app.static_folder, filename)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    cached = _static_hashes.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            cached = (mtime, hashlib.md5(f.read()).hexdigest()[:12])
+        _static_hashes[path] = cached
+    return cached[1]
+
+
+def init_static_caching(app):
+    """Adds content hashes to static URLs and long-lived cache headers to their responses."""
+
+    @app.url_defaults
+    def add_static_hash(endpoint, values):
+        if endpoint == 'static' and 'v' not in values and 'filename' in values:
+            digest = static_hash(app, values['filename'])
+            if digest:
+                values['v'] = digest
+
+    @app.after_request
+    def cache_hashed_static(response):
+        if request.endpoint == 'static' and request.args.get('v') and response.status_code == 200:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+
+    app.config['RENDER_VERSION'] = render_version(app)
+
+
+def render_version(app):
+    """
+    Digest of every template and static file, so ETags change with each deployment.
+    """
+    digest = hashlib.md5()
+    for folder in (os.path.join(app.root_path, app.template_folder), app.static_folder):
+        for root, dirs, files in sorted(os.walk(folder)):
+            for name in sorted(files):
+                with open(os.path.join(root, name), 'rb') as f:
+                    digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def list_etag(user, view, now):
+    """
+    Builds the ETag of a user's `/list` page without querying the todos.
+
+    Args:
+        user: the user's `dashboard_state` row (id and a fresh `todo_version`),
+            not the possibly cached `current_user`.
+        view: tuple identifying the requested view (filter, sort, cursors).
+        now: the request time.
+
+    Returns:
+        - The ETag string.
+    """
+    parts = (
+        user.id,
+        user.todo_version,
+        view,
+        current_app.config['RENDER_VERSION'],
+        int(now.timestamp() // CSRF_BUCKET_SECONDS)
+    )
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
@@ -0,0 +1,165 @@
+"""
+Flask CLI commands for maintenance and regression checks.
+
+Commands:
+- `flask check-query-plans` : Runs `EXPLAIN QUERY PLAN` on every `/list`, export, search,
+  archive, auto-fail, archival and purge query variant and exits with a non-zero status if any of them falls back to a table scan.
+- `flask deadline-scheduler` : Runs the deadline scheduler in the foreground, for
+  deployments that set `DEADLINE_SCHEDULER_ENABLED=false` on the web processes.
+- `flask auto-fail-overdue` : Runs the auto-fail policy once until no overdue todo is left.
+- `flask archive-todos` : Runs the archival policy once until no old completed todo is left.
+- `flask run-purges` : Runs the queued `/delete` and `/delete_users` jobs to completion.
+- `flask precompile-templates` : Compiles every template into `JINJA_CACHE_DIR`, run by
+  the image build with `APP_ENV=prod`.
+
+Usage:
+    flask --app app:create_app check-query-plans
+"""
+
+import click
+from datetime import datetime
+from flask import current_app
+from flask.cli import with_appcontext
+from .models import db
+from types import SimpleNamespace
+from .queries import (
+    todo_page_query, todo_counts_query, todo_export_query, overdue_chunk_query,
+    archive_chunk_query, archive_page_query, purge_todos_query, purge_archived_query, encode_cursor
+)
+from .scheduler import scheduler
+from .autofail import policy
+from . import archive, purge
+from . import templating, search
+
+LIST_STATUSES = ('p', 's', 'f', 'u', 'd')
+LIST_SORTS = ('due_time', 'created_time')
+
+
+def list_query_variants(now):
+    """
+    Yields `(name, statement)` for every query `/list` can issue, including
+    the next/previous page seeks.
+    """
+    boundary = SimpleNamespace(todo_id=0, archive_id=0, due_time=now, created_time=now)
+    for todo_status in LIST_STATUSES:
+        for sort_by in LIST_SORTS:
+            cursor = encode_cursor(boundary, sort_by)
+            name = f"list status={todo_status} sort={sort_by}"
+            yield name, todo_page_query(0, todo_status, sort_by, now, 1)
+            yield f"{name} after", todo_page_query(0, todo_status, sort_by, now, 1, after=cursor)
+            yield f"{name} before", todo_page_query(0, todo_status, sort_by, now, 1, before=cursor)
+            yield f"export status={todo_status} sort={sort_by}", todo_export_query(0, todo_status, sort_by, now)
+    for sort_by in LIST_SORTS:
+        yield f"export all sort={sort_by}", todo_export_query(0, None, sort_by, now)
+    yield "counters", todo_counts_query(0, now)
+    for todo_status in (*LIST_STATUSES, None):
+        yield f"search status={todo_status or 'all'}", search.search_query(0, ['todo'], todo_status, now, 1)
+    for status in archive.ARCHIVED_STATUSES:
+        cursor = encode_cursor(boundary, 'due_time', 'archive_id')
+        yield f"archive status={status}", archive_page_query(0, status, 1)
+        yield f"archive status={status} after", archive_page_query(0, status, 1, after=cursor)
+        yield f"archive status={status} before", archive_page_query(0, status, 1, before=cursor)
+        yield f"archival chunk status={status}", archive_chunk_query(status, now, 1)
+    yield "auto-fail chunk", overdue_chunk_query(now, 1)
+    yield "purge chunk", purge_todos_query(0, 0, 1)
+    yield "purge archived chunk", purge_archived_query(0, 1)
+
+
+def explain_query_plan(statement):
+    """
+    Runs SQLite's `EXPLAIN QUERY PLAN` for a statement.
+
+    Returns:
+        - List of the plan's detail strings, e.g. `SEARCH todo USING INDEX ...`.
+    """
+    compiled = statement.compile(dialect=db.engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return [row[-1] for row in rows]
+
+
+def is_table_scan(detail):
+    """A plan step that walks a whole table or index instead of searching it (FTS lookups are searches)."""
+    return detail.startswith('SCAN ') and 'CONSTANT ROW' not in detail and 'VIRTUAL TABLE INDEX' not in detail
+
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans():
+    """Fail if any /list query falls back to a table scan."""
+    if db.engine.dialect.name != 'sqlite':
+        raise click.UsageError("check-query-plans inspects SQLite query plans only")
+
+    failures = 0
+    for name, statement in list_query_variants(datetime.now()):
+        plan = explain_query_plan(statement)
+        scans = [detail for detail in plan if is_table_scan(detail)]
+        status = "SCAN" if scans else "ok"
+        click.echo(f"[{status}] {name}: {' | '.join(plan)}")
+        failures += bool(scans)
+
+    if failures:
+        raise click.ClickException(f"{failures} query variant(s) fall back to a scan")
+    click.echo("All /list queries use an index")
+
+
+@click.command('deadline-scheduler')
+@with_appcontext
+def deadline_scheduler():
+    """Run the deadline scheduler until interrupted."""
+    click.echo("Deadline scheduler running")
+    scheduler.run_forever(current_app._get_current_object())
+
+
+@click.command('auto-fail-overdue')
+@with_appcontext
+def auto_fail_overdue():
+    """Move todos overdue by more than AUTO_FAIL_AFTER_HOURS to failure."""
+    if not policy.enabled:
+        raise click.UsageError("AUTO_FAIL_AFTER_HOURS is not set")
+
+    total = 0
+    finished = False
+    while not finished:
+        moved, finished = policy.run(datetime.now())
+        total += moved
+    click.echo(f"{total} overdue todo(s) moved to failure")
+
+
+@click.command('archive-todos')
+@with_appcontext
+def archive_todos():
+    """Move completed todos due more than ARCHIVE_AFTER_DAYS ago to the archive."""
+    if not archive.policy.enabled:
+        raise click.UsageError("ARCHIVE_AFTER_DAYS is not set")
+
+    total = 0
+    finished = False
+    while not finished:
+        moved, finished = archive.policy.run(datetime.now())
+        total += moved
+    click.echo(f"{total} completed todo(s) archived")
+
+
+@click.command('run-purges')
+@with_appcontext
+def run_purges():
+    """Run the queued /delete and /delete_users jobs until none is left."""
+    total = 0
+    finished = False
+    while not finished:
+        deleted, finished = purge.runner.run(datetime.now())
+        total += deleted
+    click.echo(f"{total} row(s) deleted by purge jobs")
+
+
+@click.command('precompile-templates')
+@with_appcontext
+def precompile_templates():
+    """Compile every template into the Jinja bytecode cache."""
+    app = current_app._get_current_object()
+    if not app.config['JINJA_CACHE_DIR']:
+        raise click.UsageError("JINJA_CACHE_DIR is not set, use APP_ENV=prod")
+    names = templating.precompile_templates(app)
+    click.echo(f"{len(names)} template(s) compiled into {app.config['JINJA_CACHE_DIR']}")
@@ -0,0 +1,55 @@
+"""
+Configuration profiles.
+
+`create_app` reads every setting from an environment variable of the same
+name with a built-in default. `APP_ENV` selects a profile whose values
+replace those defaults, while a setting given explicitly in the environment
+still wins:
+- `dev` (default) : Reloads templates when they change on disk.
+- `test` : Flask testing mode without CSRF, rate limits, the hashing pool or
+  the background deadline scheduler, for deterministic test clients.
+- `prod` : Never stats template files, and loads them from the Jinja bytecode
+  precompiled into the image (`JINJA_CACHE_DIR`, see `templating`).
+
+Functions
+---------
+- `apply_profile(app, name)` : Applies a profile's settings to the app config.
+"""
+
+import os
+
+# Project root, where the production template bytecode cache lives
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    'dev': {
+        'TEMPLATES_AUTO_RELOAD': True,
+    },
+    'test': {
+        'TESTING': True,
+        'TEMPLATES_AUTO_RELOAD': False,
+        'WTF_CSRF_ENABLED': False,
+        'RATELIMIT_ENABLED': False,
+        'HASH_WORKERS': 0,
+        'DEADLINE_SCHEDULER_ENABLED': False,
+    },
+    'prod': {
+        'TEMPLATES_AUTO_RELOAD': False,
+        'JINJA_CACHE_DIR': os.path.join(PROJECT_ROOT, '.jinja_cache'),
+    },
+}
+
+
+def apply_profile(app, name):
+    """
+    Applies the settings of profile `name`, except those set in the environment.
+
+    Raises:
+        - ValueError for an unknown profile.
+    """
+    if name not in PROFILES:
+        raise ValueError(f"Unknown APP_ENV {name!r}, expected one of {', '.join(PROFILES)}")
+    app.config['APP_ENV'] = name
+    for key, value in PROFILES[name].items():
+        if key not in os.environ:
+            app.config[key] = value
@@ -0,0 +1,315 @@
+"""
+Server-Sent Events for live dashboard updates.
+
+Instead of `list.html` refreshing itself every few seconds, the browser keeps
+one `EventSource` connection open and the server pushes an event only when
+something the dashboard shows has changed:
+- `todo` : a todo was created, updated, changed status or was deleted
+  (published by `services` after the commit).
+- `deadline` : a pending todo became urgent (due within the hour) or overdue
+  (published by the deadline `scheduler`).
+
+Events travel through a broker, chosen by `EVENTS_BROKER_URL`:
+- empty or `memory://` : `LocalBroker` fans them out to the streams held by
+  the current process. It is what tests run against, and only enough for a
+  single process: a write handled by another worker or replica never reaches
+  this one's streams.
+- `redis://host:port/db` : `RedisBroker` publishes them on a Redis channel
+  that every process listens on, so each stream gets the events of every
+  worker and replica. Needs the optional `redis` package.
+
+`list.html` also polls its own URL with the page's ETag every
+`EVENTS_POLL_SECONDS`, which costs a 304 while nothing changed, so a missed
+event only delays the dashboard instead of leaving it stale.
+
+Blueprint
+---------
+events : Flask Blueprint
+
+Routes
+------
+- `/events` (GET) : `text/event-stream` of the current user's events.
+
+Classes
+-------
+- `LocalBroker` : In-process publish/subscribe of per-user events.
+- `RedisBroker` : Publish/subscribe of per-user events across processes through Redis.
+
+Functions
+---------
+- `init_events(app)` : Selects the broker from `EVENTS_BROKER_URL`.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from flask import Blueprint, Response, current_app
+from flask_login import login_required, current_user
+from prometheus_client import Gauge
+
+events = Blueprint("events", __name__)
+
+# Prometheus Gauges
+sse_connections = Gauge('sse_connections', 'Number of open Server-Sent Events streams', multiprocess_mode='livesum')
+
+# Streams open in this process, capped at EVENTS_MAX_STREAMS
+_open_streams = 0
+_streams_lock = threading.Lock()
+
+
+class LocalBroker:
+    """
+    In-process publish/subscribe of per-user events.
+
+    Each subscriber gets its own bounded queue; if a slow client lets it fill
+    up, further events for that subscriber are dropped rather than blocking
+    the publisher.
+    """
+
+    def __init__(self, max_queued=100):
+        self.max_queued = max_queued
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Registers a new subscriber and returns the queue its events arrive on."""
+        q = queue.Queue(maxsize=self.max_queued)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues is not None:
+                queues.discard(q)
+                if not queues:
+                    del self._subscribers[user_id]
+
+    def touch(self, user_id, q):
+        """Marks a subscriber as still connected; only shared brokers track this."""
+
+    def has_subscribers(self, user_id):
+        with self._lock:
+            return user_id in self._subscribers
+
+    def publish(self, user_id, event_type, data):
+        """Delivers an event to every subscriber of the user."""
+        with self._lock:
+            queues = list(self._subscribers.get(user_id, ()))
+        for q in queues:
+            try:
+                q.put_nowait((event_type, data))
+            except queue.Full:
+                pass
+
+
+class RedisBroker(LocalBroker):
+    """
+    Publish/subscribe of per-user events across processes through Redis.
+
+    `publish` sends every event on one Redis channel. Each process runs a
+    listener thread on that channel, started with its first subscriber, which
+    hands the events to the streams of this process through `LocalBroker`.
+
+    Which users have a stream open anywhere is kept in a sorted set per user
+    of stream tokens, scored by when they expire. Streams refresh their token
+    on every heartbeat (`touch`), so those of a killed process drop out after
+    `ttl` seconds and `has_subscribers` answers for every process.
+
+    Redis errors are logged, never raised: a lost event is caught up by the
+    dashboard's poll.
+
+    Args:
+        url: Redis connection URL, e.g. `redis://localhost:6379/0`.
+        logger: where errors are logged, e.g. `app.logger`.
+        prefix: prepended to the channel and the subscriber keys.
+        ttl: seconds a stream counts as open after its last heartbeat.
+    """
+
+    def __init__(self, url, logger, prefix='todo:events:', ttl=60, max_queued=100):
+        super().__init__(max_queued)
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RedisBroker needs the 'redis' package: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.logger = logger
+        self.prefix = prefix
+        self.channel = prefix + 'channel'
+        self.ttl = ttl
+        self._tokens = {}
+        self._listener = None
+        self._pid = None
+
+    def subscribe(self, user_id):
+        self._ensure_listening()
+        q = super().subscribe(user_id)
+        with self._lock:
+            self._tokens[q] = uuid.uuid4().hex
+        self.touch(user_id, q)
+        return q
+
+    def touch(self, user_id, q):
+        with self._lock:
+            token = self._tokens.get(q)
+        if token is None:
+            return
+        key = self._key(user_id)
+        try:
+            with self.client.pipeline() as pipe:
+                pipe.zadd(key, {token: time.time() + self.ttl})
+                pipe.expire(key, int(self.ttl) + 1)
+                pipe.execute()
+        except Exception as e:
+            self.logger.error(f"Event broker error: {str(e)}")
+
+    def unsubscribe(self, user_id, q):
+        super().unsubscribe(user_id, q)
+        with self._lock:
+            token = self._tokens.pop(q, None)
+        if token is None:
+            return
+        try:
+            self.client.zrem(self._key(user_id), token)
+        except Exception as e:
+            self.logger.error(f"Event broker error: {str(e)}")
+
+    def has_subscribers(self, user_id):
+        """Whether the user has a stream open in any process."""
+        try:
+            return self.client.zcount(self._key(user_id), time.time(), '+inf') > 0
+        except Exception as e:
+            self.logger.error(f"Event broker error: {str(e)}")
+            return False
+
+    def publish(self, user_id, event_type, data):
+        """Sends an event to the streams of the user in every process."""
+        try:
+            self.client.publish(self.channel, json.dumps([user_id, event_type, data]))
+        except Exception as e:
+            self.logger.error(f"Event broker error: {str(e)}")
+
+    def _key(self, user_id):
+        return f"{self.prefix}subscribers:{user_id}"
+
+    def _ensure_listening(self):
+        """Starts the listener thread once per process (again after a fork)."""
+        with self._lock:
+            if self._pid != os.getpid() or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name="event-listener", daemon=True)
+                self._pid = os.getpid()
+                self._listener.start()
+
+    def _listen(self):
+        """Delivers the events published by every process to this process's streams."""
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    user_id, event_type, data = json.loads(message['data'])
+                    LocalBroker.publish(self, user_id, event_type, data)
+            except Exception as e:
+                self.logger.error(f"Event listener error: {str(e)}")
+                time.sleep(1)
+
+
+broker = LocalBroker()
+
+
+def init_events(app):
+    """
+    Selects the broker from `EVENTS_BROKER_URL`.
+
+    Raises:
+        - ValueError for an unsupported URL scheme.
+    """
+    global broker
+    url = app.config['EVENTS_BROKER_URL']
+    if not url or url.startswith('memory://'):
+        broker = LocalBroker()
+    elif url.startswith(('redis://', 'rediss://')):
+        # A stream refreshes its token every heartbeat; allow a couple of missed ones
+        broker = RedisBroker(url, app.logger, ttl=3 * app.config['EVENTS_HEARTBEAT'])
+    else:
+        raise ValueError(f"Unsupported events broker URL: {url}")
+
+
+def publish(user_id, event_type, data):
+    """Publishes an event for a user through the configured broker."""
+    broker.publish(user_id, event_type, data)
+
+
+def format_event(event_type, data):
+    """Encodes one event in the `text/event-stream` wire format."""
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+@events.route("/events")
+@login_required
+def stream():
+    """
+    Streams the current user's events as Server-Sent Events.
+
+    The stream sends a comment line every `EVENTS_HEARTBEAT` seconds to keep
+    proxies from closing it and ends after `EVENTS_STREAM_TIMEOUT` seconds;
+    the browser's `EventSource` then reconnects on its own.
+
+    Each open stream holds a worker thread for its whole lifetime, so a
+    process serves at most `EVENTS_MAX_STREAMS` of them and answers further
+    ones with 503, keeping its other threads for ordinary requests. The
+    dashboard then falls back to polling.
+
+    Returns:
+        - A streaming `text/event-stream` response, or 503 when this process
+          already serves `EVENTS_MAX_STREAMS` streams.
+    """
+    global _open_streams
+    app = current_app._get_current_object()
+    heartbeat = app.config['EVENTS_HEARTBEAT']
+    timeout = app.config['EVENTS_STREAM_TIMEOUT']
+    with _streams_lock:
+        if _open_streams >= app.config['EVENTS_MAX_STREAMS']:
+            return Response("Too many event streams", status=503, headers={'Retry-After': str(timeout)})
+        _open_streams += 1
+    user_id = current_user.id
+    stream_broker = broker
+    q = stream_broker.subscribe(user_id)
+
+    def generate():
+        sse_connections.inc()
+        started = datetime.now()
+        touched = time.monotonic()
+        try:
+            yield "retry: 5000\n\n"
+            while (datetime.now() - started).total_seconds() < timeout:
+                if time.monotonic() - touched >= heartbeat:
+                    stream_broker.touch(user_id, q)
+                    touched = time.monotonic()
+                try:
+                    event_type, data = q.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(event_type, data)
+        finally:
+            sse_connections.dec()
+
+    def release():
+        global _open_streams
+        stream_broker.unsubscribe(user_id, q)
+        with _streams_lock:
+            _open_streams -= 1
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(release)
+    return response
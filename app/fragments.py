@@ -0,0 +1,151 @@
+"""
+Cache of rendered todo cards for `list.html`.
+
+Rendering `/list` used to run the whole card markup, with its `url_for`
+calls and date formatting, for every todo on every request, although a card
+only changes when its todo does or when it crosses an urgency boundary.
+Cards are now rendered from `todo_card.html` once and kept in a per-process
+LRU keyed by everything they show:
+- the todo's id, title, created and due times (its content version: every
+  edit changes one of them, and status changes move it to another view),
+- the `/list` view (`todo_status`), which decides the buttons shown,
+- the urgency bucket (`urgent`, `overdue` or none) on the pending view.
+
+A todo crossing an urgency boundary therefore gets a new key and is
+re-rendered; an edited todo's old entries are never hit again and age out.
+The cache is bounded both by entries (`FRAGMENT_CACHE_SIZE`) and by the
+total size of the cached markup (`FRAGMENT_CACHE_MAX_BYTES`); a size of 0
+disables it.
+
+Classes
+-------
+- `FragmentCache` : Thread-safe LRU of rendered markup bounded by count and size.
+
+Functions
+---------
+- `init_fragment_cache(app)` : Configures the cache from the app config.
+- `urgency(todo, todo_status, now)` : The urgency bucket of a card.
+- `render_todo_cards(todos, todo_status, now)` : Cached markup of every card.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from markupsafe import Markup
+from prometheus_client import Counter, Gauge
+from .queries import URGENT_WINDOW
+from .instrumentation import add_time
+
+# Prometheus Metrics
+fragment_cache_hits = Counter('fragment_cache_hits_total', 'Todo cards served from the fragment cache')
+fragment_cache_misses = Counter('fragment_cache_misses_total', 'Todo cards rendered because they were not cached')
+fragment_cache_evictions = Counter('fragment_cache_evictions_total', 'Todo cards evicted from the fragment cache')
+fragment_cache_bytes = Gauge('fragment_cache_bytes', 'Size of the cached todo card markup', multiprocess_mode='livesum')
+
+CARD_TEMPLATE = 'todo_card.html'
+
+
+class FragmentCache:
+    """
+    Thread-safe LRU of rendered markup, evicting the least recently used
+    entries once it holds more than `max_entries` or more than `max_bytes`
+    characters of markup.
+    """
+
+    def __init__(self, max_entries=4096, max_bytes=4 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+            return html
+
+    def set(self, key, html):
+        if self.max_entries <= 0 or len(html) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = html
+            self.size += len(html)
+            evicted = 0
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.size -= len(old)
+                evicted += 1
+            size = self.size
+        if evicted:
+            fragment_cache_evictions.inc(evicted)
+        fragment_cache_bytes.set(size)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+        fragment_cache_bytes.set(0)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+cache = FragmentCache()
+
+
+def init_fragment_cache(app):
+    """Configures the card cache from `FRAGMENT_CACHE_*` settings."""
+    cache.max_entries = app.config['FRAGMENT_CACHE_SIZE']
+    cache.max_bytes = app.config['FRAGMENT_CACHE_MAX_BYTES']
+    cache.clear()
+
+
+def urgency(todo, todo_status, now):
+    """
+    The urgency bucket highlighted on a card, only on the pending view.
+
+    Returns:
+        - 'overdue', 'urgent' (due within the hour) or None.
+    """
+    if todo_status != 'p':
+        return None
+    if todo.due_time <= now:
+        return 'overdue'
+    if todo.due_time <= now + URGENT_WINDOW:
+        return 'urgent'
+    return None
+
+
+def render_todo_cards(todos, todo_status, now):
+    """
+    Renders the cards of a `/list` page, reusing cached markup for every
+    card whose content and urgency bucket are unchanged. Must run inside a
+    request, since the cards contain URLs.
+
+    Returns:
+        - A list of `Markup`, one per todo, in order.
+    """
+    template = None
+    cards = []
+    for todo in todos:
+        bucket = urgency(todo, todo_status, now)
+        key = (todo.todo_id, todo.title, todo.created_time, todo.due_time, todo_status, bucket)
+        html = cache.get(key)
+        if html is None:
+            fragment_cache_misses.inc()
+            started = time.perf_counter()
+            if template is None:
+                template = current_app.jinja_env.get_template(CARD_TEMPLATE)
+            html = template.render(todo=todo, todo_status=todo_status, urgency=bucket)
+            add_time('template', time.perf_counter() - started)
+            cache.set(key, html)
+        else:
+            fragment_cache_hits.inc()
+        cards.append(Markup(html))
+    return cards
@@ -0,0 +1,304 @@
+"""
+Optional group commit of todo writes.
+
+Every `create`, `update` and status change used to commit its own
+transaction. On SQLite each commit is a WAL write and sync, so write
+throughput was capped by the storage's sync rate rather than by the work.
+With `GROUP_COMMIT_ENABLED`, these mutations are handed to one writer
+thread per process, which:
+- collects the mutations arriving within `GROUP_COMMIT_WINDOW_MS` of the
+  first one, at most `GROUP_COMMIT_MAX_BATCH`, plus any that queued up while
+  the previous batch was committing,
+- runs each one inside a SAVEPOINT of a single transaction, so a mutation
+  that fails (e.g. a validation error) is rolled back alone and its caller
+  gets the exception,
+- commits the batch once, and only then evicts the touched users from the
+  user cache, reschedules their deadlines, releases the callers with their
+  results and publishes the dashboard events.
+
+A request therefore still returns only after its write is durable. The
+window adds at most that many milliseconds of latency to a write. A batch
+that fails to commit fails every caller in it: on SQLite the writer opens
+the transaction with an explicit `BEGIN IMMEDIATE`, since pysqlite would
+otherwise commit each savepoint on its own.
+
+A caller waits `GROUP_COMMIT_TIMEOUT` seconds for its mutation to be picked
+up. If it is still queued by then, it is withdrawn, never runs, and the
+caller gets `WriteTimeout` (answered with a retryable 503). Once the writer
+has started it, the caller waits for its batch to finish, so an error is
+never reported for a write that was committed.
+
+Mutations run in the writer's own session: they take ids and plain values,
+never objects of the request's session, and return objects detached from
+the writer's session. Inside a batch, `services.commit` and
+`services.after_commit` register their work with the batch (`current_batch()`)
+instead of committing or publishing.
+
+Classes
+-------
+- `WriteTimeout` : A mutation was withdrawn after waiting too long in the queue.
+- `Batch` : The post-commit work of the mutations of one transaction.
+- `GroupCommitter` : The queue and writer thread.
+
+Functions
+---------
+- `current_batch()` : The batch being run by this thread, or None.
+- `init_group_commit(app)` : Configures the committer from the app config.
+"""
+
+import os
+import queue
+import threading
+import time
+from flask import current_app
+from prometheus_client import Counter, Histogram
+from .scheduler import scheduler
+from . import db, user_cache
+
+# Prometheus Metrics
+group_commit_batch_size = Histogram(
+    'group_commit_batch_size', 'Mutations committed per group-commit transaction',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+group_commit_seconds = Histogram(
+    'group_commit_seconds', 'Duration of a group-commit COMMIT',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+group_commit_wait_seconds = Histogram(
+    'group_commit_wait_seconds', 'Time a mutation waited from submission to its durable commit',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+group_commit_failures = Counter('group_commit_failures_total', 'Group-commit transactions that failed to commit')
+
+_local = threading.local()
+
+
+class WriteTimeout(Exception):
+    """Raised when a mutation waited too long to be run; it was not applied."""
+
+
+def current_batch():
+    """The `Batch` the current thread is running mutations for, or None outside the writer."""
+    return getattr(_local, 'batch', None)
+
+
+class Batch:
+    """
+    Post-commit work registered by the mutations of one transaction. Work
+    registered by a mutation that fails is dropped with its savepoint.
+    """
+
+    def __init__(self):
+        self.user_ids = set()
+        self.callbacks = []
+        self._pending_user_ids = set()
+        self._pending_callbacks = []
+
+    def touch(self, user_id):
+        """Evicts the user from the user cache and reschedules its deadlines after the commit."""
+        self._pending_user_ids.add(user_id)
+
+    def after_commit(self, callback, *args):
+        """Runs `callback(*args)` once the batch is committed."""
+        self._pending_callbacks.append((callback, args))
+
+    def keep(self):
+        self.user_ids |= self._pending_user_ids
+        self.callbacks += self._pending_callbacks
+        self.discard()
+
+    def discard(self):
+        self._pending_user_ids = set()
+        self._pending_callbacks = []
+
+
+class Mutation:
+    """One submitted call and the event its caller waits on."""
+
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.state = 'queued'
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Marks the mutation as run by the writer, unless its caller withdrew it first."""
+        with self._lock:
+            if self.state == 'cancelled':
+                return False
+            self.state = 'running'
+            return True
+
+    def cancel(self):
+        """Withdraws the mutation if the writer has not started it."""
+        with self._lock:
+            if self.state == 'queued':
+                self.state = 'cancelled'
+            return self.state == 'cancelled'
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        group_commit_wait_seconds.observe(time.perf_counter() - self.submitted)
+        self.done.set()
+
+
+class GroupCommitter:
+    """
+    Runs submitted mutations on a writer thread, many per transaction.
+
+    Args:
+        window: seconds to wait for more mutations after the first one of a batch.
+        max_batch: mutations per transaction.
+        timeout: seconds a caller waits for its commit before giving up.
+    """
+
+    def __init__(self, window=0.002, max_batch=64, timeout=30):
+        self.enabled = False
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._app = None
+
+    def ensure_started(self, app):
+        """Starts the writer thread once per process (again after a fork)."""
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._app = app
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self.run_forever, name="group-commit", daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def submit(self, fn, *args):
+        """
+        Runs `fn(*args)` in the next batch and waits for its commit.
+
+        Raises:
+            - Whatever `fn` raised, or the commit's error.
+            - WriteTimeout if the writer did not start it within `timeout`
+              seconds; it is then withdrawn and never applied.
+
+        Returns:
+            - What `fn` returned.
+        """
+        self.ensure_started(current_app._get_current_object())
+        mutation = Mutation(fn, args)
+        self._queue.put(mutation)
+        if not mutation.done.wait(self.timeout):
+            if mutation.cancel():
+                raise WriteTimeout("Write was not started in time")
+            # Already in a running batch, whose outcome the caller must get
+            mutation.done.wait()
+        if mutation.error is not None:
+            raise mutation.error
+        return mutation.result
+
+    def collect(self):
+        """Blocks for the first mutation, then gathers the batch that goes with it."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run_forever(self):
+        while True:
+            mutations = self.collect()
+            with self._app.app_context():
+                try:
+                    self.run_batch(mutations)
+                except Exception as e:
+                    self._app.logger.error(f"Group commit error: {str(e)}")
+                    for mutation in mutations:
+                        if not mutation.done.is_set():
+                            mutation.finish(error=e)
+                finally:
+                    db.session.remove()
+
+    def run_batch(self, mutations):
+        """
+        Runs the mutations in one transaction, each in a savepoint, commits
+        and releases their callers. Must run inside an app context.
+        """
+        session = db.session()
+        # Results are handed to other threads, so they must stay readable after the commit
+        session.expire_on_commit = False
+        connection = session.connection()
+        if connection.dialect.name == 'sqlite':
+            # pysqlite only opens a transaction before DML, so the first SAVEPOINT would
+            # start one itself and its RELEASE would commit each mutation on its own.
+            # IMMEDIATE takes the write lock now, under the busy timeout, rather than
+            # failing to upgrade a read lock halfway through the batch.
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        batch = Batch()
+        done = []
+        _local.batch = batch
+        try:
+            for mutation in mutations:
+                if not mutation.start():
+                    continue
+                try:
+                    with session.begin_nested():
+                        result = mutation.fn(*mutation.args)
+                except Exception as e:
+                    batch.discard()
+                    mutation.finish(error=e)
+                else:
+                    batch.keep()
+                    done.append((mutation, result))
+        finally:
+            _local.batch = None
+
+        started = time.perf_counter()
+        try:
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            group_commit_failures.inc()
+            for mutation, _ in done:
+                mutation.finish(error=e)
+            return
+        group_commit_seconds.observe(time.perf_counter() - started)
+        group_commit_batch_size.observe(len(done))
+
+        # Detach the results before the post-commit work loads fresh rows
+        session.expunge_all()
+        # Evict before releasing the callers, so their next request sees the new counters;
+        # the writes are committed, so a failure here must not be reported to them
+        if batch.user_ids:
+            try:
+                user_cache.invalidate(*batch.user_ids)
+                scheduler.reschedule(*batch.user_ids)
+            except Exception as e:
+                self._app.logger.error(f"Group commit invalidation error: {str(e)}")
+        for mutation, result in done:
+            mutation.finish(result)
+        for callback, args in batch.callbacks:
+            try:
+                callback(*args)
+            except Exception as e:
+                self._app.logger.error(f"Group commit callback error: {str(e)}")
+
+
+committer = GroupCommitter()
+
+
+def init_group_commit(app):
+    """Configures the committer from `GROUP_COMMIT_*` settings; the writer starts with the first write."""
+    committer.enabled = app.config['GROUP_COMMIT_ENABLED']
+    committer.window = app.config['GROUP_COMMIT_WINDOW_MS'] / 1000
+    committer.max_batch = app.config['GROUP_COMMIT_MAX_BATCH']
+    committer.timeout = app.config['GROUP_COMMIT_TIMEOUT']
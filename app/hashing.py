@@ -0,0 +1,164 @@
+"""
+Password hashing off the request thread.
+
+pbkdf2 is deliberately CPU-heavy. Running it inline on the WSGI worker lets
+a burst of logins or signups pin the pod's CPU and starve every other route,
+so hashing and verification run on a small, bounded process pool instead:
+- `HASH_WORKERS` processes do the hashing (0 runs it inline, e.g. for tests).
+- At most `HASH_QUEUE_LIMIT` hash/verify calls may be in flight or waiting;
+  beyond that `HashingBusy` is raised and the route answers 503.
+- `PASSWORD_HASH_METHOD` selects the werkzeug method and cost, e.g.
+  `pbkdf2:sha256:600000`. Hashes made with another method or iteration count
+  are upgraded on the next successful login (`needs_rehash`).
+
+Functions
+---------
+- `init_hashing(app)` : Configures the pool from the app config.
+- `hash_password(password)` : Hashes a password with the configured method.
+- `verify_password(password_hash, password)` : Checks a password against a hash.
+- `needs_rehash(password_hash)` : Whether a hash uses an outdated method or cost.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from prometheus_client import Counter, Histogram
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from .instrumentation import add_time
+
+# Prometheus Metrics
+password_hash_seconds = Histogram('password_hash_seconds', 'Time to hash a password, including queueing')
+password_verify_seconds = Histogram('password_verify_seconds', 'Time to verify a password, including queueing')
+password_hashing_rejected_total = Counter('password_hashing_rejected_total', 'Hash/verify calls rejected because the pool was saturated')
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is saturated or too slow to answer."""
+
+
+class HashingPool:
+    """
+    Bounded process pool for password hashing.
+
+    The pool is created lazily in the process that first uses it, so it is
+    never inherited across a fork of a preloaded WSGI server.
+    """
+
+    def __init__(self, workers=2, queue_limit=16, timeout=10, start_method='forkserver'):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.start_method = start_method
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def configure(self, workers, queue_limit, timeout, start_method):
+        self.shutdown()
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.start_method = start_method
+        self._slots = threading.BoundedSemaphore(queue_limit)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                context = multiprocessing.get_context(self.start_method)
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, fn, *args):
+        """
+        Runs `fn(*args)` on the pool and waits for the result.
+
+        Raises:
+            - HashingBusy if `queue_limit` calls are already pending or the
+              call takes longer than `timeout` seconds.
+        """
+        if not self._slots.acquire(blocking=False):
+            password_hashing_rejected_total.inc()
+            raise HashingBusy("Password hashing queue is full")
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            future = self._get_executor().submit(fn, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except TimeoutError:
+                future.cancel()
+                password_hashing_rejected_total.inc()
+                raise HashingBusy("Password hashing timed out")
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pool = HashingPool()
+hash_method = 'pbkdf2:sha256'
+
+
+def init_hashing(app):
+    """Configures the pool and hash method from `HASH_*` and `PASSWORD_HASH_METHOD` settings."""
+    global hash_method
+    hash_method = app.config['PASSWORD_HASH_METHOD']
+    pool.configure(
+        workers=app.config['HASH_WORKERS'],
+        queue_limit=app.config['HASH_QUEUE_LIMIT'],
+        timeout=app.config['HASH_TIMEOUT'],
+        start_method=app.config['HASH_POOL_START_METHOD']
+    )
+
+
+def hash_password(password):
+    """
+    Hashes a password with the configured method on the hashing pool.
+
+    Raises:
+        - HashingBusy if the pool is saturated.
+    """
+    started = time.perf_counter()
+    try:
+        return pool.run(generate_password_hash, password, hash_method)
+    finally:
+        elapsed = time.perf_counter() - started
+        password_hash_seconds.observe(elapsed)
+        add_time('hash', elapsed)
+
+
+def verify_password(password_hash, password):
+    """
+    Checks a password against a stored hash on the hashing pool.
+
+    Raises:
+        - HashingBusy if the pool is saturated.
+    """
+    started = time.perf_counter()
+    try:
+        return pool.run(check_password_hash, password_hash, password)
+    finally:
+        elapsed = time.perf_counter() - started
+        password_verify_seconds.observe(elapsed)
+        add_time('hash', elapsed)
+
+
+def normalized_method(method):
+    """Spells out the default iteration count of a pbkdf2 method, as stored in hashes."""
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2' and len(parts) == 2:
+        parts.append(str(DEFAULT_PBKDF2_ITERATIONS))
+    return ':'.join(parts)
+
+
+def needs_rehash(password_hash):
+    """Whether a stored hash was made with another method or cost than the configured one."""
+    return password_hash.split('$', 1)[0] != normalized_method(hash_method)
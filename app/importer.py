@@ -0,0 +1,145 @@
+"""
+Streaming import of todos from CSV or JSON Lines.
+
+Creating thousands of todos one `POST` at a time costs a request, a commit
+and a counter update each. The importer reads the upload as a stream, row by
+row, and inserts valid rows in batches of `IMPORT_BATCH_SIZE` with one
+multi-row `INSERT`, one aggregated counter update and one commit per batch,
+so memory stays flat and the write lock is never held for the whole file.
+
+Rows:
+- `title` : Required, 3 to 100 characters.
+- `due_time` : Required, ISO 8601 (`YYYY-MM-DDTHH:MM[:SS]`), not in the past.
+- `status` : Optional `p`, `s` or `f`, pending by default.
+
+CSV uploads need a header line naming the columns. Invalid rows are skipped
+and reported with their line number; at most `IMPORT_MAX_ROWS` rows are read.
+
+Functions
+---------
+- `read_csv(stream)` / `read_jsonl(stream)` : Yield `(line number, row dict)` from a binary stream.
+- `import_todos(user, rows, batch_size, max_rows)` : Validates and inserts rows in batches.
+"""
+
+import codecs
+import csv
+import json
+from collections import namedtuple
+from datetime import datetime
+from .models import Todo, db
+from . import services
+
+# Reported errors are capped so a broken file does not produce a huge response
+MAX_REPORTED_ERRORS = 50
+
+ImportResult = namedtuple('ImportResult', ['imported', 'rejected', 'errors', 'truncated'])
+
+
+def text_lines(stream):
+    """Decodes a binary stream line by line as UTF-8 (a leading BOM is dropped)."""
+    return codecs.getreader('utf-8-sig')(stream)
+
+
+def read_csv(stream):
+    """Yields `(line number, row)` for every data row of a CSV stream with a header."""
+    reader = csv.DictReader(text_lines(stream))
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(stream):
+    """Yields `(line number, row)` for every non-empty line of a JSON Lines stream."""
+    for line_num, line in enumerate(text_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_num, row if isinstance(row, dict) else None
+
+
+def todo_values(user_id, row, now):
+    """
+    Validates a row with the `Todo` model validators.
+
+    Raises:
+        - ValueError describing the first invalid field.
+
+    Returns:
+        - Column values ready for a bulk `INSERT`.
+    """
+    if row is None:
+        raise ValueError("Row must be a JSON object")
+    status = row.get('status') or 'p'
+    if not isinstance(status, str) or status.strip() not in services.STATUS_COUNTERS:
+        raise ValueError("'status' must be one of 'p', 's' or 'f'")
+    status = status.strip()
+    due_time = row.get('due_time')
+    if not isinstance(due_time, str) or not due_time.strip():
+        raise ValueError("'due_time' must be an ISO 8601 date time")
+    todo = Todo(
+        user_id=user_id,
+        title=str(row.get('title') or '').strip(),
+        created_time=now,
+        due_time=datetime.fromisoformat(due_time.strip()),
+        status=status
+    )
+    return {
+        'user_id': user_id,
+        'title': todo.title,
+        'created_time': todo.created_time,
+        'due_time': todo.due_time,
+        'status': todo.status
+    }
+
+
+def import_todos(user, rows, batch_size=500, max_rows=10000):
+    """
+    Inserts valid rows for the user in batches, each with its counter deltas.
+
+    Args:
+        user: the owning `User`.
+        rows: iterable of `(line number, row dict)`, e.g. from `read_csv`.
+        batch_size: rows per `INSERT` and commit.
+        max_rows: rows read at most; the rest of the stream is ignored.
+
+    Returns:
+        - `ImportResult(imported, rejected, errors, truncated)`.
+    """
+    now = datetime.now()
+    imported = rejected = 0
+    errors = []
+    truncated = False
+    batch = []
+
+    def flush():
+        deltas = {}
+        for values in batch:
+            deltas[values['status']] = deltas.get(values['status'], 0) + 1
+        db.session.execute(db.insert(Todo), batch)
+        services.shift_counters(user.id, deltas)
+        services.commit(user.id)
+        services.todo_created.inc(len(batch))
+        batch.clear()
+
+    for count, (line_num, row) in enumerate(rows, start=1):
+        if count > max_rows:
+            truncated = True
+            break
+        try:
+            batch.append(todo_values(user.id, row, now))
+        except (ValueError, TypeError) as e:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'line': line_num, 'error': str(e)})
+            continue
+        imported += 1
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    if imported:
+        services.notify(user, 'imported', None)
+    return ImportResult(imported, rejected, errors, truncated)
@@ -0,0 +1,130 @@
+"""
+Per-request time attribution: SQL, templates and password hashing.
+
+The default `PrometheusMetrics` histograms say how long a request took, not
+where the time went. Every request now accumulates, in `flask.g`:
+- the number of SQL statements and their cumulative execution time, from
+  the engine's `before_cursor_execute`/`after_cursor_execute` events,
+- template render time, from Flask's template signals plus the todo cards
+  rendered by `fragments` (`add_time('template', ...)`),
+- password hashing and verification time (`add_time('hash', ...)` in
+  `hashing`).
+
+When the request is torn down (after a streamed body has been sent), they
+are observed into histograms labelled by endpoint.
+
+Slow requests:
+With `SLOW_REQUEST_SECONDS` set, the statements of each request are kept
+(at most `SLOW_REQUEST_MAX_QUERIES`, truncated) and any request slower than
+that is logged as a warning together with the breakdown and its queries.
+
+Statements run outside a request (background scheduler, CLI commands) are
+not attributed.
+
+Functions
+---------
+- `init_instrumentation(app)` : Registers the engine events, signals and request hooks.
+- `add_time(kind, seconds)` : Adds time spent on `template` or `hash` work to the current request.
+"""
+
+import time
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from prometheus_client import Histogram
+from sqlalchemy import event
+from . import db
+
+# Prometheus Histograms
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+request_sql_queries = Histogram(
+    'request_sql_queries', 'SQL statements executed per request', ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+)
+request_sql_seconds = Histogram('request_sql_seconds', 'Cumulative SQL time per request', ['endpoint'], buckets=SECONDS_BUCKETS)
+request_template_seconds = Histogram('request_template_seconds', 'Template render time per request', ['endpoint'], buckets=SECONDS_BUCKETS)
+request_hash_seconds = Histogram('request_hash_seconds', 'Password hashing time per request', ['endpoint'], buckets=SECONDS_BUCKETS)
+
+# Characters of a statement kept for the slow-request log
+MAX_STATEMENT_LENGTH = 500
+
+slow_request_seconds = 0
+max_logged_queries = 50
+
+
+def add_time(kind, seconds):
+    """Adds `seconds` of `kind` ('template' or 'hash') work to the current request, if any."""
+    if has_request_context() and 'timings' in g:
+        g.timings[kind] += seconds
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is None or not has_request_context() or 'timings' not in g:
+        return
+    elapsed = time.perf_counter() - started
+    g.timings['sql'] += elapsed
+    g.sql_queries += 1
+    if slow_request_seconds and len(g.queries) < max_logged_queries:
+        g.queries.append((elapsed, ' '.join(statement.split())[:MAX_STATEMENT_LENGTH]))
+
+
+def init_instrumentation(app):
+    """Configures the slow-request log and hooks the app's engine, templates and requests."""
+    global slow_request_seconds, max_logged_queries
+    slow_request_seconds = app.config['SLOW_REQUEST_SECONDS']
+    max_logged_queries = app.config['SLOW_REQUEST_MAX_QUERIES']
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+    @app.before_request
+    def start_timings():
+        g.request_started = time.perf_counter()
+        g.timings = {'sql': 0.0, 'template': 0.0, 'hash': 0.0}
+        g.sql_queries = 0
+        g.queries = []
+
+    def template_started(sender, template, context, **extra):
+        if 'timings' in g:
+            g.template_started = time.perf_counter()
+
+    def template_finished(sender, template, context, **extra):
+        started = g.pop('template_started', None)
+        if started is not None:
+            add_time('template', time.perf_counter() - started)
+
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
+
+    @app.after_request
+    def remember_status(response):
+        g.status_code = response.status_code
+        return response
+
+    @app.teardown_request
+    def observe_timings(exc):
+        if 'timings' not in g:
+            return
+        endpoint = request.endpoint or 'unknown'
+        timings = g.timings
+        request_sql_queries.labels(endpoint=endpoint).observe(g.sql_queries)
+        request_sql_seconds.labels(endpoint=endpoint).observe(timings['sql'])
+        request_template_seconds.labels(endpoint=endpoint).observe(timings['template'])
+        request_hash_seconds.labels(endpoint=endpoint).observe(timings['hash'])
+
+        elapsed = time.perf_counter() - g.request_started
+        if slow_request_seconds and elapsed >= slow_request_seconds:
+            queries = ''.join(f"\n  {seconds * 1000:8.2f} ms  {statement}" for seconds, statement in g.queries)
+            app.logger.warning(
+                f"Slow request {request.method} {request.full_path.rstrip('?')} -> {g.get('status_code', 500)} "
+                f"in {elapsed * 1000:.1f} ms (endpoint {endpoint}): "
+                f"sql {timings['sql'] * 1000:.1f} ms in {g.sql_queries} queries, "
+                f"templates {timings['template'] * 1000:.1f} ms, hashing {timings['hash'] * 1000:.1f} ms"
+                f"{queries}"
+            )
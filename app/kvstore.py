@@ -0,0 +1,172 @@
+"""
+Key-value stores shared between application processes.
+
+Caches and other per-key state that must be visible to every worker and
+replica go through a small store interface, so the backend can be chosen
+from configuration:
+- `memory://` : `MemoryStore`, a thread-safe in-process store with TTLs. It is
+  the local stand-in for a shared backend in tests and single-process runs.
+- `redis://host:port/db` : `RedisStore`, backed by Redis. Needs the optional
+  `redis` package.
+
+Each consumer gets its own store with its own key prefix (`todo:user:`,
+`todo:ratelimit:`), so `clear()` on one of them never touches the keys of
+another sharing the same Redis server.
+
+Values must be JSON-serializable. `update()` applies a read-modify-write
+function atomically, which is what per-key counters such as rate-limit
+buckets need when several processes share a store.
+
+Classes
+-------
+- `MemoryStore` : In-process store.
+- `RedisStore` : Redis-backed store.
+
+Functions
+---------
+- `make_store(url, prefix)` : Builds a store from a URL, or returns None for an empty URL.
+"""
+
+import json
+import threading
+import time
+
+
+class MemoryStore:
+    """
+    Thread-safe in-process key-value store with per-key TTLs.
+
+    Mirrors the behaviour of `RedisStore` so code written against the shared
+    interface can run without a server.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._set(key, value, ttl)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def update(self, key, fn, ttl=None):
+        """
+        Atomically replaces the value of `key` with `fn(old value)[0]`.
+
+        Returns:
+            - The second item returned by `fn`.
+        """
+        with self._lock:
+            value, result = fn(self._get(key))
+            self._set(key, value, ttl)
+            return result
+
+    def _get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= self.clock():
+            del self._data[key]
+            return None
+        return json.loads(value)
+
+    def _set(self, key, value, ttl):
+        expires = self.clock() + ttl if ttl else None
+        self._data[key] = (json.dumps(value), expires)
+
+
+class RedisStore:
+    """
+    Key-value store backed by Redis.
+
+    Args:
+        url: Redis connection URL, e.g. `redis://localhost:6379/0`.
+        prefix: prepended to every key, so several apps and consumers can share
+            one server; `clear()` deletes only the keys under it.
+    """
+
+    def __init__(self, url, prefix):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RedisStore needs the 'redis' package: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value), px=milliseconds(ttl))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def update(self, key, fn, ttl=None):
+        """
+        Atomically replaces the value of `key` with `fn(old value)[0]`, using
+        WATCH/MULTI and retrying when another client changed the key meanwhile.
+
+        Returns:
+            - The second item returned by `fn`.
+        """
+        import redis
+        key = self.prefix + key
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    value, result = fn(None if raw is None else json.loads(raw))
+                    pipe.multi()
+                    pipe.set(key, json.dumps(value), px=milliseconds(ttl))
+                    pipe.execute()
+                    return result
+                except redis.WatchError:
+                    continue
+
+
+def milliseconds(ttl):
+    """Redis expiry in whole milliseconds, None for no expiry."""
+    return max(1, int(ttl * 1000)) if ttl else None
+
+
+def make_store(url, prefix):
+    """
+    Builds a store from a URL, whose keys live under `prefix` (e.g. `todo:user:`).
+
+    Returns:
+        - `MemoryStore` for `memory://`, `RedisStore` for `redis://` or
+          `rediss://`, None for an empty URL.
+
+    Raises:
+        - ValueError for an unsupported scheme.
+    """
+    if not url:
+        return None
+    if url.startswith('memory://'):
+        return MemoryStore()
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisStore(url, prefix)
+    raise ValueError(f"Unsupported store URL: {url}")
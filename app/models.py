@@ -5,11 +5,13 @@ Models :
 ---------
 User : User Model for Authentication and Authorization
 Todo : Stores and Manages Todo tasks
+ArchivedTodo : Completed Todos moved out of the `todo` table by the archival policy
+PurgeJob : Progress of a background mass deletion (`/delete`, `/delete_users`)
 """
 
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from . import login_manager,db
+from . import db
 from sqlalchemy import event
 from datetime import datetime,timedelta
 from sqlalchemy.orm import validates
@@ -52,17 +54,29 @@ class User(UserMixin,db.Model):
         - Must include at least one uppercase letter, one lowercase letter, and one special character.
 
     success : int
-        Number of successful Todos.
+        Number of successful Todos, archived ones included.
         - Default is 0.
 
     failure : int
-        Number of failed Todos.
+        Number of failed Todos, archived ones included.
         - Default is 0.
 
     admin : bool
         Determines if the user has admin privileges.
         - Default is False (0).
 
+    todo_version : int
+        Incremented on every change to the user's todos or counters.
+        - Used to build the `/list` ETag.
+
+    urgent : int
+        Number of pending Todos due within the next hour.
+        - Recomputed by every todo write and by the deadline scheduler when a boundary passes.
+
+    overdue : int
+        Number of pending Todos whose due time has passed.
+        - Maintained like `urgent`.
+
     Methods:
     --------
     validate_length(self, key, value)
@@ -83,6 +97,9 @@ class User(UserMixin,db.Model):
     failure=db.Column(db.Integer,nullable=False,default=0)
     pending=db.Column(db.Integer,nullable=False,default=0)
     admin=db.Column(db.Boolean,default=0)
+    todo_version=db.Column(db.Integer,nullable=False,default=0,server_default='0')
+    urgent=db.Column(db.Integer,nullable=False,default=0,server_default='0')
+    overdue=db.Column(db.Integer,nullable=False,default=0,server_default='0')
 
     @validates("user_name", "first_name", "middle_name", "last_name")
     def validate_length(self, key, value):
@@ -121,10 +138,6 @@ class User(UserMixin,db.Model):
 def before_event_listener(mapper,connection,target):
     target.full_name=' '.join((target.first_name,target.middle_name,target.last_name))
     
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
 class Todo(db.Model):
     """
     Todo Model for storing and managing user todo tasks.
@@ -159,8 +172,25 @@ class Todo(db.Model):
 
     validate_due_time(self, key, value)
         Ensures `due_time` is later than `created_time`, if provided.
+
+    Indexes:
+    --------
+    ix_todo_user_status_due : (user_id, status, due_time)
+        Serves the `/list` status filters sorted by due time and the urgent/deadlined ranges.
+
+    ix_todo_user_status_created : (user_id, status, created_time)
+        Serves the `/list` status filters sorted by created time.
+
+    ix_todo_status_due : (status, due_time)
+        Serves the cross-user deadline scans of the scheduler and the auto-fail policy.
     """
 
+    __table_args__ = (
+        db.Index('ix_todo_user_status_due', 'user_id', 'status', 'due_time'),
+        db.Index('ix_todo_user_status_created', 'user_id', 'status', 'created_time'),
+        db.Index('ix_todo_status_due', 'status', 'due_time'),
+    )
+
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     todo_id = db.Column(db.Integer, primary_key=True)  # Automatically assigned
     title = db.Column(db.String(100), nullable=False) #Todo-task
@@ -170,14 +200,119 @@ class Todo(db.Model):
 
     @validates("title")
     def validate_title(self, key, value):
-        """Validates that the title length is between 3 and 100 characters."""
+        """Validates that the title is a string of 3 to 100 characters."""
+        if not isinstance(value, str):
+            raise ValueError("Title must be a string")
         if not (3 <= len(value) <= 100):
             raise ValueError("Title must be between 3 and 100 characters")
         return value
 
     @validates("due_time")
     def validate_due_time(self, key, value):
-        """Validates that due_time is greater than created_time, if provided."""
+        """
+        Validates that due_time is greater than created_time, if provided.
+        Times with a UTC offset are stored as the server's local time, like
+        the naive ones.
+        """
+        if value is not None and not isinstance(value, datetime):
+            raise ValueError("Due time must be a date time")
+        if value and value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
         if value and value+timedelta(minutes=1) < self.created_time:
             raise ValueError("Due time must be greater than created time")
         return value
+
+
+class ArchivedTodo(db.Model):
+    """
+    A succeeded or failed Todo moved out of the `todo` table by the archival
+    policy (`app/archive.py`), so the table every `/list` query reads only
+    grows with active todos. Archived todos are read-only.
+
+    Attributes:
+    ----------
+    archive_id : int
+        Primary key of the archived row.
+        - SQLite can hand a deleted todo's id out again, so `todo_id` is not unique here.
+
+    user_id, todo_id, title, created_time, due_time, status : as in `Todo`
+        - `status` is 's' or 'f'.
+
+    archived_time : datetime
+        When the todo was moved to the archive.
+
+    Indexes:
+    --------
+    ix_todo_archive_user_status_due : (user_id, status, due_time)
+        Serves the paginated `/archive` view, most recently due first.
+    """
+
+    __tablename__ = 'todo_archive'
+    __table_args__ = (
+        db.Index('ix_todo_archive_user_status_due', 'user_id', 'status', 'due_time'),
+    )
+
+    archive_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    todo_id = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(100), nullable=False)
+    created_time = db.Column(db.DateTime)
+    due_time = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(1), nullable=False)
+    archived_time = db.Column(db.DateTime, nullable=False)
+
+
+class PurgeJob(db.Model):
+    """
+    A mass deletion run in the background in small chunks by `app/purge.py`,
+    so its progress can be read from any process.
+
+    Attributes:
+    ----------
+    id : int
+        Primary key, returned to the client to poll the job.
+
+    kind : str
+        'todos' deletes the todos of `user_id`, 'users' deletes every user with their todos.
+
+    user_id : int (Optional)
+        The user whose todos are deleted; None for a 'users' job.
+        - Not a foreign key, the job outlives the users it deletes.
+
+    up_to_id : int
+        Largest todo id ('todos') or user id ('users') when the job was queued;
+        rows created later are left alone.
+
+    status : str
+        'queued', 'running', 'done' or 'failed'.
+
+    total : int
+        Rows to delete, counted when the job was queued.
+
+    deleted : int
+        Rows deleted so far.
+
+    created_time, updated_time, finished_time : datetime
+        When the job was queued, last made progress and ended.
+        - A running job whose `updated_time` is too old is taken over by another process.
+
+    error : str (Optional)
+        Why a failed job stopped.
+    """
+
+    __tablename__ = 'purge_job'
+    __table_args__ = (
+        db.Index('ix_purge_job_status', 'status', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(5), nullable=False)
+    user_id = db.Column(db.Integer)
+    up_to_id = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(8), nullable=False, default='queued')
+    total = db.Column(db.Integer, nullable=False, default=0)
+    deleted = db.Column(db.Integer, nullable=False, default=0)
+    created_time = db.Column(db.DateTime, nullable=False)
+    updated_time = db.Column(db.DateTime, nullable=False)
+    finished_time = db.Column(db.DateTime)
+    error = db.Column(db.String(200))
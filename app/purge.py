@@ -0,0 +1,362 @@
+"""
+Background mass deletion in bounded chunks.
+
+`/delete` and `/delete_users` used to delete every matching row with one
+unbounded `DELETE` inside the request. On SQLite that held the write lock
+for as long as the whole table took, stalling every other writer, and
+`/delete` removed every user's todos rather than the caller's. They now
+queue a `PurgeJob` and answer right away with its id; the deletion itself:
+- runs on the deadline scheduler's thread (or `flask run-purges`). A
+  process without a scheduler (`DEADLINE_SCHEDULER_ENABLED=false`) has
+  nothing to hand it to, so unless `PURGE_INLINE=false` leaves it to a
+  dedicated `flask deadline-scheduler` process, the request runs the job to
+  completion itself, chunk by chunk like the scheduler would,
+- deletes `PURGE_BATCH_SIZE` rows per transaction with the usual services
+  (`bulk_delete`, `delete_archived`), so counters and open dashboards stay
+  current and the write lock is released between chunks,
+- sleeps `PURGE_PAUSE_SECONDS` after each chunk: SQLite's busy handler
+  backs off, so without a gap a waiting request keeps losing the lock to
+  the next chunk,
+- runs at most `PURGE_MAX_BATCHES` chunks per pass before yielding to the
+  scheduler's deadline updates, then carries on right away.
+
+A 'todos' job deletes the user's live and archived todos that existed when
+it was queued. A 'users' job goes through the users that existed when it was
+queued, oldest first, deleting each one's todos and then the user.
+
+Jobs live in the database, so `GET /purges/<id>` reports progress from any
+process. The process that queues a job wakes its own scheduler; every
+scheduler also checks for jobs queued by other processes every
+`PURGE_POLL_SECONDS`. A job is claimed with a guarded `UPDATE`,
+and a running job that made no progress for `PURGE_STALE_SECONDS` (its
+process died) is taken over by the next scheduler that looks.
+
+Classes
+-------
+- `PurgeRunner` : Claims queued jobs and runs them chunk by chunk.
+
+Functions
+---------
+- `queue_todo_purge(user)` : Queues the deletion of the user's todos.
+- `queue_user_purge()` : Queues the deletion of every user and todo.
+- `run_job_now(job)` : Runs a queued job to completion in the calling request.
+- `job_to_dict(job)` : Serializes a job's progress.
+- `init_purge(app)` : Configures the runner and registers it with the scheduler.
+"""
+
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from prometheus_client import Counter, Histogram
+from sqlalchemy import select, func, or_, and_
+from .models import PurgeJob, Todo, ArchivedTodo, User, db
+from .queries import purge_todos_query, purge_archived_query
+from .scheduler import scheduler
+from .usernames import index as username_index
+from . import services, user_cache
+
+# Consecutive failed chunks before a job is given up as failed; earlier
+# errors (e.g. a lock timeout) are retried on the scheduler's next pass
+MAX_ERRORS = 3
+
+# Seconds a request running its own job waits before retrying after an error
+INLINE_RETRY_SECONDS = 1
+
+# Prometheus Metrics
+purge_rows_total = Counter('purge_rows_total', 'Rows deleted by background purge jobs', ['kind'])
+purge_jobs_total = Counter('purge_jobs_total', 'Background purge jobs ended', ['kind', 'status'])
+purge_chunk_seconds = Histogram(
+    'purge_chunk_seconds', 'Duration of one purge chunk transaction',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+
+def queue_todo_purge(user):
+    """
+    Queues the deletion of the user's todos and wakes the scheduler.
+
+    Returns:
+        - The new `PurgeJob`, or the user's job still waiting in the queue.
+    """
+    queued = db.session.scalars(
+        select(PurgeJob).where(PurgeJob.status == 'queued', PurgeJob.kind == 'todos', PurgeJob.user_id == user.id)
+    ).first()
+    if queued:
+        return queued
+    up_to_id = db.session.scalar(select(func.max(Todo.todo_id)).where(Todo.user_id == user.id)) or 0
+    total = db.session.scalar(select(func.count()).where(Todo.user_id == user.id, Todo.todo_id <= up_to_id))
+    total += db.session.scalar(select(func.count()).where(ArchivedTodo.user_id == user.id))
+    return queue_job('todos', user.id, up_to_id, total)
+
+
+def queue_user_purge():
+    """
+    Queues the deletion of every user and their todos and wakes the scheduler.
+
+    Returns:
+        - The new `PurgeJob`.
+    """
+    up_to_id = db.session.scalar(select(func.max(User.id))) or 0
+    total = (
+        db.session.scalar(select(func.count()).select_from(User))
+        + db.session.scalar(select(func.count()).select_from(Todo))
+        + db.session.scalar(select(func.count()).select_from(ArchivedTodo))
+    )
+    return queue_job('users', None, up_to_id, total)
+
+
+def queue_job(kind, user_id, up_to_id, total):
+    now = datetime.now()
+    job = PurgeJob(
+        kind=kind, user_id=user_id, up_to_id=up_to_id, status='queued', total=total,
+        created_time=now, updated_time=now
+    )
+    db.session.add(job)
+    db.session.commit()
+    if inline:
+        run_job_now(job)
+    else:
+        scheduler.wake()
+    return job
+
+
+def run_job_now(job):
+    """
+    Runs a queued job to completion in the calling request, in chunks and
+    with pauses like the scheduler, for processes without a scheduler to
+    hand it to.
+
+    An error (claiming, deleting a chunk or finishing the job) is retried
+    after `INLINE_RETRY_SECONDS`; after `MAX_ERRORS` in a row the job is
+    marked failed and the request returns. If even that fails, the job is
+    left to be taken over once it is `PURGE_STALE_SECONDS` old.
+    """
+    own = PurgeRunner(runner.batch_size, runner.max_batches, runner.stale, runner.pause, job_id=job.id)
+    errors = 0
+    finished = False
+    while not finished:
+        try:
+            deleted, finished = own.run(datetime.now())
+            errors = 0
+        except Exception as e:
+            current_app.logger.error(f"Purge error: {str(e)}")
+            db.session.rollback()
+            errors += 1
+            if errors >= MAX_ERRORS:
+                try:
+                    # `run` may already have given the job up after failed chunks
+                    if db.session.get(PurgeJob, job.id).status not in ('done', 'failed'):
+                        own.finish(job.id, 'failed', str(e))
+                except Exception as e:
+                    current_app.logger.error(f"Purge error: {str(e)}")
+                    db.session.rollback()
+                break
+            time.sleep(max(own.pause, INLINE_RETRY_SECONDS))
+    try:
+        db.session.refresh(job)
+    except Exception:
+        db.session.rollback()
+
+
+def job_to_dict(job):
+    """Serializes a job's progress for the status endpoint."""
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'total': job.total,
+        'deleted': job.deleted,
+        'created_time': job.created_time.isoformat(),
+        'updated_time': job.updated_time.isoformat(),
+        'finished_time': job.finished_time.isoformat() if job.finished_time else None,
+        'error': job.error
+    }
+
+
+class PurgeRunner:
+    """
+    Runs queued purge jobs, one chunk per transaction.
+
+    Args:
+        batch_size: rows per chunk and transaction.
+        max_batches: chunks per run before yielding to the scheduler.
+        stale: seconds without progress after which a running job is taken over.
+        pause: seconds to sleep between chunks, letting writers waiting for the lock in.
+        poll: seconds between checks for jobs queued by other processes while idle (0 disables them).
+        job_id: only run this job, e.g. the one a request runs itself.
+    """
+
+    def __init__(self, batch_size=500, max_batches=20, stale=300, pause=0.05, poll=10, job_id=None):
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.stale = stale
+        self.pause = pause
+        self.poll = poll
+        self.job_id = job_id
+        self._job_id = None
+        self._errors = 0
+
+    def claim(self, now):
+        """
+        Takes the job this process was running, or the oldest queued or
+        abandoned one, marking it running.
+
+        Returns:
+            - The job's id, or None when there is nothing to do.
+        """
+        if self._job_id is not None:
+            return self._job_id
+        claimable = or_(
+            PurgeJob.status == 'queued',
+            and_(PurgeJob.status == 'running', PurgeJob.updated_time < now - timedelta(seconds=self.stale))
+        )
+        if self.job_id is not None:
+            claimable = and_(PurgeJob.id == self.job_id, claimable)
+        job_id = db.session.scalar(select(PurgeJob.id).where(claimable).order_by(PurgeJob.id).limit(1))
+        if job_id is None:
+            db.session.rollback()
+            return None
+        claimed = db.session.execute(
+            db.update(PurgeJob).where(PurgeJob.id == job_id, claimable)
+            .values(status='running', updated_time=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            self._job_id = job_id
+        return job_id if claimed else self.claim(now)
+
+    def step(self, job):
+        """
+        Deletes one chunk of a job, in its own transaction.
+
+        Returns:
+            - The number of rows deleted, or None when the job is complete.
+        """
+        if job.kind == 'todos':
+            user = db.session.get(User, job.user_id)
+            return self.delete_todos(user, job.up_to_id) if user else None
+
+        user = db.session.scalars(select(User).where(User.id <= job.up_to_id).order_by(User.id).limit(1)).first()
+        if user is None:
+            return None
+        deleted = self.delete_todos(user, None)
+        if deleted is not None:
+            return deleted
+        user_id = user.id
+        db.session.execute(db.delete(User).where(User.id == user_id).execution_options(synchronize_session=False))
+        db.session.commit()
+        user_cache.invalidate(user_id)
+        return 1
+
+    def delete_todos(self, user, up_to_id):
+        """
+        Deletes one chunk of the user's todos: live ones (up to `up_to_id`, if
+        given) first, then archived ones.
+
+        Returns:
+            - The number of todos deleted, or None when the user has none left.
+        """
+        todo_ids = db.session.scalars(purge_todos_query(user.id, up_to_id, self.batch_size)).all()
+        if todo_ids:
+            return services.bulk_delete(user, todo_ids=todo_ids)
+        archive_ids = db.session.scalars(purge_archived_query(user.id, self.batch_size)).all()
+        if archive_ids:
+            return services.delete_archived(user, archive_ids)
+        return None
+
+    def finish(self, job_id, status, error=None):
+        db.session.rollback()
+        now = datetime.now()
+        job = db.session.get(PurgeJob, job_id)
+        job.status = status
+        job.error = error and error[:200]
+        job.updated_time = job.finished_time = now
+        db.session.commit()
+        if job.kind == 'users':
+            user_cache.clear()
+            username_index.clear()
+        purge_jobs_total.labels(kind=job.kind, status=status).inc()
+        self._job_id = None
+        self._errors = 0
+
+    def run(self, now):
+        """
+        Runs up to `max_batches` chunks of the queued jobs, oldest job first.
+        Must run inside an app context.
+
+        Returns:
+            - `(deleted, finished)`: rows deleted, and False if `max_batches`
+              chunks ran and more may be left.
+        """
+        total = 0
+        batches = 0
+        while batches < self.max_batches:
+            job_id = self.claim(now)
+            if job_id is None:
+                return total, True
+            job = db.session.get(PurgeJob, job_id)
+            try:
+                while batches < self.max_batches:
+                    started = time.perf_counter()
+                    deleted = self.step(job)
+                    purge_chunk_seconds.observe(time.perf_counter() - started)
+                    batches += 1
+                    if deleted is None:
+                        self.finish(job_id, 'done')
+                        break
+                    total += deleted
+                    purge_rows_total.labels(kind=job.kind).inc(deleted)
+                    db.session.execute(
+                        db.update(PurgeJob).where(PurgeJob.id == job_id)
+                        .values(deleted=PurgeJob.deleted + deleted, updated_time=datetime.now())
+                        .execution_options(synchronize_session=False)
+                    )
+                    db.session.commit()
+                    self._errors = 0
+                    if self.pause:
+                        time.sleep(self.pause)
+            except Exception as e:
+                self._errors += 1
+                if self._errors >= MAX_ERRORS:
+                    self.finish(job_id, 'failed', str(e))
+                raise
+        return total, False
+
+    def __call__(self, now):
+        """
+        Scheduler job: runs queued jobs.
+
+        Returns:
+            - `now` while jobs are left; when idle, the time of the next check
+              for jobs queued by other processes, or None without one (a job
+              queued by this process wakes the scheduler).
+        """
+        deleted, finished = self.run(now)
+        if not finished:
+            return now
+        return now + timedelta(seconds=self.poll) if self.poll else None
+
+
+runner = PurgeRunner()
+# Whether a queued job is run by the request that queued it (PURGE_INLINE)
+inline = False
+
+
+def init_purge(app):
+    """
+    Configures the runner from `PURGE_*` settings and adds it to the
+    scheduler's jobs. Jobs run in the request when `PURGE_INLINE` says so,
+    by default when this process runs no scheduler.
+    """
+    global inline
+    runner.batch_size = app.config['PURGE_BATCH_SIZE']
+    runner.max_batches = app.config['PURGE_MAX_BATCHES']
+    runner.stale = app.config['PURGE_STALE_SECONDS']
+    runner.pause = app.config['PURGE_PAUSE_SECONDS']
+    runner.poll = app.config['PURGE_POLL_SECONDS']
+    inline = app.config['PURGE_INLINE']
+    if inline is None:
+        inline = not app.config['DEADLINE_SCHEDULER_ENABLED']
+    if runner not in scheduler.jobs:
+        scheduler.jobs.append(runner)
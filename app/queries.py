@@ -0,0 +1,360 @@
+"""
+Query layer for the Todo dashboard.
+
+This module keeps the SQL used to build the `/list` page in one place so the
+view issues a fixed, small number of queries regardless of how many todos a
+user owns:
+- One keyset-paginated query for the todos matching the selected filter.
+- The dashboard counters are columns of `User`: the per-status counters are
+  shifted by every write, and the urgent/overdue ones are recomputed by every
+  write (`deadline_counters`) and by the deadline scheduler when a boundary
+  passes (`next_deadlines`).
+- `dashboard_state` reads the user's stored counters and `todo_version`
+  straight from the database on every render, since the `User` loaded by
+  Flask-Login may come from another process's stale cache tier.
+- `todo_counts_query` computes every counter from the todos in one
+  conditional aggregate, for checks against the stored ones (the
+  success/failure counters also include archived todos).
+
+Filters (`todo_status`):
+- `p`, `s`, `f` : todos with that status.
+- `u` : urgent, pending todos due within the next hour.
+- `d` : deadlined, pending todos whose due time has passed.
+
+Pagination:
+Pages are keyed on `(sort column, todo_id)` rather than an OFFSET, so every
+page is an index seek and costs the same as the first one. Cursors are opaque
+strings carrying the sort column and the key of the boundary todo; they stay
+valid while todos are created, deleted or change status.
+
+Functions:
+- `todo_filter(user_id, todo_status, now)`: SQL criteria for a filter.
+- `encode_cursor(todo, sort_by, key)` / `decode_cursor(cursor, sort_by)`: Cursor serialization.
+- `todo_page_query(user_id, todo_status, sort_by, now, page_size, after, before)`: SELECT for one page.
+- `todo_page(user_id, todo_status, sort_by, now, page_size, after, before)`: One page of todos with cursors.
+- `todo_counts_query(user_id, now)`: SELECT computing all dashboard counters in a single pass.
+- `dashboard_state(user_id)`: The user's current `todo_version` and stored dashboard counters.
+- `deadline_counters(now)`: Correlated subqueries recomputing `User.urgent` and `User.overdue`.
+- `next_deadlines(user_ids, now)`: The next moment each user's urgent/overdue counts change.
+- `todo_export_query(user_id, todo_status, sort_by, now)`: SELECT of the columns exported for a filter.
+- `overdue_chunk_query(cutoff, limit)`: SELECT of the oldest pending todos of any user due before a cutoff.
+- `archive_chunk_query(status, cutoff, limit)`: SELECT of the oldest todos with a status of any user due before a cutoff.
+- `archive_page_query(user_id, status, page_size, after, before)`: SELECT for one page of archived todos.
+- `archive_page(user_id, status, page_size, after, before)`: One page of archived todos with cursors.
+- `purge_todos_query(user_id, up_to_id, limit)`: SELECT of the next chunk of a user's todos to delete.
+- `purge_archived_query(user_id, limit)`: SELECT of the next chunk of a user's archived todos to delete.
+"""
+
+import base64
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, case, tuple_
+from .models import Todo, User, ArchivedTodo, db
+
+# Columns of an export row, in order
+EXPORT_COLUMNS = ('todo_id', 'title', 'status', 'created_time', 'due_time')
+
+# Pending todos due within this window are "urgent"
+URGENT_WINDOW = timedelta(hours=1)
+
+TodoPage = namedtuple('TodoPage', ['todos', 'next_cursor', 'prev_cursor'])
+
+
+def todo_filter(user_id, todo_status, now):
+    """
+    Builds the SQL criteria used by `/list` for the given filter.
+
+    Returns:
+        - A list of SQLAlchemy criteria to pass to `filter()`/`where()`.
+    """
+    if todo_status == 'u':
+        return [
+            Todo.user_id == user_id,
+            Todo.status == 'p',
+            Todo.due_time.between(now, now + URGENT_WINDOW)
+        ]
+    if todo_status == 'd':
+        return [
+            Todo.user_id == user_id,
+            Todo.status == 'p',
+            Todo.due_time < now
+        ]
+    return [
+        Todo.user_id == user_id,
+        Todo.status == todo_status
+    ]
+
+
+def encode_cursor(todo, sort_by, key='todo_id'):
+    """
+    Serializes the keyset position of a todo (`(sort_by, key)`) as an opaque, URL-safe cursor.
+    """
+    raw = f"{sort_by}|{getattr(todo, sort_by).isoformat()}|{getattr(todo, key)}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort_by):
+    """
+    Parses a cursor produced by `encode_cursor`.
+
+    Returns:
+        - `(sort value, todo_id)` or None if the cursor is missing, malformed
+          or was issued for a different sort order.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        cursor_sort, value, todo_id = raw.split('|')
+        if cursor_sort != sort_by:
+            return None
+        return datetime.fromisoformat(value), int(todo_id)
+    except ValueError:
+        return None
+
+
+def todo_page_query(user_id, todo_status, sort_by, now, page_size, after=None, before=None):
+    """
+    Builds the keyset-paginated SELECT for one page of `/list`.
+
+    One extra row is requested to detect whether another page exists. With a
+    `before` cursor the rows come back in descending order and must be reversed.
+
+    Returns:
+        - A SQLAlchemy `Select` over `Todo`.
+    """
+    sort_attr = getattr(Todo, sort_by)
+    key = tuple_(sort_attr, Todo.todo_id)
+    stmt = select(Todo).where(*todo_filter(user_id, todo_status, now))
+
+    before_key = decode_cursor(before, sort_by)
+    if before_key:
+        stmt = stmt.where(key < tuple_(*before_key)).order_by(sort_attr.desc(), Todo.todo_id.desc())
+    else:
+        after_key = decode_cursor(after, sort_by)
+        if after_key:
+            stmt = stmt.where(key > tuple_(*after_key))
+        stmt = stmt.order_by(sort_attr, Todo.todo_id)
+    return stmt.limit(page_size + 1)
+
+
+def todo_page(user_id, todo_status, sort_by, now, page_size, after=None, before=None):
+    """
+    Loads one page of todos for the selected filter and sort order.
+
+    Returns:
+        - `TodoPage` with the todos and the cursors of the neighbouring pages
+          (None when there is no such page).
+    """
+    stmt = todo_page_query(user_id, todo_status, sort_by, now, page_size, after, before)
+    return load_page(stmt, sort_by, page_size, after, before)
+
+
+def load_page(stmt, sort_by, page_size, after=None, before=None, key='todo_id'):
+    """
+    Runs a keyset page SELECT built with one extra row and turns it into a
+    `TodoPage` in display order.
+    """
+    todos = db.session.scalars(stmt).all()
+    has_more = len(todos) > page_size
+    todos = todos[:page_size]
+
+    backwards = decode_cursor(before, sort_by) is not None
+    if backwards:
+        todos.reverse()
+    has_prev = has_more if backwards else decode_cursor(after, sort_by) is not None
+    has_next = True if backwards else has_more
+
+    if not todos:
+        return TodoPage(todos, None, None)
+    return TodoPage(
+        todos,
+        encode_cursor(todos[-1], sort_by, key) if has_next else None,
+        encode_cursor(todos[0], sort_by, key) if has_prev else None
+    )
+
+
+def todo_counts_query(user_id, now):
+    """
+    Builds the conditional-aggregate SELECT for every dashboard counter of a user.
+
+    Returns:
+        - A SQLAlchemy `Select` yielding pending, success, failure, urgent, overdue and total counts.
+    """
+    pending = Todo.status == 'p'
+    return select(
+        func.count(case((pending, 1))),
+        func.count(case((Todo.status == 's', 1))),
+        func.count(case((Todo.status == 'f', 1))),
+        func.count(case((pending & Todo.due_time.between(now, now + URGENT_WINDOW), 1))),
+        func.count(case((pending & (Todo.due_time < now), 1))),
+        func.count()
+    ).where(Todo.user_id == user_id)
+
+
+def dashboard_state(user_id):
+    """
+    Reads the user's `todo_version` and stored dashboard counters in one
+    primary-key lookup, bypassing the user cache.
+
+    Returns:
+        - A row with id, todo_version, success, failure, pending, urgent and overdue.
+    """
+    return db.session.execute(
+        select(User.id, User.todo_version, User.success, User.failure, User.pending, User.urgent, User.overdue)
+        .where(User.id == user_id)
+    ).one()
+
+
+def deadline_counters(now):
+    """
+    Builds the values of `User.urgent` and `User.overdue` at `now` as scalar
+    subqueries correlated to the updated user, for use in an `UPDATE user`.
+
+    Returns:
+        - dict of column name to subquery.
+    """
+    pending = [Todo.user_id == User.id, Todo.status == 'p']
+    return {
+        'urgent': select(func.count()).where(*pending, Todo.due_time.between(now, now + URGENT_WINDOW)).scalar_subquery(),
+        'overdue': select(func.count()).where(*pending, Todo.due_time < now).scalar_subquery()
+    }
+
+
+def next_deadlines(user_ids, now):
+    """
+    Finds, per user, the next moment a pending todo becomes urgent or overdue.
+
+    Args:
+        user_ids: the users to look at, or None for every user.
+        now: the reference time.
+
+    Returns:
+        - dict of user id to datetime, for users that have such a todo.
+    """
+    if user_ids is not None and not user_ids:
+        return {}
+    urgent_from = now + URGENT_WINDOW
+    stmt = select(
+        Todo.user_id,
+        func.min(Todo.due_time),
+        func.min(case((Todo.due_time > urgent_from, Todo.due_time)))
+    ).where(
+        Todo.status == 'p',
+        Todo.due_time > now
+    ).group_by(Todo.user_id)
+    if user_ids is not None:
+        stmt = stmt.where(Todo.user_id.in_(list(user_ids)))
+
+    deadlines = {}
+    for user_id, next_due, next_urgent_due in db.session.execute(stmt):
+        candidates = [next_due]
+        if next_urgent_due is not None:
+            candidates.append(next_urgent_due - URGENT_WINDOW)
+        deadlines[user_id] = min(candidates)
+    return deadlines
+
+
+def todo_export_query(user_id, todo_status, sort_by, now):
+    """
+    Builds the SELECT streamed by the todo export: plain columns rather than
+    ORM objects, for every todo of the user (`todo_status` None) or a `/list` filter.
+    A full export is grouped by status so it reads the status indexes in order
+    instead of sorting all of the user's todos before the first row.
+
+    Returns:
+        - A SQLAlchemy `Select` over `EXPORT_COLUMNS`, ordered by `(sort column, todo_id)`
+          (within each status for a full export).
+    """
+    columns = [getattr(Todo, name) for name in EXPORT_COLUMNS]
+    order = (getattr(Todo, sort_by), Todo.todo_id)
+    if todo_status is None:
+        return select(*columns).where(Todo.user_id == user_id).order_by(Todo.status, *order)
+    return select(*columns).where(*todo_filter(user_id, todo_status, now)).order_by(*order)
+
+
+def overdue_chunk_query(cutoff, limit):
+    """
+    Builds the SELECT of the next chunk of the auto-fail policy.
+
+    Returns:
+        - A SQLAlchemy `Select` of `(todo_id, user_id)` for up to `limit`
+          pending todos due before `cutoff`, oldest first.
+    """
+    return select(Todo.todo_id, Todo.user_id).where(
+        Todo.status == 'p',
+        Todo.due_time < cutoff
+    ).order_by(Todo.due_time).limit(limit)
+
+
+def archive_chunk_query(status, cutoff, limit):
+    """
+    Builds the SELECT of the next chunk of the archival policy.
+
+    Returns:
+        - A SQLAlchemy `Select` of the `todo_id` of up to `limit` todos with
+          `status` ('s' or 'f') due before `cutoff`, oldest first.
+    """
+    return select(Todo.todo_id).where(
+        Todo.status == status,
+        Todo.due_time < cutoff
+    ).order_by(Todo.due_time).limit(limit)
+
+
+def archive_page_query(user_id, status, page_size, after=None, before=None):
+    """
+    Builds the keyset-paginated SELECT for one page of the user's archived
+    todos with `status`, most recently due first, keyed on
+    `(due_time, archive_id)`. As in `todo_page_query`, a `before` page comes
+    back in reverse order.
+
+    Returns:
+        - A SQLAlchemy `Select` over `ArchivedTodo`.
+    """
+    key = tuple_(ArchivedTodo.due_time, ArchivedTodo.archive_id)
+    stmt = select(ArchivedTodo).where(ArchivedTodo.user_id == user_id, ArchivedTodo.status == status)
+
+    before_key = decode_cursor(before, 'due_time')
+    if before_key:
+        stmt = stmt.where(key > tuple_(*before_key)).order_by(ArchivedTodo.due_time, ArchivedTodo.archive_id)
+    else:
+        after_key = decode_cursor(after, 'due_time')
+        if after_key:
+            stmt = stmt.where(key < tuple_(*after_key))
+        stmt = stmt.order_by(ArchivedTodo.due_time.desc(), ArchivedTodo.archive_id.desc())
+    return stmt.limit(page_size + 1)
+
+
+def archive_page(user_id, status, page_size, after=None, before=None):
+    """
+    Loads one page of the user's archived todos with `status`.
+
+    Returns:
+        - `TodoPage` with the archived todos and the cursors of the neighbouring pages.
+    """
+    stmt = archive_page_query(user_id, status, page_size, after, before)
+    return load_page(stmt, 'due_time', page_size, after, before, key='archive_id')
+
+
+def purge_todos_query(user_id, up_to_id, limit):
+    """
+    Builds the SELECT of the next chunk of a background purge.
+
+    Returns:
+        - A SQLAlchemy `Select` of the `todo_id` of up to `limit` todos of
+          the user, only those up to `up_to_id` unless it is None.
+    """
+    stmt = select(Todo.todo_id).where(Todo.user_id == user_id)
+    if up_to_id is not None:
+        stmt = stmt.where(Todo.todo_id <= up_to_id)
+    return stmt.limit(limit)
+
+
+def purge_archived_query(user_id, limit):
+    """
+    Builds the SELECT of the next chunk of archived todos of a background purge.
+
+    Returns:
+        - A SQLAlchemy `Select` of the `archive_id` of up to `limit` archived todos of the user.
+    """
+    return select(ArchivedTodo.archive_id).where(ArchivedTodo.user_id == user_id).limit(limit)
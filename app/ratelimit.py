@@ -0,0 +1,155 @@
+"""
+Token-bucket rate limiting for unauthenticated endpoints.
+
+`/login` runs an expensive password verification and `/check_user_name` is
+called on every keystroke of the signup form; both are open to anyone. Each
+protected call takes one token from a bucket per client IP. Logins also
+have a bucket per username, whatever the IP, so guesses at one account
+spread over many addresses are throttled too. Only failed logins take from
+it (`record_failure`), and its default burst is larger than the IP
+bucket's, so the account's owner keeps logging in unless someone is
+actively guessing at it. Buckets refill continuously at `capacity / period`
+tokens per second, so short bursts pass while floods are answered with a
+cheap `429` and a `Retry-After` header before any database or hashing work.
+
+Limits are configured as `"<capacity>/<period seconds>"` strings:
+- `RATELIMIT_LOGIN_IP`, `RATELIMIT_LOGIN_USERNAME`
+- `RATELIMIT_CHECK_USER_NAME_IP`
+
+Buckets live in a `kvstore` store (`RATELIMIT_STORAGE_URL`): `memory://`
+keeps them per process (the default), `redis://...` shares them between
+workers and replicas. If the store fails, requests are let through.
+
+The client IP is `request.remote_addr`. Behind load balancers or ingress
+proxies that is the proxy's address, shared by every client, unless
+`PROXY_FIX_X_FOR` is set to the number of proxies in front of the app:
+`create_app` then takes the client IP from their `X-Forwarded-For` header.
+
+Functions
+---------
+- `init_rate_limits(app)` : Configures the store and limits from the app config.
+- `parse_limit(value)` : Parses a `"capacity/period"` string.
+- `take_token(key, capacity, period, now)` : Takes one token from a bucket.
+- `peek_token(key, capacity, period, now)` : Checks a bucket without taking a token.
+- `limit_request(scope, user_name)` : Applies a scope's limits to the current request.
+- `record_failure(scope, user_name)` : Charges a failed attempt to the username's bucket.
+"""
+
+import time
+from flask import request, jsonify, current_app
+from prometheus_client import Counter
+from .kvstore import make_store
+
+# Prometheus Counters
+rate_limit_rejections_total = Counter('rate_limit_rejections_total', 'Requests rejected by the rate limiter', ['scope', 'key_type'])
+
+store = None
+limits = {}
+
+
+def parse_limit(value):
+    """
+    Parses a `"capacity/period"` limit.
+
+    Returns:
+        - `(capacity, period in seconds)`, or None for an empty value (no limit).
+    """
+    if not value:
+        return None
+    capacity, period = value.split('/')
+    return int(capacity), float(period)
+
+
+def init_rate_limits(app):
+    """Configures the bucket store and the per-scope limits from `RATELIMIT_*` settings."""
+    global store, limits
+    store = make_store(app.config['RATELIMIT_STORAGE_URL'], 'todo:ratelimit:') if app.config['RATELIMIT_ENABLED'] else None
+    limits = {
+        ('login', 'ip'): parse_limit(app.config['RATELIMIT_LOGIN_IP']),
+        ('login', 'username'): parse_limit(app.config['RATELIMIT_LOGIN_USERNAME']),
+        ('check_user_name', 'ip'): parse_limit(app.config['RATELIMIT_CHECK_USER_NAME_IP']),
+    }
+
+
+def take_token(key, capacity, period, now=None):
+    """
+    Takes one token from the bucket stored under `key`.
+
+    Returns:
+        - `(allowed, retry_after)` where `retry_after` is the number of seconds
+          until a token is available again (0 when allowed).
+    """
+    now = time.time() if now is None else now
+    rate = capacity / period
+
+    def take(state):
+        tokens = refilled(state, capacity, rate, now)
+        if tokens >= 1:
+            return [tokens - 1, now], (True, 0)
+        return [tokens, now], (False, (1 - tokens) / rate)
+
+    return store.update(key, take, ttl=period + 1)
+
+
+def peek_token(key, capacity, period, now=None):
+    """
+    Checks the bucket stored under `key` without taking a token.
+
+    Returns:
+        - `(allowed, retry_after)` as for `take_token`.
+    """
+    now = time.time() if now is None else now
+    rate = capacity / period
+    tokens = refilled(store.get(key), capacity, rate, now)
+    return (True, 0) if tokens >= 1 else (False, (1 - tokens) / rate)
+
+
+def refilled(state, capacity, rate, now):
+    """Tokens in a bucket at `now`, from its stored `[tokens, updated]` (None for a full one)."""
+    tokens, updated = state if state else (capacity, now)
+    return min(capacity, tokens + max(0, now - updated) * rate)
+
+
+def limit_request(scope, user_name=None):
+    """
+    Applies the limits of `scope` to the current request: takes a token from
+    the client IP's bucket, then checks that the username's bucket (charged
+    by `record_failure`) is not empty.
+
+    Returns:
+        - None if the request may proceed, otherwise a `429` JSON response.
+    """
+    if store is None:
+        return None
+
+    checks = [('ip', request.remote_addr, take_token)]
+    if user_name:
+        checks.append(('username', str(user_name).lower(), peek_token))
+
+    for key_type, value, check in checks:
+        limit = limits.get((scope, key_type))
+        if limit is None:
+            continue
+        try:
+            allowed, retry_after = check(f"{scope}:{key_type}:{value}", *limit)
+        except Exception as e:
+            current_app.logger.error(f"Rate limiter unavailable: {str(e)}")
+            return None
+        if not allowed:
+            rate_limit_rejections_total.labels(scope=scope, key_type=key_type).inc()
+            response = jsonify({"error": "Too many requests, please slow down"})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(max(1, round(retry_after)))
+            return response
+    return None
+
+
+def record_failure(scope, user_name):
+    """Takes a token from the username's bucket of `scope` after a failed attempt."""
+    limit = limits.get((scope, 'username'))
+    if store is None or limit is None or not user_name:
+        return
+    try:
+        take_token(f"{scope}:username:{str(user_name).lower()}", *limit)
+    except Exception as e:
+        current_app.logger.error(f"Rate limiter unavailable: {str(e)}")
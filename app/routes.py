@@ -19,31 +19,45 @@ Key Features:
 Routes:
 - `/` -> Redirects authenticated users to the todo list, otherwise redirects to login.
 - `/create` -> Allows users to create a new todo.
-- `/list` -> Displays all todos based on sorting and filtering preferences.
+- `/list` -> Displays a page of todos based on sorting and filtering preferences.
+  Pages are navigated with the `after`/`before` keyset cursors, and unchanged pages get a `304`.
+  Todo cards are reused from the rendered fragment cache (`fragments`).
+  With `q`, the filter's todos matching the search are listed instead, best match first, by `page`.
+- `/archive` -> Displays a page of the succeeded (`todo_status=s`) or failed (`f`) todos moved to
+  the archive table, most recently due first, navigated with `after`/`before` cursors.
 - `/update/<int:id>` -> Updates a specific todo.
 - `/delete` and `/delete/<int:id>` -> Deletes all or a specific todo.
+  Deleting all of the user's todos is queued as a background job (`purge`) and answered with a `202`.
+- `/purges/<int:job_id>` -> Progress of a background `/delete` (its owner) or `/delete_users` (admins) job as JSON.
 - `/success/<int:id>`, `/failure/<int:id>`, `/pending/<int:id>` -> Changes the status of a todo.
 - `/reset_stats` -> Resets the user's success, failure, and pending counts.
 
+A write that waited too long for the group committer (`groupcommit`) was not
+applied and is answered with a retryable `503`.
+
 Dependencies:
 - Flask, Flask-Login, SQLAlchemy
 """
 
 
-from flask import render_template, Blueprint, request, redirect, url_for, session
+from flask import render_template, Blueprint, request, redirect, url_for, session, current_app, make_response, jsonify
 from flask_login import login_required, current_user
-from datetime import datetime, timedelta
-from .models import Todo, db
+from datetime import datetime
+from .models import Todo, PurgeJob, db
+from .queries import todo_page, archive_page, dashboard_state
+from .caching import list_etag
+from .fragments import render_todo_cards
+from .search import search_todos
 from .forms import TodoForm, UpdateTodoForm
-from prometheus_client import Counter
+from .purge import queue_todo_purge, job_to_dict
+from .groupcommit import WriteTimeout
+from . import services
 
 main = Blueprint("main", __name__)
 
-# Prometheus Counters
-todo_created = Counter('todo_created_total', 'Total number of todos created')
-todo_deleted = Counter('todo_deleted_total', 'Total number of todos deleted')
-todo_updated = Counter('todo_updated_total', 'Total number of todos updated')
-todo_status_changed = Counter('todo_status_changed_total', 'Total number of todo status changes', ['from_status', 'to_status'])
+@main.errorhandler(WriteTimeout)
+def write_timeout(e):
+    return "Server busy, please try again", 503, {"Retry-After": "1"}
 
 @main.route("/")
 def redirect_to_form():
@@ -57,18 +71,10 @@ def create():
     form = TodoForm()
     if request.method == 'POST':
         title = form.title.data
-        created_time = datetime.now()
         due_time_str = request.form.get('due_time')
         due_time = datetime.strptime(due_time_str, "%Y-%m-%dT%H:%M") if due_time_str else None
 
-        todo_obj = Todo(user_id=current_user.id, title=title, created_time=created_time, due_time=due_time, status='p')
-        current_user.pending += 1
-        db.session.add(todo_obj)
-        db.session.commit()
-
-        # Increment Prometheus counter
-        todo_created.inc()
-
+        services.create_todo(current_user, title, due_time)
         return redirect(url_for('main.list'))
     return render_template('create_form.html', form=form, current_time=datetime.now())
 
@@ -78,78 +84,125 @@ def list():
     sort_by = request.args.get('sort', session.get('sort_by', 'due_time'))
     sort_by = sort_by if sort_by in ('due_time', 'created_time') else 'due_time'
     todo_status = request.args.get('todo_status', session.get('todo_status', 'p'))
-    session['sort_by'] = sort_by
-    session['todo_status'] = todo_status if todo_status in ('p', 's', 'f') else 'p'
-    sort_attr = getattr(Todo, sort_by)
+    # Only touch the session when the preferences change, so 304s don't resend the cookie
+    stored_status = todo_status if todo_status in ('p', 's', 'f') else 'p'
+    if session.get('sort_by') != sort_by:
+        session['sort_by'] = sort_by
+    if session.get('todo_status') != stored_status:
+        session['todo_status'] = stored_status
     current_time = datetime.now()
-    one_hour_later = current_time + timedelta(hours=1)
-
-    if todo_status == 'u':
-        todos = Todo.query.filter(
-            Todo.user_id == current_user.id,
-            Todo.status == 'p',
-            Todo.due_time.between(current_time, one_hour_later)
-        )
-    elif todo_status == 'd':
-        todos = Todo.query.filter(
-            Todo.user_id == current_user.id,
-            Todo.status == 'p',
-            Todo.due_time < current_time
-        )
+    after = request.args.get('after')
+    before = request.args.get('before')
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+
+    # Answer unchanged pages with a 304 before running any todo query. The version and
+    # counters are read fresh: the cached current_user may predate another worker's write
+    state = dashboard_state(current_user.id)
+    etag = list_etag(state, (todo_status, sort_by, after, before, query, page), current_time)
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    elif query:
+        response = make_response(render_search(todo_status, sort_by, query, page, current_time, state, etag))
     else:
-        todos = Todo.query.filter(
-            Todo.user_id == current_user.id,
-            Todo.status == todo_status
-        )
-    todos = todos.order_by(sort_attr)
+        response = make_response(render_list(todo_status, sort_by, after, before, current_time, state, etag))
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def render_list(todo_status, sort_by, after, before, current_time, state, etag):
+    page = todo_page(
+        current_user.id, todo_status, sort_by, current_time,
+        page_size=current_app.config['TODO_PAGE_SIZE'],
+        after=after,
+        before=before
+    )
+    return render_dashboard(
+        page.todos, todo_status, sort_by, current_time, state, etag,
+        next_cursor=page.next_cursor,
+        prev_cursor=page.prev_cursor
+    )
 
-    urgent_todos_count = Todo.query.filter(
-        Todo.user_id == current_user.id,
-        Todo.due_time.between(current_time, one_hour_later),
-        Todo.status == 'p'
-    ).count()
-    deadlined_todos_count = Todo.query.filter(
-        Todo.user_id == current_user.id,
-        Todo.due_time < current_time,
-        Todo.status == 'p'
-    ).count()
+def render_search(todo_status, sort_by, query, page, current_time, state, etag):
+    result = search_todos(
+        current_user.id, query, todo_status, current_time,
+        page=page,
+        page_size=current_app.config['TODO_PAGE_SIZE']
+    )
+    return render_dashboard(
+        result.todos, todo_status, sort_by, current_time, state, etag,
+        query=query,
+        next_page=result.page + 1 if result.has_next else None,
+        prev_page=result.page - 1 if result.page > 1 else None
+    )
 
+def render_dashboard(todos, todo_status, sort_by, current_time, state, etag, **pagination):
     return render_template(
         "list.html",
-        Todo=Todo,
         todos=todos,
-        current_time=current_time,
-        success=current_user.success,
-        failure=current_user.failure,
-        pending=current_user.pending,
+        cards=render_todo_cards(todos, todo_status, current_time),
+        sort_by=sort_by,
+        success=state.success,
+        failure=state.failure,
+        pending=state.pending,
         first_name=current_user.first_name,
-        urgent_todos_count=urgent_todos_count,
-        deadlined_todos_count=deadlined_todos_count,
-        todo_status=todo_status
+        urgent_todos_count=state.urgent,
+        deadlined_todos_count=state.overdue,
+        todo_status=todo_status,
+        etag=etag,
+        **pagination
     )
 
+@main.route('/archive')
+@login_required
+def archive():
+    todo_status = request.args.get('todo_status', 's')
+    todo_status = todo_status if todo_status in ('s', 'f') else 's'
+    after = request.args.get('after')
+    before = request.args.get('before')
+    current_time = datetime.now()
+
+    # Archiving and deleting bump todo_version, so the /list ETag covers this view too
+    etag = list_etag(dashboard_state(current_user.id), ('archive', todo_status, after, before), current_time)
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        page = archive_page(
+            current_user.id, todo_status,
+            page_size=current_app.config['TODO_PAGE_SIZE'],
+            after=after,
+            before=before
+        )
+        response = make_response(render_template(
+            "archive.html",
+            todos=page.todos,
+            todo_status=todo_status,
+            next_cursor=page.next_cursor,
+            prev_cursor=page.prev_cursor
+        ))
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
 @main.route("/update/<int:id>", methods=['POST', 'GET'])
 @login_required
 def update(id):
     form = UpdateTodoForm()
     if request.method == 'POST':
-        todo = Todo.query.get(id)
+        todo = services.get_user_todo(current_user, id)
+        if not todo:
+            return "todo not found"
         if form.validate_on_submit():
-            prev_title = todo.title
-            todo.title = form.title.data
             due_time_str = request.form.get('due_time')
             due_time = datetime.strptime(due_time_str, "%Y-%m-%dT%H:%M") if due_time_str else None
-            todo.due_time = due_time
-            db.session.commit()
-
-            # Increment update counter
-            todo_updated.inc()
-
+            services.update_todo(current_user, todo, form.title.data, due_time)
             return redirect(url_for('main.list'))
         return "not validated"
     else:
-        todo = Todo.query.get(id)
-        if not todo or todo.user_id != current_user.id:
+        todo = services.get_user_todo(current_user, id)
+        if not todo:
             return "todo not found"
         created_time = todo.created_time
         return render_template(
@@ -163,98 +216,51 @@ def update(id):
 @main.route('/delete')
 @login_required
 def delete_all():
-    db.session.query(Todo).delete()
-    current_user.success = 0
-    current_user.failure = 0
-    current_user.pending = 0
-    db.session.commit()
-
-    # Increment delete counter
-    todo_deleted.inc()
+    # Deleted in chunks by the scheduler's thread (or by this request when the process
+    # runs none), so other writers are not stalled
+    job = queue_todo_purge(current_user)
+    status_url = url_for('main.purge_status', job_id=job.id)
+    return (
+        f"<h1> deleting all todos for {current_user.id}, progress at <a href=\"{status_url}\">{status_url}</a></h1>",
+        202,
+        {'Location': status_url}
+    )
 
-    return f"<h1> deleted all todos for {current_user.id}</h1>"
+@main.route('/purges/<int:job_id>')
+@login_required
+def purge_status(job_id):
+    job = db.session.get(PurgeJob, job_id)
+    # A user's job is only shown to that user; /delete_users jobs, whose counts reveal
+    # how many users and todos exist, only to admins
+    visible = job is not None and (current_user.admin if job.user_id is None else current_user.id == job.user_id)
+    if not visible:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_to_dict(job))
 
 @main.route('/delete/<int:id>')
 @login_required
 def delete_todo(id):
-    todo = Todo.query.get(id)
-    if not todo or todo.user_id != current_user.id:
+    if services.delete_todo(current_user, id) is None:
         return "todo not found"
-    status_before = todo.status
-    if todo:
-        if status_before == 's':
-            current_user.success -= 1
-        elif status_before == 'f':
-            current_user.failure -= 1
-        elif status_before == 'p':
-            current_user.pending -= 1
-        db.session.delete(todo)
-        db.session.commit()
-
-        # Increment delete counter
-        todo_deleted.inc()
-
     return redirect(url_for('main.list'))
 
 @main.route('/success/<int:id>')
 @login_required
 def success(id):
-    todo = Todo.query.get(id)
-    if not todo or todo.user_id != current_user.id:
+    if services.change_status(current_user, id, 's') is None:
         return "todo not found"
-    from_status = todo.status
-    if from_status in ('p', 'f'):
-        current_user.success += 1
-        if from_status == 'p':
-            current_user.pending -= 1
-        else:
-            current_user.failure -= 1
-        todo.status = 's'
-        db.session.commit()
-
-        # Increment status change counter
-        todo_status_changed.labels(from_status=from_status, to_status='s').inc()
-
     return redirect(url_for('main.list'))
 
 @main.route('/failure/<int:id>')
 @login_required
 def failure(id):
-    todo = Todo.query.get(id)
-    if not todo or todo.user_id != current_user.id:
+    if services.change_status(current_user, id, 'f') is None:
         return "todo not found"
-    from_status = todo.status
-    if from_status in ('s', 'p'):
-        current_user.failure += 1
-        if from_status == 'p':
-            current_user.pending -= 1
-        else:
-            current_user.success -= 1
-        todo.status = 'f'
-        db.session.commit()
-
-        # Increment status change counter
-        todo_status_changed.labels(from_status=from_status, to_status='f').inc()
-
     return redirect(url_for('main.list'))
 
 @main.route("/pending/<int:id>")
 @login_required
 def pending(id):
-    todo = Todo.query.get(id)
-    if not todo or todo.user_id != current_user.id:
+    if services.change_status(current_user, id, 'p') is None:
         return "todo not found"
-    from_status = todo.status
-    if from_status in ('s', 'f'):
-        current_user.pending += 1
-        if from_status == 'f':
-            current_user.failure -= 1
-        else:
-            current_user.success -= 1
-        todo.status = 'p'
-        db.session.commit()
-
-        # Increment status change counter
-        todo_status_changed.labels(from_status=from_status, to_status='p').inc()
-
     return redirect(url_for('main.list'))
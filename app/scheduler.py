@@ -0,0 +1,311 @@
+"""
+Background deadline scheduler.
+
+A pending todo changes the dashboard twice without anyone touching it: it
+becomes urgent an hour before its due time and overdue when the due time
+passes. Instead of `/list` counting both ranges on every render, `User.urgent`
+and `User.overdue` are stored and kept current:
+- Every todo write recomputes them in its own counter `UPDATE` (`services`)
+  and asks the scheduler to look at the user again.
+- `DeadlineScheduler` keeps each user's next boundary in a min-heap and, as
+  soon as one passes, recomputes that user's counters, bumps `todo_version`
+  (so the `/list` ETag changes) and publishes a `deadline` event to the
+  user's open dashboards.
+
+On its first pass, and every `DEADLINE_RESCAN_SECONDS` after that, one
+scheduler corrects every user's counters and rebuilds its heap from the
+database, which picks up todos written by other processes. Only the process
+holding the `RescanLock` (a PostgreSQL advisory lock, or a file lock next to
+the SQLite database) does this; in the others the heap only holds the users
+they wrote themselves. The counter update only touches rows whose values
+changed and returns their ids, so only those users are evicted from the
+user cache and notified.
+
+Periodic maintenance jobs (see `autofail`, `archive` and `purge`) ride on
+the same thread: every callable in `jobs` is called with the current time on
+each pass and returns when it next wants to run; `wake()` starts a pass
+early when new work was queued.
+
+It runs as a daemon thread in each application process
+(`DEADLINE_SCHEDULER_ENABLED`), or as a dedicated process with
+`flask deadline-scheduler`. The clock is injectable and `run_pending()` can be
+driven directly, so tests can step through boundaries deterministically.
+
+Classes
+-------
+- `DeadlineScheduler` : Min-heap of per-user boundaries with a worker thread.
+- `RescanLock` : Lock electing the one process that runs the full rescans.
+
+Functions
+---------
+- `init_scheduler(app)` : Configures the scheduler and starts it with the first request.
+"""
+
+import heapq
+import os
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import text
+from prometheus_client import Counter, Gauge, Histogram
+from .models import User, db
+from .queries import deadline_counters, next_deadlines
+from . import events, user_cache
+
+# Prometheus Metrics
+deadline_lag_seconds = Histogram(
+    'deadline_scheduler_lag_seconds', 'Delay between a deadline boundary and the counter update',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+deadline_transitions = Counter('deadline_scheduler_updates_total', 'Users whose urgent/overdue counters the scheduler changed')
+deadline_heap_size = Gauge('deadline_scheduler_heap_size', 'Users with an upcoming deadline boundary', multiprocess_mode='max')
+
+# Boundaries are handled just after they pass: a todo due at `t` is overdue once `now > t`
+EPSILON = timedelta(milliseconds=1)
+
+# Seconds to wait after a failed pass
+RETRY_SECONDS = 5
+
+# PostgreSQL advisory lock key of the full rescan ("todo")
+RESCAN_LOCK_KEY = 0x746f646f
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows, where only the single-process development server runs
+    fcntl = None
+
+
+class RescanLock:
+    """
+    Lock held by the one process that runs the full rescans.
+
+    On PostgreSQL it is a session advisory lock, held on a connection kept
+    out of the pool for as long as the process lives; on SQLite, whose
+    processes all share one host, an exclusive `flock` on a file next to the
+    database. Either is released when the holding process exits, so another
+    process takes over at its next rescan.
+    """
+
+    def __init__(self):
+        self._held = None
+        self._pid = None
+
+    def acquire(self, engine):
+        """
+        Takes the lock if no other process holds it, or checks it is still held.
+
+        Returns:
+            - True when this process holds the lock.
+        """
+        if self._pid != os.getpid():
+            # A forked process does not own its parent's lock
+            self._held = None
+            self._pid = os.getpid()
+        if engine.dialect.name == 'postgresql':
+            return self._acquire_advisory(engine)
+        if engine.dialect.name == 'sqlite':
+            return self._acquire_file(engine.url.database)
+        return True
+
+    def release(self):
+        """Gives the lock up, if this process holds it."""
+        if self._held is not None and self._pid == os.getpid():
+            self._held.close()
+        self._held = None
+
+    def _acquire_advisory(self, engine):
+        if self._held is not None:
+            try:
+                self._held.execute(text("SELECT 1"))
+                self._held.rollback()
+                return True
+            except Exception:
+                # The connection, and the lock with it, is gone
+                self._held.invalidate()
+                self._held = None
+        connection = engine.connect()
+        try:
+            locked = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': RESCAN_LOCK_KEY}).scalar()
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not locked:
+            connection.close()
+            return False
+        self._held = connection
+        return True
+
+    def _acquire_file(self, database):
+        if self._held is not None:
+            return True
+        if fcntl is None or not database or database == ':memory:':
+            return True
+        lock_file = open(f"{database}.rescan-lock", 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._held = lock_file
+        return True
+
+
+class DeadlineScheduler:
+    """
+    Tracks the next urgent/overdue boundary of every user and updates their
+    stored counters when it passes.
+
+    Args:
+        broker: `events` broker the `deadline` events are published on.
+        clock: returns the current naive local `datetime`, like the todo times.
+        rescan: seconds between full rebuilds of the heap from the database.
+    """
+
+    def __init__(self, broker, clock=datetime.now, rescan=60):
+        self.broker = broker
+        self.clock = clock
+        self.rescan = rescan
+        self.rescan_lock = RescanLock()
+        self.enabled = True
+        self._heap = []
+        self._scheduled = {}
+        self.jobs = []
+        self._dirty = set()
+        self._next_rescan = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def ensure_started(self, app):
+        """Starts the worker thread once per process (again after a fork)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run_forever, args=(app,), name="deadline-scheduler", daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def reschedule(self, *user_ids):
+        """Asks the scheduler to recompute the next boundary of these users, e.g. after a write."""
+        with self._lock:
+            self._dirty.update(user_ids)
+        self._wakeup.set()
+
+    def wake(self):
+        """Starts a pass right away, e.g. so a job sees work queued for it."""
+        self._wakeup.set()
+
+    def run_forever(self, app):
+        """Runs scheduling passes until the process exits, sleeping until the next boundary."""
+        while True:
+            self._wakeup.clear()
+            with app.app_context():
+                try:
+                    wait = self.run_pending()
+                except Exception as e:
+                    app.logger.error(f"Deadline scheduler error: {str(e)}")
+                    db.session.rollback()
+                    wait = RETRY_SECONDS
+                finally:
+                    db.session.remove()
+            self._wakeup.wait(max(wait, 0.01))
+
+    def run_pending(self):
+        """
+        Runs one scheduling pass at `clock()`: updates the users whose
+        boundary has passed, corrects all counters and rebuilds the heap when
+        a rescan is due and this process holds the `rescan_lock`, reschedules
+        dirty users and runs the periodic jobs.
+        Must run inside an app context.
+
+        Returns:
+            - Seconds until the next boundary, rescan or job.
+        """
+        now = self.clock()
+        passed = {}
+        while self._heap and self._heap[0][0] <= now:
+            at, user_id = heapq.heappop(self._heap)
+            if self._scheduled.get(user_id) == at:
+                del self._scheduled[user_id]
+                passed[user_id] = at
+        if passed:
+            self.update_counters(passed.keys(), now)
+            for at in passed.values():
+                deadline_lag_seconds.observe((now - at).total_seconds())
+            self._push(next_deadlines(passed.keys(), now))
+
+        if self._next_rescan is None or now >= self._next_rescan:
+            if self.rescan_lock.acquire(db.engine):
+                self.update_counters(None, now)
+                self._heap = []
+                self._scheduled = {}
+                self._push(next_deadlines(None, now))
+            self._next_rescan = now + timedelta(seconds=self.rescan)
+
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if dirty:
+            for user_id in dirty:
+                self._scheduled.pop(user_id, None)
+            self._push(next_deadlines(dirty, now))
+
+        deadline_heap_size.set(len(self._scheduled))
+        wakeups = [self._next_rescan]
+        if self._heap:
+            wakeups.append(self._heap[0][0])
+        for job in self.jobs:
+            next_run = job(now)
+            if next_run is not None:
+                wakeups.append(next_run)
+        return (min(wakeups) - self.clock()).total_seconds()
+
+    def update_counters(self, user_ids, now):
+        """
+        Recomputes `urgent` and `overdue` for the users (or every user when
+        None), bumping `todo_version` only where they changed, and evicts the
+        changed users from the user cache. Notifies the open dashboards of
+        the given users, or of the changed ones after a full rescan.
+        """
+        counters = deadline_counters(now)
+        stmt = db.update(User).where(
+            (User.urgent != counters['urgent']) | (User.overdue != counters['overdue'])
+        ).values(**counters, todo_version=User.todo_version + 1).returning(User.id).execution_options(synchronize_session=False)
+        if user_ids is not None:
+            stmt = stmt.where(User.id.in_(list(user_ids)))
+        changed = db.session.execute(stmt).scalars().all()
+        db.session.commit()
+
+        user_cache.invalidate(*changed)
+        deadline_transitions.inc(len(changed))
+        if user_ids is None:
+            user_ids = changed
+
+        subscribed = [user_id for user_id in user_ids if self.broker.has_subscribers(user_id)]
+        if subscribed:
+            rows = db.session.execute(db.select(User.id, User.urgent, User.overdue).where(User.id.in_(subscribed)))
+            for user_id, urgent, overdue in rows:
+                self.broker.publish(user_id, 'deadline', {'urgent': urgent, 'overdue': overdue})
+
+    def _push(self, deadlines):
+        for user_id, at in deadlines.items():
+            at += EPSILON
+            self._scheduled[user_id] = at
+            heapq.heappush(self._heap, (at, user_id))
+
+
+scheduler = DeadlineScheduler(events.broker)
+
+
+def init_scheduler(app):
+    """Configures the scheduler from `DEADLINE_*` settings; the thread starts with the first request."""
+    scheduler.enabled = app.config['DEADLINE_SCHEDULER_ENABLED']
+    scheduler.broker = events.broker
+    scheduler.rescan = app.config['DEADLINE_RESCAN_SECONDS']
+
+    @app.before_request
+    def start_deadline_scheduler():
+        scheduler.ensure_started(current_app._get_current_object())
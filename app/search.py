@@ -0,0 +1,147 @@
+"""
+Full-text search over todo titles.
+
+A `LIKE '%word%'` over `todo.title` cannot use an index and reads every todo
+of every user. Titles are indexed instead, per backend:
+- SQLite: an FTS5 table `todo_fts` with `todo` as its external content. It
+  is kept in sync by `AFTER INSERT/DELETE/UPDATE OF title` triggers, so
+  bulk statements (import, bulk delete, `/delete`) are covered as well as
+  ORM writes. Results are ranked by FTS5's bm25 `rank`.
+- PostgreSQL: a GIN index on `to_tsvector('simple', title)`, which the
+  database maintains itself. Results are ranked by `ts_rank`.
+- Anything else, or an SQLite build without FTS5: a case-insensitive
+  `LIKE` per word, unranked, as a functional fallback.
+
+Every word of the query is matched as a prefix (`tod` finds "todo"); all
+words must match. Results are scoped to the user and to one of the `/list`
+filters, and paginated by page number since a relevance order has no
+stable keyset.
+
+Functions
+---------
+- `init_search(app)` : Creates the index, triggers and first build for the app's database.
+- `create_search_index(connection)` : Idempotent DDL for the connection's backend.
+- `search_terms(query)` : Words of a query, as indexed.
+- `search_query(user_id, terms, todo_status, now, limit, offset)` : SELECT of the matching todos, best first.
+- `search_todos(user_id, query, todo_status, now, page, page_size)` : One page of matching todos.
+"""
+
+import re
+from collections import namedtuple
+from sqlalchemy import select, func, table, column, literal_column, text
+from .models import Todo, db
+from .queries import todo_filter
+
+# Words of a query used at most, the rest is ignored
+MAX_TERMS = 8
+WORD = re.compile(r'\w+')
+
+SearchPage = namedtuple('SearchPage', ['todos', 'page', 'has_next'])
+
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS todo_fts USING fts5("
+    "title, content='todo', content_rowid='todo_id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS todo_fts_insert AFTER INSERT ON todo BEGIN "
+    "INSERT INTO todo_fts(rowid, title) VALUES (new.todo_id, new.title); END",
+    "CREATE TRIGGER IF NOT EXISTS todo_fts_delete AFTER DELETE ON todo BEGIN "
+    "INSERT INTO todo_fts(todo_fts, rowid, title) VALUES ('delete', old.todo_id, old.title); END",
+    "CREATE TRIGGER IF NOT EXISTS todo_fts_update AFTER UPDATE OF title ON todo BEGIN "
+    "INSERT INTO todo_fts(todo_fts, rowid, title) VALUES ('delete', old.todo_id, old.title); "
+    "INSERT INTO todo_fts(rowid, title) VALUES (new.todo_id, new.title); END",
+)
+POSTGRES_DDL = (
+    "CREATE INDEX IF NOT EXISTS ix_todo_title_fts ON todo USING gin (to_tsvector('simple', title))",
+)
+
+todo_fts = table('todo_fts', column('rowid'), column('rank'))
+
+# 'fts5', 'postgresql' or 'like', set by `init_search`
+backend = 'like'
+
+
+def create_search_index(connection):
+    """
+    Creates the search index of the connection's backend if it is missing,
+    filling a new SQLite FTS table from the existing todos.
+
+    Returns:
+        - The backend used: 'fts5', 'postgresql' or 'like'.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+        return 'postgresql'
+    if dialect != 'sqlite':
+        return 'like'
+
+    exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'todo_fts'")).first()
+    if not exists:
+        compile_options = connection.execute(text("PRAGMA compile_options")).scalars().all()
+        if 'ENABLE_FTS5' not in compile_options:
+            return 'like'
+    for statement in SQLITE_DDL:
+        connection.execute(text(statement))
+    if not exists:
+        connection.execute(text("INSERT INTO todo_fts(todo_fts) VALUES ('rebuild')"))
+    return 'fts5'
+
+
+def init_search(app):
+    """Creates the search index for the app's database; the todo table must exist."""
+    global backend
+    with app.app_context():
+        with db.engine.begin() as connection:
+            backend = create_search_index(connection)
+
+
+def search_terms(query):
+    """The lowercased words of a query, at most `MAX_TERMS`."""
+    return WORD.findall((query or '').lower())[:MAX_TERMS]
+
+
+def search_query(user_id, terms, todo_status, now, limit, offset=0):
+    """
+    Builds the SELECT of the user's todos whose title matches every term as
+    a prefix, best match first.
+
+    Args:
+        todo_status: a `/list` filter ('p', 's', 'f', 'u', 'd') or None for all todos.
+
+    Returns:
+        - A SQLAlchemy `Select` over `Todo`.
+    """
+    criteria = todo_filter(user_id, todo_status, now) if todo_status else [Todo.user_id == user_id]
+    stmt = select(Todo).where(*criteria)
+
+    if backend == 'fts5':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        stmt = stmt.join(todo_fts, todo_fts.c.rowid == Todo.todo_id).where(
+            literal_column('todo_fts').op('MATCH')(match)
+        ).order_by(todo_fts.c.rank, Todo.todo_id)
+    elif backend == 'postgresql':
+        vector = func.to_tsvector(literal_column("'simple'"), Todo.title)
+        tsquery = func.to_tsquery(literal_column("'simple'"), ' & '.join(f"{term}:*" for term in terms))
+        stmt = stmt.where(vector.op('@@')(tsquery)).order_by(func.ts_rank(vector, tsquery).desc(), Todo.todo_id)
+    else:
+        for term in terms:
+            pattern = term.replace('\\', '\\\\').replace('_', '\\_')
+            stmt = stmt.where(Todo.title.ilike(f"%{pattern}%", escape='\\'))
+        stmt = stmt.order_by(Todo.due_time, Todo.todo_id)
+    return stmt.limit(limit).offset(offset)
+
+
+def search_todos(user_id, query, todo_status, now, page=1, page_size=50):
+    """
+    Loads one page of the user's todos matching a search query.
+
+    Returns:
+        - `SearchPage(todos, page, has_next)`; no todos for a query without words.
+    """
+    terms = search_terms(query)
+    page = max(1, page)
+    if not terms:
+        return SearchPage([], page, False)
+    stmt = search_query(user_id, terms, todo_status, now, page_size + 1, (page - 1) * page_size)
+    todos = db.session.scalars(stmt).all()
+    return SearchPage(todos[:page_size], page, len(todos) > page_size)
@@ -0,0 +1,489 @@
+"""
+Todo mutation services shared by the HTML routes and the JSON API.
+
+Every write to a todo goes through this module so both front ends keep the
+user's success/failure/pending counters and the Prometheus counters in sync,
+and so open dashboards are told about the change through `events`. Each
+mutation also bumps `User.todo_version`, which invalidates the `/list` ETag.
+
+Counters are changed in SQL (`pending = pending + 1`), never read and
+written back from Python, so concurrent requests cannot lose updates.
+Status changes and deletes don't load the todo or the user either: the
+todo statement is guarded by the status it was read with
+(`UPDATE todo ... WHERE status = :from`), and only if it matched are the
+counter deltas applied, in the same transaction. A guard that misses
+because another request changed the todo first is retried with the new
+status.
+
+Group commit:
+With `GROUP_COMMIT_ENABLED`, creates, updates and status changes run on the
+`groupcommit` writer thread, many per transaction. Their bodies
+(`insert_todo`, `edit_todo`, `move_todo`) take ids, so they can run in the
+writer's session, and `commit`/`after_commit` hand the commit and the work
+that must follow it to the writer's batch. Without it, they run in the
+request as before.
+
+Functions:
+- `get_user_todo(user, todo_id)`: Loads a todo owned by the user.
+- `create_todo(user, title, due_time)`: Creates a pending todo.
+- `update_todo(todo, title, due_time)`: Changes the title and due time of a todo.
+- `change_status(user, todo_id, to_status)`: Moves a todo to another status.
+- `delete_todo(user, todo_id)`: Deletes a todo.
+- `bulk_change_status(user, to_status, todo_ids, todo_status, now)`: Moves many todos at once.
+- `bulk_delete(user, todo_ids, todo_status, now)`: Deletes many todos at once.
+- `delete_archived(user, archive_ids)`: Deletes archived todos of the user.
+- `fail_overdue(cutoff, limit)`: Moves one chunk of long-overdue todos of any user to failure.
+- `archive_completed(status, cutoff, limit)`: Moves one chunk of old succeeded or failed todos of any user to the archive.
+- `shift_counters(user_id, deltas)`: Applies counter deltas to a user in SQL.
+- `dashboard_counters(user)`: Counters shown on the dashboard.
+- `notify(user, action, todo_id, status)`: Pushes a `todo` event to the user's open dashboards.
+- `notify_user(user_id, action, todo_id, status)`: `notify` loading the user only if someone listens.
+- `write(fn, *args)`: Runs a mutation body through the group committer when it is enabled.
+- `after_commit(callback, *args)`: Runs work right away, or after the group-commit batch commits.
+"""
+
+from datetime import datetime
+from prometheus_client import Counter
+from .models import Todo, User, ArchivedTodo, db
+from .queries import todo_filter, deadline_counters, overdue_chunk_query, archive_chunk_query
+from .scheduler import scheduler
+from .groupcommit import committer, current_batch
+from . import events, user_cache
+
+# User counter column for every todo status
+STATUS_COUNTERS = {'p': 'pending', 's': 'success', 'f': 'failure'}
+
+# Prometheus Counters
+todo_created = Counter('todo_created_total', 'Total number of todos created')
+todo_deleted = Counter('todo_deleted_total', 'Total number of todos deleted')
+todo_updated = Counter('todo_updated_total', 'Total number of todos updated')
+todo_status_changed = Counter('todo_status_changed_total', 'Total number of todo status changes', ['from_status', 'to_status'])
+
+# Attempts of a guarded statement before giving up on a todo that keeps changing
+GUARD_RETRIES = 5
+
+
+def get_user_todo(user, todo_id):
+    """
+    Loads a todo if it exists and belongs to the user.
+
+    Returns:
+        - The `Todo`, or None if it is missing or owned by someone else.
+    """
+    todo = db.session.get(Todo, todo_id)
+    if not todo or todo.user_id != user.id:
+        return None
+    return todo
+
+
+def create_todo(user, title, due_time):
+    """
+    Creates a pending todo for the user and bumps the pending counter.
+
+    Raises:
+        - ValueError if the title or due time fail model validation.
+
+    Returns:
+        - The new `Todo`.
+    """
+    return write(insert_todo, user.id, title, due_time)
+
+
+def insert_todo(user_id, title, due_time):
+    """Body of `create_todo`."""
+    todo = Todo(user_id=user_id, title=title, created_time=datetime.now(), due_time=due_time, status='p')
+    db.session.add(todo)
+    shift_counters(user_id, {'p': 1})
+    todo_id = todo.todo_id
+    commit(user_id)
+
+    after_commit(todo_created.inc)
+    after_commit(notify_user, user_id, 'created', todo_id, 'p')
+    return todo
+
+
+def update_todo(user, todo, title, due_time):
+    """
+    Changes the title and due time of a todo.
+
+    Raises:
+        - ValueError if the title or due time fail model validation.
+    """
+    write(edit_todo, user.id, todo.todo_id, title, due_time)
+
+
+def edit_todo(user_id, todo_id, title, due_time):
+    """Body of `update_todo`; does nothing if the todo is gone."""
+    todo = db.session.get(Todo, todo_id)
+    if not todo or todo.user_id != user_id:
+        return
+    todo.title = title
+    todo.due_time = due_time
+    shift_counters(user_id, {})
+    commit(user_id)
+
+    after_commit(todo_updated.inc)
+    after_commit(notify_user, user_id, 'updated', todo_id, todo.status)
+
+
+def change_status(user, todo_id, to_status):
+    """
+    Moves a todo to `to_status` ('p', 's' or 'f') and shifts the user's counters.
+
+    Returns:
+        - The previous status (equal to `to_status` if nothing changed), or
+          None if the todo is missing or owned by someone else.
+    """
+    return write(move_todo, user.id, todo_id, to_status)
+
+
+def move_todo(user_id, todo_id, to_status):
+    """Body of `change_status`."""
+    for _ in range(GUARD_RETRIES):
+        from_status = todo_status(user_id, todo_id)
+        if from_status is None or from_status == to_status:
+            return from_status
+
+        changed = db.session.execute(
+            db.update(Todo)
+            .where(Todo.todo_id == todo_id, Todo.user_id == user_id, Todo.status == from_status)
+            .values(status=to_status)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if changed:
+            shift_counters(user_id, {from_status: -1, to_status: 1})
+            commit(user_id)
+
+            after_commit(todo_status_changed.labels(from_status=from_status, to_status=to_status).inc)
+            after_commit(notify_user, user_id, 'status', todo_id, to_status)
+            return from_status
+        # Nothing was written; a group-commit batch's transaction must stay open
+        if current_batch() is None:
+            db.session.rollback()
+    raise RuntimeError(f"Todo {todo_id} kept changing, status not updated")
+
+
+def delete_todo(user, todo_id):
+    """
+    Deletes a todo and decrements the counter of its status.
+
+    Returns:
+        - The status the todo had, or None if it is missing or owned by someone else.
+    """
+    for _ in range(GUARD_RETRIES):
+        status = todo_status(user.id, todo_id)
+        if status is None:
+            return None
+
+        deleted = db.session.execute(
+            db.delete(Todo)
+            .where(Todo.todo_id == todo_id, Todo.user_id == user.id, Todo.status == status)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if deleted:
+            shift_counters(user.id, {status: -1})
+            commit(user.id)
+
+            todo_deleted.inc()
+            notify(user, 'deleted', todo_id)
+            return status
+        db.session.rollback()
+    raise RuntimeError(f"Todo {todo_id} kept changing, not deleted")
+
+
+def bulk_selection(user_id, todo_ids, todo_status, now):
+    """
+    Criteria selecting the user's todos by id, or by a `/list` filter
+    ('p', 's', 'f', 'u' urgent, 'd' overdue) when `todo_ids` is None.
+    """
+    if todo_ids is not None:
+        return [Todo.user_id == user_id, Todo.todo_id.in_(todo_ids)]
+    return todo_filter(user_id, todo_status, now)
+
+
+def bulk_change_status(user, to_status, todo_ids=None, todo_status=None, now=None):
+    """
+    Moves every selected todo to `to_status` with one guarded `UPDATE` per
+    previous status; their row counts are the exact counter deltas, applied
+    with a single counter update in the same transaction.
+
+    Returns:
+        - The number of todos whose status changed.
+    """
+    selection = bulk_selection(user.id, todo_ids, todo_status, now or datetime.now())
+    moved = {}
+    for from_status in STATUS_COUNTERS:
+        if from_status == to_status:
+            continue
+        changed = db.session.execute(
+            db.update(Todo)
+            .where(*selection, Todo.status == from_status)
+            .values(status=to_status)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if changed:
+            moved[from_status] = changed
+
+    total = sum(moved.values())
+    if not total:
+        db.session.rollback()
+        return 0
+    shift_counters(user.id, {**{status: -count for status, count in moved.items()}, to_status: total})
+    commit(user.id)
+
+    for from_status, count in moved.items():
+        todo_status_changed.labels(from_status=from_status, to_status=to_status).inc(count)
+    notify(user, 'bulk_status', None, to_status)
+    return total
+
+
+def bulk_delete(user, todo_ids=None, todo_status=None, now=None):
+    """
+    Deletes every selected todo with one `DELETE` per status, applying the
+    aggregated counter deltas in the same transaction.
+
+    Returns:
+        - The number of deleted todos.
+    """
+    selection = bulk_selection(user.id, todo_ids, todo_status, now or datetime.now())
+    deltas = {}
+    for status in STATUS_COUNTERS:
+        deleted = db.session.execute(
+            db.delete(Todo)
+            .where(*selection, Todo.status == status)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if deleted:
+            deltas[status] = -deleted
+
+    total = -sum(deltas.values())
+    if not total:
+        db.session.rollback()
+        return 0
+    shift_counters(user.id, deltas)
+    commit(user.id)
+    todo_deleted.inc(total)
+    notify(user, 'bulk_delete', None)
+    return total
+
+
+def delete_archived(user, archive_ids):
+    """
+    Deletes the user's archived todos with these ids, taking them off the
+    success/failure counters that still count them, in one transaction.
+
+    Returns:
+        - The number of deleted archived todos.
+    """
+    statuses = db.session.scalars(
+        db.delete(ArchivedTodo)
+        .where(ArchivedTodo.user_id == user.id, ArchivedTodo.archive_id.in_(archive_ids))
+        .returning(ArchivedTodo.status)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not statuses:
+        db.session.rollback()
+        return 0
+    deltas = {}
+    for status in statuses:
+        deltas[status] = deltas.get(status, 0) - 1
+    shift_counters(user.id, deltas)
+    commit(user.id)
+    todo_deleted.inc(len(statuses))
+    notify(user, 'bulk_delete', None)
+    return len(statuses)
+
+
+def fail_overdue(cutoff, limit):
+    """
+    Moves up to `limit` pending todos due before `cutoff`, oldest first and
+    across all users, to failure. Each user's todos in the chunk get one
+    guarded `UPDATE` and one counter update; the chunk is one transaction.
+
+    Returns:
+        - The number of todos moved.
+    """
+    rows = db.session.execute(overdue_chunk_query(cutoff, limit)).all()
+    todo_ids = {}
+    for todo_id, user_id in rows:
+        todo_ids.setdefault(user_id, []).append(todo_id)
+
+    moved = {}
+    for user_id, ids in todo_ids.items():
+        changed = db.session.execute(
+            db.update(Todo)
+            .where(Todo.user_id == user_id, Todo.todo_id.in_(ids), Todo.status == 'p', Todo.due_time < cutoff)
+            .values(status='f')
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if changed:
+            shift_counters(user_id, {'p': -changed, 'f': changed})
+            moved[user_id] = changed
+
+    total = sum(moved.values())
+    if not total:
+        db.session.rollback()
+        return 0
+    db.session.commit()
+    user_cache.invalidate(*moved)
+    scheduler.reschedule(*moved)
+
+    todo_status_changed.labels(from_status='p', to_status='f').inc(total)
+    for user_id in moved:
+        if events.broker.has_subscribers(user_id):
+            notify(db.session.get(User, user_id), 'auto_failed', None, 'f')
+    return total
+
+
+def archive_completed(status, cutoff, limit):
+    """
+    Moves up to `limit` todos with `status` ('s' or 'f') due before `cutoff`,
+    oldest first and across all users, to the archive table, in one
+    transaction. The todos are deleted with a guarded `DELETE ... RETURNING`
+    and the returned rows inserted, so a todo whose status changed meanwhile
+    stays where it is. The status counters already count the todos and are
+    left alone; only `todo_version` is bumped so the users' pages change.
+
+    Returns:
+        - The number of todos archived.
+    """
+    todo_ids = db.session.scalars(archive_chunk_query(status, cutoff, limit)).all()
+    if not todo_ids:
+        return 0
+    rows = db.session.execute(
+        db.delete(Todo)
+        .where(Todo.todo_id.in_(todo_ids), Todo.status == status, Todo.due_time < cutoff)
+        .returning(Todo.user_id, Todo.todo_id, Todo.title, Todo.created_time, Todo.due_time)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not rows:
+        db.session.rollback()
+        return 0
+
+    now = datetime.now()
+    db.session.execute(db.insert(ArchivedTodo), [
+        {**row._asdict(), 'status': status, 'archived_time': now} for row in rows
+    ])
+    user_ids = {row.user_id for row in rows}
+    db.session.execute(
+        db.update(User)
+        .where(User.id.in_(user_ids))
+        .values(todo_version=User.todo_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    user_cache.invalidate(*user_ids)
+
+    for user_id in user_ids:
+        if events.broker.has_subscribers(user_id):
+            notify(db.session.get(User, user_id), 'archived', None, status)
+    return len(rows)
+
+
+def todo_status(user_id, todo_id):
+    """The current status of a todo owned by the user, without loading it."""
+    return db.session.execute(
+        db.select(Todo.status).where(Todo.todo_id == todo_id, Todo.user_id == user_id)
+    ).scalar()
+
+
+def shift_counters(user_id, deltas):
+    """
+    Adds `deltas` (e.g. `{'p': -1, 's': 1}`) to the user's status counters,
+    recomputes the urgent/overdue counters and bumps `todo_version`, as one
+    `UPDATE` evaluated by the database.
+    """
+    values = {'todo_version': User.todo_version + 1, **deadline_counters(datetime.now())}
+    for status, delta in deltas.items():
+        if delta:
+            column = STATUS_COUNTERS[status]
+            values[column] = getattr(User, column) + delta
+    db.session.execute(
+        db.update(User).where(User.id == user_id).values(**values).execution_options(synchronize_session=False)
+    )
+
+
+def commit(user_id):
+    """
+    Commits, evicts the user from the user cache (SQL counter updates bypass
+    the ORM events that would do it) and has the deadline scheduler look at
+    the user's next boundary again. Inside a group-commit batch, the batch
+    does all three once it commits.
+    """
+    batch = current_batch()
+    if batch is not None:
+        batch.touch(user_id)
+        return
+    db.session.commit()
+    user_cache.invalidate(user_id)
+    scheduler.reschedule(user_id)
+
+
+def dashboard_counters(user):
+    """
+    Collects the counters shown on the dashboard, all stored on the user.
+
+    Returns:
+        - dict with the user's pending/success/failure/urgent/overdue counters.
+    """
+    return {
+        'pending': user.pending,
+        'success': user.success,
+        'failure': user.failure,
+        'urgent': user.urgent,
+        'overdue': user.overdue
+    }
+
+
+def notify(user, action, todo_id, status=None):
+    """
+    Publishes a `todo` event with the refreshed counters for the user's open
+    dashboards. Skipped when nobody is listening, so it costs nothing then.
+    """
+    if not events.broker.has_subscribers(user.id):
+        return
+    events.publish(user.id, 'todo', {
+        'action': action,
+        'todo_id': todo_id,
+        'status': status,
+        'counters': dashboard_counters(user)
+    })
+
+
+def notify_user(user_id, action, todo_id, status=None):
+    """`notify` for a user id, loading the user only when someone is listening."""
+    if events.broker.has_subscribers(user_id):
+        notify(db.session.get(User, user_id), action, todo_id, status)
+
+
+def write(fn, *args):
+    """
+    Runs the mutation body `fn(*args)` on the group committer's writer when
+    it is enabled, waiting for its commit, or right here otherwise.
+
+    The request's transaction is ended first: its pooled connection would
+    otherwise stay checked out while it waits, and enough waiting requests
+    leave the writer without one. This also expires the request's objects,
+    so the user's counters and the todo are read again after the commit.
+
+    Raises:
+        - Whatever `fn` raised.
+        - `groupcommit.WriteTimeout` if the writer did not get to it in time;
+          it was not applied.
+
+    Returns:
+        - What `fn` returned.
+    """
+    if not committer.enabled:
+        return fn(*args)
+    db.session.rollback()
+    return committer.submit(fn, *args)
+
+
+def after_commit(callback, *args):
+    """Runs `callback(*args)` now, or once the group-commit batch running this has committed."""
+    batch = current_batch()
+    if batch is None:
+        callback(*args)
+    else:
+        batch.after_commit(callback, *args)
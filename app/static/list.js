@@ -0,0 +1,114 @@
+// Javascript for list.html
+
+// The server pushes an event only when something shown on the dashboard changes:
+// "todo" when a todo is created, updated, changes status or is deleted (e.g. from another tab)
+// "deadline" when a pending todo becomes urgent or overdue
+// so the page is reloaded on those events instead of refreshing on a timer.
+const source = new EventSource(eventsURL)
+
+let reloadScheduled = false
+
+// reload once even if several events arrive together, but not while todos are selected
+const scheduleReload = function(){
+    if (selectedIds().length){
+        return
+    }
+    if (!reloadScheduled){
+        reloadScheduled = true
+        setTimeout(() => window.location.reload(), 300)
+    }
+}
+
+source.addEventListener("todo", scheduleReload)
+source.addEventListener("deadline", scheduleReload)
+
+// Fallback for events that never arrive (a broker that does not reach every server process,
+// a dropped stream, or a 503 from a server process already serving its maximum of streams,
+// after which the EventSource stays closed): now and then ask whether this page is still current.
+// An unchanged page costs a 304 from its ETag; anything else means it changed.
+if (pollSeconds > 0){
+    setInterval(function(){
+        fetch(window.location.href, { method: "HEAD", cache: "no-store", headers: { "If-None-Match": pageETag } })
+        .then(response => { if (response.status === 200) scheduleReload() })
+        .catch(error => console.log(error))
+    }, pollSeconds * 1000)
+}
+
+// show the complete title when hovering over a todo's title
+document.querySelectorAll('[data-bs-toggle="tooltip"]').forEach(element => new bootstrap.Tooltip(element))
+
+// Bulk actions: the selected todos are changed or deleted with one request
+const csrfToken = document.querySelector('meta[name="csrf-token"]').content
+const bulkBar = document.getElementById("bulkBar")
+const bulkCount = document.getElementById("bulkCount")
+
+const selectedIds = function(){
+    return [...document.querySelectorAll(".todo-select:checked")].map(box => parseInt(box.value))
+}
+
+// show the bulk bar only while something is selected
+const updateBulkBar = function(){
+    const count = selectedIds().length
+    bulkCount.innerText = count
+    bulkBar.classList.toggle("d-none", count === 0)
+}
+
+const postJSON = function(url, body){
+    return fetch(url, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", "X-CSRFToken": csrfToken },
+        body: JSON.stringify(body)
+    })
+    .then(response => response.json())
+}
+
+document.querySelectorAll(".todo-select").forEach(box => box.addEventListener("change", updateBulkBar))
+
+document.querySelectorAll("[data-bulk-status]").forEach(button => button.addEventListener("click", function(){
+    postJSON(bulkStatusURL, { ids: selectedIds(), status: button.dataset.bulkStatus })
+    .then(() => window.location.reload())
+    .catch(error => console.log(error))
+}))
+
+document.getElementById("bulkDelete").addEventListener("click", function(){
+    const ids = selectedIds()
+    if (!confirm(`Delete ${ids.length} todo(s)?`)) return
+    postJSON(bulkDeleteURL, { ids: ids })
+    .then(() => window.location.reload())
+    .catch(error => console.log(error))
+})
+
+document.getElementById("bulkClear").addEventListener("click", function(){
+    document.querySelectorAll(".todo-select:checked").forEach(box => box.checked = false)
+    updateBulkBar()
+})
+
+// Import: the file is streamed to the server as is, CSV or JSON Lines depending on its extension
+const importFile = document.getElementById("importFile")
+const importResult = document.getElementById("importResult")
+
+importFile.addEventListener("change", function(){
+    const file = importFile.files[0]
+    if (!file) return
+    const format = file.name.toLowerCase().endsWith(".csv") ? "csv" : "jsonl"
+    fetch(`${importURL}?format=${format}`, {
+        method: "POST",
+        headers: { "Content-Type": format === "csv" ? "text/csv" : "application/x-ndjson", "X-CSRFToken": csrfToken },
+        body: file
+    })
+    .then(response => response.json())
+    .then(data => {
+        importResult.classList.remove("d-none", "text-success", "text-danger")
+        if (data.error){
+            importResult.classList.add("text-danger")
+            importResult.innerText = data.error
+            return
+        }
+        importResult.classList.add(data.rejected ? "text-danger" : "text-success")
+        const firstError = data.errors.length ? ` (line ${data.errors[0].line}: ${data.errors[0].error})` : ""
+        importResult.innerText = `Imported ${data.imported}, rejected ${data.rejected}${firstError}`
+        if (data.imported) scheduleReload()
+    })
+    .catch(error => console.log(error))
+    importFile.value = ""
+})
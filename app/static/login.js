@@ -6,6 +6,7 @@ const form = document.getElementById("loginForm")
 const userNameValidation=document.getElementById("userNameValidation")
 const passwordValidation=document.getElementById("passwordValidation")
 const invalidCredentialsAlert=document.getElementById("invalidCredentialsAlert")
+const invalidCredentialsText=invalidCredentialsAlert.innerText
 
 //add event listener for submit
 form.addEventListener("submit",function(event){
@@ -43,9 +44,16 @@ form.addEventListener("submit",function(event){
         })
         .then(response => response.json())
         .then(data =>{
+            //too many attempts or server busy, show the reason instead of invalid credentials
+            if (data.error){
+                event.preventDefault()
+                invalidCredentialsAlert.innerText=data.error
+                invalidCredentialsAlert.classList.remove("d-none")
+            }
             //check the valid key in the response 
-            if (!data.valid){
+            else if (!data.valid){
                 event.preventDefault()
+                invalidCredentialsAlert.innerText=invalidCredentialsText
                 invalidCredentialsAlert.classList.remove("d-none")
             }
             else{
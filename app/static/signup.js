@@ -284,7 +284,13 @@ events.forEach(event=>{
                 })
                 .then(response => response.json()) //get response
                 .then(data => {
-                    if (data.exists) { //check the exists attribute to find whether a user exists
+                    if (data.error) { //rate limited or server error, the username is not confirmed yet
+                        userNameFlag=0
+                        userNameValidation.classList.remove("text-success")
+                        userNameValidation.classList.add("text-danger")
+                        userNameValidation.innerText = data.error;
+
+                    } else if (data.exists) { //check the exists attribute to find whether a user exists
                         userNameFlag=0
                         userNameValidation.classList.remove("text-success")
                         userNameValidation.classList.add("text-danger")
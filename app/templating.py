@@ -0,0 +1,43 @@
+"""
+Jinja template bytecode cache.
+
+Jinja compiles each template to Python code the first time a process loads
+it, so every freshly started worker pays that compile on its first
+requests. With `JINJA_CACHE_DIR` set (the `prod` profile), compiled
+templates are stored in and loaded from that directory through a
+`FileSystemBytecodeCache`. The image build fills it with
+`flask precompile-templates`, so new pods skip the compile entirely.
+
+Entries are keyed by template path and source checksum: an edited template
+is compiled again and the stale entry is ignored.
+
+Functions
+---------
+- `init_template_cache(app)` : Attaches the bytecode cache to the app's Jinja environment.
+- `precompile_templates(app)` : Compiles every template into the bytecode cache.
+"""
+
+import os
+from jinja2 import FileSystemBytecodeCache
+
+
+def init_template_cache(app):
+    """Uses `JINJA_CACHE_DIR` as the Jinja bytecode cache, if set."""
+    directory = app.config['JINJA_CACHE_DIR']
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+
+def precompile_templates(app):
+    """
+    Loads every template of the app once, which compiles it into the bytecode cache.
+
+    Returns:
+        - The names of the compiled templates.
+    """
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
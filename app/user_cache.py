@@ -0,0 +1,192 @@
+"""
+Cache for the user object loaded by Flask-Login on every request.
+
+`load_user` used to run `User.query.get()` for every authenticated request.
+It now reads through two tiers before falling back to the database:
+- A per-process LRU with a short TTL (`USER_CACHE_SIZE`, `USER_CACHE_LOCAL_TTL`).
+- An optional shared store (`USER_CACHE_SHARED_URL`, see `kvstore`) with its
+  own TTL (`USER_CACHE_SHARED_TTL`), so a user loaded by one worker is a hit
+  for every other worker and replica.
+
+Entries are plain dicts of the user's columns (never the password hash); a
+hit is turned back into a session-bound `User` without touching the database.
+
+Invalidation:
+Every ORM write to a `User` row (counters, names, password) or delete evicts
+the user from both tiers through SQLAlchemy events, once at flush time and
+again after the commit so a concurrent reader cannot re-cache the old row.
+Bulk statements that bypass the ORM must call `invalidate()` or `clear()`.
+Other processes' local tiers may serve a changed user until their short TTL
+expires, so the cached `User` is only fit for identity and profile fields:
+anything a write changes and a page shows (the `/list` ETag's `todo_version`,
+the dashboard counters) is read fresh with `queries.dashboard_state`.
+
+Functions
+---------
+- `init_user_cache(app)` : Configures the cache from the app config.
+- `load_user(user_id)` : Flask-Login user loader.
+- `invalidate(*user_ids)` / `clear()` : Evict users from every tier.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from prometheus_client import Counter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.session import make_transient_to_detached
+from . import login_manager, db
+from .models import User
+from .kvstore import make_store
+
+# Prometheus Counters
+user_cache_hits = Counter('user_cache_hits_total', 'User loader cache hits', ['tier'])
+user_cache_misses = Counter('user_cache_misses_total', 'User loader cache misses', ['tier'])
+
+# Columns kept in the cache, the password hash is loaded lazily if ever needed
+CACHED_COLUMNS = [column.key for column in User.__table__.columns if column.key != 'password']
+
+
+class LocalUserCache:
+    """
+    Thread-safe LRU of user dicts whose entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_size=1024, ttl=5, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            data, expires = entry
+            if expires <= self.clock():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return data
+
+    def set(self, user_id, data):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (data, self.clock() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalUserCache()
+shared_store = None
+shared_ttl = 300
+
+
+def init_user_cache(app):
+    """Configures both cache tiers from `USER_CACHE_*` settings."""
+    global shared_store, shared_ttl
+    local_cache.max_size = app.config['USER_CACHE_SIZE']
+    local_cache.ttl = app.config['USER_CACHE_LOCAL_TTL']
+    local_cache.clear()
+    shared_store = make_store(app.config['USER_CACHE_SHARED_URL'], 'todo:user:')
+    shared_ttl = app.config['USER_CACHE_SHARED_TTL']
+
+
+def shared_key(user_id):
+    return str(user_id)
+
+
+def to_dict(user):
+    return {key: getattr(user, key) for key in CACHED_COLUMNS}
+
+
+def from_dict(data):
+    """
+    Rebuilds a persistent `User` from cached columns without a query.
+    """
+    user = User.__mapper__.class_manager.new_instance()
+    for key, value in data.items():
+        set_committed_value(user, key, value)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    """
+    Loads the logged-in user from the local tier, the shared tier or the database.
+
+    Returns:
+        - The `User`, or None if it no longer exists.
+    """
+    user_id = int(user_id)
+    data = local_cache.get(user_id)
+    if data is not None:
+        user_cache_hits.labels(tier='local').inc()
+        return from_dict(data)
+    user_cache_misses.labels(tier='local').inc()
+
+    if shared_store is not None:
+        data = shared_store.get(shared_key(user_id))
+        if data is not None:
+            user_cache_hits.labels(tier='shared').inc()
+            local_cache.set(user_id, data)
+            return from_dict(data)
+        user_cache_misses.labels(tier='shared').inc()
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        data = to_dict(user)
+        local_cache.set(user_id, data)
+        if shared_store is not None:
+            shared_store.set(shared_key(user_id), data, shared_ttl)
+    return user
+
+
+def invalidate(*user_ids):
+    """Evicts users from both cache tiers."""
+    for user_id in user_ids:
+        local_cache.delete(user_id)
+    if shared_store is not None and user_ids:
+        shared_store.delete(*(shared_key(user_id) for user_id in user_ids))
+
+
+def clear():
+    """Evicts every user, e.g. after a bulk delete."""
+    local_cache.clear()
+    if shared_store is not None:
+        shared_store.clear()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def user_changed_listener(mapper, connection, target):
+    invalidate(target.id)
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def after_commit_listener(session):
+    changed = session.info.pop('changed_user_ids', None)
+    if changed:
+        invalidate(*changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def after_rollback_listener(session):
+    session.info.pop('changed_user_ids', None)
@@ -0,0 +1,183 @@
+"""
+In-memory username membership for the signup availability check.
+
+`signup.js` calls `/check_user_name` on every keystroke, and almost every
+call asks about a name that does not exist. `UsernameIndex` answers those
+without SQL:
+- A Bloom filter of every username gives a definite "no" for names never
+  added. Only possible hits go on.
+- A small LRU of names confirmed to exist answers repeated checks of taken
+  names.
+- Everything else (Bloom false positives, names not cached yet) falls
+  through to the database, and confirmed names are cached.
+
+The index is built from the `user` table at startup and updated on signup
+and `/delete_users`. A Bloom filter cannot forget names, so a deleted name
+only costs a database check until the next rebuild. Signups handled by other
+worker processes are not seen until this process rebuilds, which happens
+every `USERNAME_FILTER_REFRESH` seconds or when the filter outgrows its
+capacity. The unique constraint on `User.user_name` remains the authority
+at signup.
+
+Classes
+-------
+- `BloomFilter` : Fixed-size Bloom filter of strings.
+- `UsernameIndex` : Bloom filter plus positive cache with a database fallback.
+
+Functions
+---------
+- `init_username_index(app)` : Configures and builds the index from the app config.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from prometheus_client import Counter
+from . import db
+from .models import User
+
+# Prometheus Counters
+username_checks_total = Counter('username_checks_total', 'Username availability checks by how they were answered', ['answer'])
+
+
+class BloomFilter:
+    """
+    Bloom filter sized for `capacity` items at a false-positive rate of `error_rate`.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class UsernameIndex:
+    """
+    Answers "does this username exist?" from memory where it can.
+
+    Args:
+        error_rate: Bloom filter false-positive rate.
+        cache_size: number of confirmed usernames kept in the positive cache.
+        refresh: seconds after which the filter is rebuilt from the database
+            (0 never rebuilds on age).
+    """
+
+    def __init__(self, error_rate=0.01, cache_size=4096, refresh=60, clock=time.monotonic):
+        self.error_rate = error_rate
+        self.cache_size = cache_size
+        self.refresh = refresh
+        self.clock = clock
+        self.enabled = True
+        self._bloom = None
+        self._built_at = None
+        self._known = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def build(self):
+        """Rebuilds the filter from every username in the database."""
+        total = db.session.execute(db.select(db.func.count(User.id))).scalar()
+        bloom = BloomFilter(max(1024, 2 * total), self.error_rate)
+        for name in db.session.execute(db.select(User.user_name).execution_options(yield_per=1000)).scalars():
+            bloom.add(name)
+        with self._lock:
+            self._bloom = bloom
+            self._built_at = self.clock()
+            self._known.clear()
+
+    def _stale(self):
+        if self._bloom is None:
+            return True
+        if self._bloom.count > self._bloom.capacity:
+            return True
+        return bool(self.refresh) and self.clock() - self._built_at >= self.refresh
+
+    def add(self, user_name):
+        """Records a new username, e.g. after a signup."""
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(user_name)
+            self._remember(user_name)
+
+    def clear(self):
+        """Forgets every username, e.g. after all users were deleted."""
+        with self._lock:
+            self._bloom = BloomFilter(1024, self.error_rate)
+            self._built_at = self.clock()
+            self._known.clear()
+
+    def _remember(self, user_name):
+        if self.cache_size <= 0:
+            return
+        self._known[user_name] = True
+        self._known.move_to_end(user_name)
+        while len(self._known) > self.cache_size:
+            self._known.popitem(last=False)
+
+    def exists(self, user_name):
+        """
+        Whether a user with this username exists.
+
+        Returns:
+            - True or False, querying the database only for possible hits.
+        """
+        if not self.enabled:
+            username_checks_total.labels(answer='database').inc()
+            return User.query.filter(User.user_name == user_name).first() is not None
+
+        # One thread rebuilds a stale filter, the others keep using the old one
+        if self._stale() and self._build_lock.acquire(blocking=self._bloom is None):
+            try:
+                if self._stale():
+                    self.build()
+            finally:
+                self._build_lock.release()
+
+        with self._lock:
+            if user_name not in self._bloom:
+                username_checks_total.labels(answer='filter').inc()
+                return False
+            if user_name in self._known:
+                self._known.move_to_end(user_name)
+                username_checks_total.labels(answer='cache').inc()
+                return True
+
+        username_checks_total.labels(answer='database').inc()
+        exists = User.query.filter(User.user_name == user_name).first() is not None
+        if exists:
+            with self._lock:
+                self._remember(user_name)
+        return exists
+
+
+index = UsernameIndex()
+
+
+def init_username_index(app):
+    """Configures the index from `USERNAME_FILTER_*` settings and builds it."""
+    index.enabled = app.config['USERNAME_FILTER_ENABLED']
+    index.error_rate = app.config['USERNAME_FILTER_ERROR_RATE']
+    index.cache_size = app.config['USERNAME_FILTER_CACHE_SIZE']
+    index.refresh = app.config['USERNAME_FILTER_REFRESH']
+    if index.enabled:
+        with app.app_context():
+            index.build()
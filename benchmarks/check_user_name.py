@@ -0,0 +1,102 @@
+"""
+Benchmark for `/check_user_name`: latency and SQL queries per check, with
+the in-memory username index disabled (every check queries) and enabled.
+
+Seeds `--users` users into a throwaway SQLite database, or into the empty
+database given by `BENCHMARK_DATABASE_URL`, then replays
+`--checks` availability checks shaped like typing in the signup form: most
+prefixes are free names, a share (`--taken`) are existing usernames.
+
+Usage:
+    python benchmarks/check_user_name.py --users 10000 --checks 5000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def seed(app, count):
+    from app import db
+    from app.models import User
+    names = [f"user{i:07d}" for i in range(count)]
+    with app.app_context():
+        db.session.execute(db.insert(User), [
+            {'first_name': 'Bench', 'full_name': 'Bench', 'user_name': name, 'password': 'x',
+             'success': 0, 'failure': 0, 'pending': 0}
+            for name in names
+        ])
+        db.session.commit()
+    return names
+
+
+def run(app, enabled, args, names):
+    from sqlalchemy import event
+    from app import db
+    from app.usernames import index
+
+    with app.app_context():
+        index.enabled = enabled
+        if enabled:
+            index.build()
+        engine = db.engine
+    queries = [0]
+
+    def count_query(*_):
+        queries[0] += 1
+    event.listen(engine, "before_cursor_execute", count_query)
+
+    rng = random.Random(42)
+    client = app.test_client()
+    latencies = []
+    for _ in range(args.checks):
+        if rng.random() < args.taken:
+            name = rng.choice(names)
+        else:
+            name = f"free{rng.randrange(10 ** 9)}"
+        started = time.perf_counter()
+        response = client.post('/check_user_name', json={'userName': name})
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.status_code
+
+    event.remove(engine, "before_cursor_execute", count_query)
+    return {
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'queries_per_check': queries[0] / args.checks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--checks', type=int, default=5000)
+    parser.add_argument('--taken', type=float, default=0.1, help="share of checks for existing usernames")
+    args = parser.parse_args()
+
+    os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+    os.environ.setdefault('HASH_WORKERS', '0')
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = os.getenv('BENCHMARK_DATABASE_URL') or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from app import create_app
+        app = create_app()
+        app.config['WTF_CSRF_ENABLED'] = False
+        names = seed(app, args.users)
+        for label, enabled in (('database only', False), ('username index', True)):
+            result = run(app, enabled, args, names)
+            print(f"{label:15} p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms  "
+                  f"queries/check {result['queries_per_check']:.3f}")
+
+
+if __name__ == '__main__':
+    main()
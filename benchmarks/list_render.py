@@ -0,0 +1,107 @@
+"""
+Benchmark for rendering `/list`: time per page at 10, 100 and 1000 todos
+with the todo card fragment cache disabled, cold (emptied before every
+request) and warm.
+
+Signs up one user per page size in a throwaway SQLite database, or in the
+empty database given by `BENCHMARK_DATABASE_URL`, gives them that many
+pending todos (a few overdue or urgent, so every card variant is rendered)
+and requests their first page `--repeat` times per mode. The page size is
+raised so the whole list is rendered at once.
+
+Usage:
+    python benchmarks/list_render.py --sizes 10 100 1000 --repeat 20
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def logged_in_client(app, count):
+    from app import db, services
+    from app.models import Todo, User
+    user = {
+        'first_name': 'Bench', 'last_name': 'User', 'user_name': f"bench{count}",
+        'password': 'Passw0rd!', 'confirm_password': 'Passw0rd!'
+    }
+    client = app.test_client()
+    client.post('/signup', data=user)
+    response = client.post('/login', json={'user_name': user['user_name'], 'password': user['password']})
+    assert response.json.get('valid'), response.json
+
+    now = datetime.now()
+    with app.app_context():
+        user_id = db.session.execute(db.select(User.id).where(User.user_name == user['user_name'])).scalar_one()
+        # Due times from 2 hours ago to a few days ahead: overdue, urgent and regular cards
+        db.session.execute(db.insert(Todo), [
+            {'user_id': user_id, 'title': f"benchmark todo {i}", 'created_time': now - timedelta(days=1),
+             'due_time': now + timedelta(minutes=30 * i - 120), 'status': 'p'}
+            for i in range(count)
+        ])
+        services.shift_counters(user_id, {'p': count})
+        services.commit(user_id)
+    return client
+
+
+def run(client, count, repeat, before_request):
+    latencies = []
+    for _ in range(repeat):
+        before_request()
+        started = time.perf_counter()
+        response = client.get('/list?todo_status=p&sort=due_time')
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.status_code
+        assert response.data.count(b'todo-select') == count
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20, help="requests per size and mode")
+    args = parser.parse_args()
+
+    os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+    os.environ.setdefault('HASH_WORKERS', '0')
+    os.environ.setdefault('DEADLINE_SCHEDULER_ENABLED', 'false')
+    os.environ['TODO_PAGE_SIZE'] = str(max(args.sizes))
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = os.getenv('BENCHMARK_DATABASE_URL') or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from app import create_app
+        from app.fragments import cache
+        app = create_app()
+        app.config['WTF_CSRF_ENABLED'] = False
+        max_entries = cache.max_entries
+
+        def disable():
+            cache.max_entries = 0
+            cache.clear()
+
+        def enable_cold():
+            cache.max_entries = max_entries
+            cache.clear()
+
+        def enable_warm():
+            cache.max_entries = max_entries
+
+        for count in args.sizes:
+            client = logged_in_client(app, count)
+            for label, before_request in (('no cache', disable), ('cold cache', enable_cold), ('warm cache', enable_warm)):
+                latencies = run(client, count, args.repeat, before_request)
+                print(f"{count:5} todos  {label:10}  p50 {percentile(latencies, 50):8.2f} ms  "
+                      f"p99 {percentile(latencies, 99):8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""
+End-to-end load benchmark with a synthetic data set and an SLO report.
+
+Seeds `--users` users with `--todos` todos each into a throwaway SQLite
+database (or the empty database given by `BENCHMARK_DATABASE_URL`), in a
+realistic mix: about half pending, of which some are overdue or due within
+the hour, the rest completed or failed in the past. It then runs
+`--sessions` concurrent simulated browser sessions against the real
+`create_app()` app for `--duration` seconds. Each session:
+- logs in with the `/login` JSON call,
+- polls `/list` every `--poll-interval` seconds with the ETag of its last
+  page, like a reloading dashboard,
+- in between, flips todo statuses and creates todos, pausing `--think`
+  seconds after each request.
+
+The report gives throughput and p50/p95/p99 latency per endpoint, plus SQL
+statements and SQL time per request taken from the app's own
+`request_sql_*` histograms. It is printed and written as JSON to
+`--output`, with the git commit, so runs of different commits can be
+compared. With `--slo-p95` set, the script exits non-zero if any endpoint's
+p95 latency exceeds it.
+
+Everything runs in this process (Flask test clients, `APP_ENV=test`), with
+no external services.
+
+Usage:
+    python benchmarks/load.py --users 50 --todos 200 --sessions 8 --duration 30
+    python benchmarks/load.py --output load-report.json --slo-p95 250
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = 'Passw0rd!'
+STATUSES = ('p', 's', 'f')
+STATUS_WEIGHTS = (5, 3, 2)
+STATUS_ENDPOINTS = {'p': 'main.pending', 's': 'main.success', 'f': 'main.failure'}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def todo_row(rng, user_id, now, index):
+    """One synthetic todo: pending ones spread around now, completed ones in the past."""
+    status = rng.choices(STATUSES, weights=STATUS_WEIGHTS)[0]
+    if status == 'p':
+        bucket = rng.random()
+        if bucket < 0.1:
+            due_time = now - timedelta(hours=rng.uniform(1, 72))
+        elif bucket < 0.2:
+            due_time = now + timedelta(minutes=rng.uniform(1, 60))
+        else:
+            due_time = now + timedelta(hours=rng.uniform(1, 24 * 14))
+    else:
+        due_time = now - timedelta(hours=rng.uniform(1, 24 * 30))
+    created_time = min(now, due_time) - timedelta(hours=rng.uniform(1, 24 * 7))
+    return {
+        'user_id': user_id, 'title': f"synthetic todo {index}", 'status': status,
+        'created_time': created_time, 'due_time': due_time
+    }
+
+
+def seed(app, users, todos, rng):
+    """
+    Inserts the users and their todos with the models' tables and sets their
+    counters; the deadline scheduler computes the urgent/overdue ones.
+
+    Returns:
+        - The user names.
+    """
+    from app import db
+    from app.hashing import hash_password
+    from app.models import Todo, User
+    from app.scheduler import scheduler
+
+    now = datetime.now()
+    password = hash_password(PASSWORD)
+    names = [f"load{i:05d}" for i in range(users)]
+    with app.app_context():
+        for name in names:
+            user = User(first_name='Load', middle_name='', last_name='Test', user_name=name, password=PASSWORD)
+            db.session.add(user)
+            db.session.flush()
+            rows = [todo_row(rng, user.id, now, i) for i in range(todos)]
+            if rows:
+                db.session.execute(db.insert(Todo), rows)
+            counts = {status: sum(row['status'] == status for row in rows) for status in STATUSES}
+            user.pending, user.success, user.failure = counts['p'], counts['s'], counts['f']
+        db.session.commit()
+        # One hash for everyone, so seeding does not spend minutes in pbkdf2
+        db.session.execute(db.update(User).values(password=password))
+        db.session.commit()
+        scheduler.update_counters(None, now)
+    return names
+
+
+class Session(threading.Thread):
+    """One simulated browser session of a seeded user."""
+
+    def __init__(self, app, user_name, args, seed, deadline, results):
+        super().__init__(daemon=True)
+        self.app = app
+        self.user_name = user_name
+        self.args = args
+        self.rng = random.Random(seed)
+        self.deadline = deadline
+        self.results = results
+        self.etag = None
+
+    def timed(self, endpoint, send, ok=(200, 302)):
+        started = time.perf_counter()
+        try:
+            response = send()
+            status = response.status_code
+        except Exception:
+            status = None
+        elapsed = (time.perf_counter() - started) * 1000
+        self.results.append((endpoint, elapsed, status in ok))
+        return response if status is not None else None
+
+    def poll_list(self, client):
+        headers = {'If-None-Match': self.etag} if self.etag else {}
+        response = self.timed('main.list', lambda: client.get('/list', headers=headers), ok=(200, 304))
+        if response is not None and response.headers.get('ETag'):
+            self.etag = response.headers['ETag']
+
+    def todo_ids(self, client):
+        response = client.get('/api/v1/todos?todo_status=p&limit=50')
+        if response.status_code != 200:
+            return []
+        return [todo['todo_id'] for todo in response.json.get('todos', [])]
+
+    def run(self):
+        client = self.app.test_client()
+        self.timed('auth.login', lambda: client.post('/login', json={'user_name': self.user_name, 'password': PASSWORD}))
+        ids = self.todo_ids(client)
+        next_poll = time.monotonic()
+        while time.monotonic() < self.deadline:
+            if time.monotonic() >= next_poll:
+                self.poll_list(client)
+                next_poll = time.monotonic() + self.args.poll_interval
+            elif ids and self.rng.random() < 0.8:
+                to_status = self.rng.choice(STATUSES)
+                todo_id = self.rng.choice(ids)
+                self.timed(STATUS_ENDPOINTS[to_status], lambda: client.get(f"/{STATUS_ENDPOINTS[to_status][5:]}/{todo_id}"))
+            else:
+                due_time = (datetime.now() + timedelta(hours=self.rng.uniform(1, 48))).strftime("%Y-%m-%dT%H:%M")
+                self.timed('main.create', lambda: client.post('/create', data={'title': 'load test todo', 'due_time': due_time}))
+            if self.args.think:
+                time.sleep(self.args.think)
+
+
+def sql_samples(endpoints):
+    """Current `(count, statements, seconds)` of the app's per-endpoint SQL histograms."""
+    from prometheus_client import REGISTRY
+    samples = {}
+    for endpoint in endpoints:
+        labels = {'endpoint': endpoint}
+        samples[endpoint] = (
+            REGISTRY.get_sample_value('request_sql_queries_count', labels) or 0,
+            REGISTRY.get_sample_value('request_sql_queries_sum', labels) or 0,
+            REGISTRY.get_sample_value('request_sql_seconds_sum', labels) or 0,
+        )
+    return samples
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(args, results, elapsed, before, after, database):
+    endpoints = {}
+    for endpoint, latency, ok in results:
+        endpoints.setdefault(endpoint, []).append((latency, ok))
+
+    routes = {}
+    for endpoint, samples in sorted(endpoints.items()):
+        latencies = [latency for latency, _ in samples]
+        requests, statements, seconds = (a - b for a, b in zip(after[endpoint], before[endpoint]))
+        routes[endpoint] = {
+            'requests': len(samples),
+            'errors': sum(not ok for _, ok in samples),
+            'throughput_rps': len(samples) / elapsed,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'sql_queries_per_request': statements / requests if requests else None,
+            'sql_ms_per_request': seconds * 1000 / requests if requests else None,
+        }
+
+    slo = None
+    if args.slo_p95:
+        violations = [endpoint for endpoint, route in routes.items() if route['p95_ms'] > args.slo_p95]
+        slo = {'p95_ms': args.slo_p95, 'violations': violations, 'passed': not violations}
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'database': database,
+        'config': {
+            'users': args.users, 'todos_per_user': args.todos, 'sessions': args.sessions,
+            'duration_s': args.duration, 'poll_interval_s': args.poll_interval, 'think_s': args.think,
+        },
+        'total': {
+            'requests': len(results),
+            'errors': sum(not ok for _, _, ok in results),
+            'elapsed_s': elapsed,
+            'throughput_rps': len(results) / elapsed,
+        },
+        'routes': routes,
+        'slo': slo,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--todos', type=int, default=200, help="todos per user")
+    parser.add_argument('--sessions', type=int, default=8, help="concurrent sessions, one user each")
+    parser.add_argument('--duration', type=float, default=30, help="seconds of load")
+    parser.add_argument('--poll-interval', type=float, default=10, help="seconds between /list polls of a session")
+    parser.add_argument('--think', type=float, default=0.05, help="seconds a session pauses after each request")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='load-report.json', help="JSON report path")
+    parser.add_argument('--slo-p95', type=float, default=None, help="fail if an endpoint's p95 exceeds this many ms")
+    args = parser.parse_args()
+
+    os.environ.setdefault('APP_ENV', 'test')
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = os.getenv('BENCHMARK_DATABASE_URL') or f"sqlite:///{os.path.join(tmp, 'load.db')}"
+        from app import create_app, db
+        app = create_app()
+        with app.app_context():
+            database = db.engine.dialect.name
+
+        started = time.perf_counter()
+        names = seed(app, args.users, args.todos, rng)
+        print(f"seeded {args.users} users x {args.todos} todos in {time.perf_counter() - started:.1f} s")
+
+        endpoints = ['auth.login', 'main.list', 'main.create', *STATUS_ENDPOINTS.values()]
+        before = sql_samples(endpoints)
+        results = []
+        deadline = time.monotonic() + args.duration
+        sessions = [
+            Session(app, names[i % len(names)], args, args.seed + i, deadline, results)
+            for i in range(args.sessions)
+        ]
+        started = time.perf_counter()
+        for session in sessions:
+            session.start()
+        for session in sessions:
+            session.join()
+        elapsed = time.perf_counter() - started
+        after = sql_samples(endpoints)
+        with app.app_context():
+            db.engine.dispose()
+
+    result = report(args, results, elapsed, before, after, database)
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    total = result['total']
+    print(f"{total['requests']} requests in {total['elapsed_s']:.1f} s ({total['throughput_rps']:.1f} req/s), "
+          f"{total['errors']} errors")
+    for endpoint, route in result['routes'].items():
+        queries = route['sql_queries_per_request']
+        print(f"{endpoint:14} {route['requests']:6} req  p50 {route['p50_ms']:7.2f}  p95 {route['p95_ms']:7.2f}  "
+              f"p99 {route['p99_ms']:7.2f} ms  sql/req {queries if queries is None else round(queries, 2)}")
+    print(f"report written to {args.output}")
+    if result['slo'] and not result['slo']['passed']:
+        sys.exit(f"p95 SLO of {args.slo_p95} ms violated by {', '.join(result['slo']['violations'])}")
+
+
+if __name__ == '__main__':
+    main()
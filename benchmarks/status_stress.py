@@ -0,0 +1,110 @@
+"""
+Concurrency stress test for todo status transitions.
+
+Logs one user in from `--tabs` concurrent test clients (like several open
+browser tabs) and has each fire `--ops` random create / success / failure /
+pending / delete requests at a shared set of todos. Afterwards the user's
+stored pending/success/failure counters must equal `COUNT(*)` of their todos
+by status; the script exits non-zero if they drift.
+
+Usage:
+    python benchmarks/status_stress.py --tabs 8 --ops 300
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USER = {'first_name': 'Stress', 'last_name': 'Test', 'user_name': 'stress', 'password': 'Stress#123', 'confirm_password': 'Stress#123'}
+
+
+def logged_in_client(app):
+    client = app.test_client()
+    response = client.post('/login', json={'user_name': USER['user_name'], 'password': USER['password']})
+    assert response.json.get('valid'), response.json
+    return client
+
+
+def create(client):
+    due_time = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%dT%H:%M")
+    response = client.post('/create', data={'title': 'stress todo', 'due_time': due_time})
+    assert response.status_code == 302, response.status_code
+
+
+def tab(app, todo_ids, ops, seed, errors):
+    rng = random.Random(seed)
+    try:
+        client = logged_in_client(app)
+        for _ in range(ops):
+            action = rng.choices(('success', 'failure', 'pending', 'delete', 'create'), weights=(3, 3, 3, 1, 1))[0]
+            if action == 'create':
+                create(client)
+            else:
+                response = client.get(f"/{action}/{rng.choice(todo_ids)}")
+                assert response.status_code in (200, 302), response.status_code
+    except Exception as e:
+        errors.append(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tabs', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=300, help="requests per tab")
+    parser.add_argument('--todos', type=int, default=200, help="todos the tabs fight over")
+    args = parser.parse_args()
+
+    os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+    os.environ.setdefault('HASH_WORKERS', '0')
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = os.getenv('BENCHMARK_DATABASE_URL') or f"sqlite:///{os.path.join(tmp, 'stress.db')}"
+        from app import create_app, db
+        from app.models import Todo, User
+        app = create_app()
+        app.config['WTF_CSRF_ENABLED'] = False
+
+        client = app.test_client()
+        client.post('/signup', data=USER)
+        client = logged_in_client(app)
+        for _ in range(args.todos):
+            create(client)
+        with app.app_context():
+            todo_ids = db.session.execute(db.select(Todo.todo_id)).scalars().all()
+
+        errors = []
+        threads = [threading.Thread(target=tab, args=(app, todo_ids, args.ops, seed, errors)) for seed in range(args.tabs)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if errors:
+            raise errors[0]
+
+        with app.app_context():
+            user = db.session.execute(db.select(User).where(User.user_name == USER['user_name'])).scalar_one()
+            stored = {'p': user.pending, 's': user.success, 'f': user.failure}
+            rows = db.session.execute(
+                db.select(Todo.status, db.func.count()).where(Todo.user_id == user.id).group_by(Todo.status)
+            ).all()
+            counted = {'p': 0, 's': 0, 'f': 0, **dict(rows)}
+            db.engine.dispose()
+
+    requests = args.tabs * args.ops
+    print(f"{requests} requests from {args.tabs} tabs in {elapsed:.2f} s ({requests / elapsed:.0f} req/s)")
+    print(f"stored counters {stored}")
+    print(f"COUNT(*)        {counted}")
+    if stored != counted:
+        sys.exit("counters drifted from the todo table")
+    print("counters consistent")
+
+
+if __name__ == '__main__':
+    main()
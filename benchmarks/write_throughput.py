@@ -0,0 +1,248 @@
+"""
+Write throughput of the per-request commit path versus group commit.
+
+Runs `--clients` concurrent API clients against the real `create_app()` app,
+each one as its own seeded user, for `--duration` seconds per mode. A client
+alternates between creating a todo (`POST /api/v1/todos`) and moving one of
+its todos to another status (`PUT /api/v1/todos/<id>/status`), with no
+think time, so the database's commits are the bottleneck. The same load is
+run twice in this process:
+- `per_request`: every write commits its own transaction (the default),
+- `group_commit`: writes go through the group committer, with
+  `--window-ms` and `--max-batch`.
+
+The report gives writes/s and p50/p95/p99 write latency per mode, the
+number of COMMIT statements SQLite actually executed (traced on every
+connection, so a commit hidden in a savepoint RELEASE would not be missed)
+and writes per COMMIT, and for group commit the mean batch size and COMMIT
+latency from the app's own `group_commit_*` histograms. It is printed and
+written as JSON to `--output`.
+
+SQLite runs WAL with `synchronous=NORMAL`, which does not sync the WAL on
+every commit. `--synchronous FULL` syncs it on every COMMIT, so writes/s
+then follows the number of syncs the storage can do; `--database-dir` puts
+the database file on the storage to measure (a network volume, say) rather
+than in the system temporary directory. On a local SSD a sync takes a
+fraction of a millisecond, so there batching has little to save and the
+in-process load is bound by Python, not by commits.
+
+Everything runs in this process (Flask test clients, `APP_ENV=test`), with
+no external services.
+
+Usage:
+    python benchmarks/write_throughput.py --clients 16 --duration 10
+    python benchmarks/write_throughput.py --synchronous FULL --database-dir /mnt/volume --window-ms 2
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = 'Passw0rd!'
+STATUSES = ('p', 's', 'f')
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def seed(app, clients):
+    """
+    Inserts one user per client, all with the same password hash.
+
+    Returns:
+        - The user names.
+    """
+    from app import db
+    from app.hashing import hash_password
+    from app.models import User
+
+    password = hash_password(PASSWORD)
+    names = [f"writer{i:03d}" for i in range(clients)]
+    with app.app_context():
+        for name in names:
+            db.session.add(User(first_name='Write', middle_name='', last_name='Test', user_name=name, password=password))
+        db.session.commit()
+    return names
+
+
+class Writer(threading.Thread):
+    """One API client writing as fast as its responses come back."""
+
+    def __init__(self, client, start, duration, results):
+        super().__init__(daemon=True)
+        self.client = client
+        self.start_event = start
+        self.duration = duration
+        self.results = results
+        self.todo_ids = []
+
+    def timed(self, send, ok):
+        started = time.perf_counter()
+        try:
+            response = send()
+            status = response.status_code
+        except Exception:
+            response, status = None, None
+        self.results.append(((time.perf_counter() - started) * 1000, status == ok))
+        return response if status == ok else None
+
+    def run(self):
+        due_time = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%dT%H:%M")
+        self.start_event.wait()
+        deadline = time.monotonic() + self.duration
+        index = 0
+        while time.monotonic() < deadline:
+            if index % 2 == 0 or not self.todo_ids:
+                response = self.timed(
+                    lambda: self.client.post('/api/v1/todos', json={'title': f'write test {index}', 'due_time': due_time}),
+                    201
+                )
+                if response is not None:
+                    self.todo_ids.append(response.json['todo']['todo_id'])
+            else:
+                todo_id = self.todo_ids[index % len(self.todo_ids)]
+                to_status = STATUSES[index % len(STATUSES)]
+                self.timed(lambda: self.client.put(f'/api/v1/todos/{todo_id}/status', json={'status': to_status}), 200)
+            index += 1
+
+
+class CommitCounter:
+    """Counts the COMMIT statements SQLite runs on every connection it is attached to."""
+
+    def __init__(self):
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def attach(self, dbapi_connection):
+        dbapi_connection.set_trace_callback(self.trace)
+
+    def trace(self, statement):
+        if statement.lstrip()[:6].upper() == 'COMMIT':
+            with self._lock:
+                self.total += 1
+
+
+def group_commit_samples(commits):
+    """Current `(batches, writes, commit seconds, COMMIT statements)`."""
+    from prometheus_client import REGISTRY
+    return (
+        REGISTRY.get_sample_value('group_commit_batch_size_count') or 0,
+        REGISTRY.get_sample_value('group_commit_batch_size_sum') or 0,
+        REGISTRY.get_sample_value('group_commit_seconds_sum') or 0,
+        commits.total,
+    )
+
+
+def run_mode(clients, duration, commits):
+    """Runs the writers for `duration` seconds and summarises their writes."""
+    results = []
+    start = threading.Event()
+    writers = [Writer(client, start, duration, results) for client in clients]
+    for writer in writers:
+        writer.start()
+    before = group_commit_samples(commits)
+    started = time.perf_counter()
+    start.set()
+    for writer in writers:
+        writer.join()
+    elapsed = time.perf_counter() - started
+    batches, writes, seconds, statements = (a - b for a, b in zip(group_commit_samples(commits), before))
+
+    latencies = [latency for latency, _ in results]
+    return {
+        'writes': len(results),
+        'errors': sum(not ok for _, ok in results),
+        'elapsed_s': elapsed,
+        'writes_per_s': len(results) / elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'commits': statements,
+        'writes_per_commit': len(results) / statements if statements else None,
+        'batches': batches,
+        'mean_batch_size': writes / batches if batches else None,
+        'mean_commit_ms': seconds * 1000 / batches if batches else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=16, help="concurrent writers, one user each")
+    parser.add_argument('--duration', type=float, default=10, help="seconds of load per mode")
+    parser.add_argument('--window-ms', type=float, default=2, help="group-commit window")
+    parser.add_argument('--max-batch', type=int, default=64, help="group-commit batch size limit")
+    parser.add_argument('--synchronous', choices=('NORMAL', 'FULL'), default='NORMAL', help="SQLite synchronous pragma")
+    parser.add_argument('--database-dir', default=None, help="directory of the database file (default: a temporary one)")
+    parser.add_argument('--output', default='write-throughput-report.json', help="JSON report path")
+    args = parser.parse_args()
+
+    os.environ.setdefault('APP_ENV', 'test')
+    with tempfile.TemporaryDirectory(dir=args.database_dir) as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'writes.db')}"
+        # Every writer and the group committer hold a connection at once
+        os.environ.setdefault('DB_MAX_OVERFLOW', str(args.clients + 10))
+        from sqlalchemy import event
+        from app import create_app, db
+        from app.groupcommit import committer
+        app = create_app()
+        commits = CommitCounter()
+        with app.app_context():
+            @event.listens_for(db.engine, 'connect')
+            def set_synchronous(dbapi_connection, connection_record):
+                dbapi_connection.execute(f"PRAGMA synchronous={args.synchronous}")
+                commits.attach(dbapi_connection)
+            # Reconnect with the pragma and the trace
+            db.engine.dispose()
+
+        names = seed(app, args.clients)
+        clients = []
+        for name in names:
+            client = app.test_client()
+            client.post('/login', json={'user_name': name, 'password': PASSWORD})
+            clients.append(client)
+
+        modes = {}
+        committer.window = args.window_ms / 1000
+        committer.max_batch = args.max_batch
+        for mode, enabled in (('per_request', False), ('group_commit', True)):
+            committer.enabled = enabled
+            modes[mode] = run_mode(clients, args.duration, commits)
+        with app.app_context():
+            db.engine.dispose()
+
+    result = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'clients': args.clients, 'duration_s': args.duration, 'window_ms': args.window_ms,
+            'max_batch': args.max_batch, 'synchronous': args.synchronous,
+            'database_dir': args.database_dir or tempfile.gettempdir(),
+        },
+        'modes': modes,
+        'speedup': modes['group_commit']['writes_per_s'] / modes['per_request']['writes_per_s'],
+    }
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    for mode, stats in modes.items():
+        batch = stats['mean_batch_size']
+        commit = stats['mean_commit_ms']
+        print(f"{mode:12} {stats['writes']:6} writes  {stats['writes_per_s']:8.1f} writes/s  "
+              f"p50 {stats['p50_ms']:7.2f}  p95 {stats['p95_ms']:7.2f}  p99 {stats['p99_ms']:7.2f} ms  "
+              f"{stats['errors']} errors  {stats['commits']} COMMITs"
+              + (f"  batch {batch:.1f}  commit {commit:.2f} ms" if batch else ""))
+    print(f"group commit: {result['speedup']:.2f}x the writes/s of per-request commits")
+    print(f"report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+#!/bin/sh
+# Container entrypoint: brings the database schema up to date, then runs the
+# command (gunicorn by default, see the Dockerfile's CMD).
+#
+# `db.create_all()` at startup only creates missing tables; the columns and
+# indexes added to existing ones since (todo_version, urgent/overdue, ...)
+# come from the migrations. Replicas starting together on PostgreSQL take
+# turns through an advisory lock (migrations/env.py). Set MIGRATE_ON_START=false
+# to run `flask --app app:create_app db upgrade` some other way.
+set -e
+
+# Importing the app registers its metrics, which need the multiprocess directory
+mkdir -p "${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}"
+
+if [ "${MIGRATE_ON_START:-true}" = "true" ]; then
+    flask --app app:create_app db upgrade
+fi
+
+exec "$@"
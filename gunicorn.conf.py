@@ -0,0 +1,63 @@
+"""
+Gunicorn configuration for production serving.
+
+Run with:
+    gunicorn --config gunicorn.conf.py wsgi:app
+
+Every setting can be tuned through the environment:
+- `PORT` : Listening port (default 9090).
+- `WEB_CONCURRENCY` : Worker processes (default 2). Size it to the memory
+  and CPU the container is given, not to the host's CPU count: each worker
+  takes about 67 MB plus `HASH_WORKERS` password hashing processes.
+- `GUNICORN_THREADS` : Threads per worker (default 8). Each open
+  Server-Sent Events stream holds one thread for up to
+  `EVENTS_STREAM_TIMEOUT` seconds, so a worker serves at most
+  `EVENTS_MAX_STREAMS` streams (default 4) and keeps its other threads for
+  ordinary requests.
+- `GUNICORN_TIMEOUT` : Seconds a worker may stay silent before it is killed and restarted.
+- `GUNICORN_GRACEFUL_TIMEOUT` : Seconds in-flight requests get to finish on shutdown.
+- `GUNICORN_KEEPALIVE` : Seconds an idle keep-alive connection stays open.
+- `GUNICORN_MAX_REQUESTS` : Recycles a worker after this many requests (0 disables).
+- `PROMETHEUS_MULTIPROC_DIR` : Directory where workers write their metrics so
+  `/metrics` reports the sum over all workers.
+
+`create_app()` is preloaded once in the master and the workers are forked
+from it, so startup work (table creation, the username index) runs once.
+"""
+
+import os
+import shutil
+
+# Prometheus metrics are aggregated across workers through files in this directory.
+# It must be set before prometheus_client is imported, and is emptied on every start.
+multiproc_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus_multiproc')
+shutil.rmtree(multiproc_dir, ignore_errors=True)
+os.makedirs(multiproc_dir, exist_ok=True)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '9090')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+preload_app = True
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """Drops database connections inherited from the preloading master."""
+    from app import db
+    from wsgi import app
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    """Removes the live gauge values of a worker that exited."""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,56 @@
+"""initial schema
+
+Revision ID: 3c3586374a54
+Revises: 
+Create Date: 2026-10-18 05:24:37.520947
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c3586374a54'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by `db.create_all()` before migrations existed already
+    # have these tables, so only create them when they are missing.
+    op.create_table(
+        'user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_name', sa.String(length=40), nullable=False),
+        sa.Column('first_name', sa.String(length=20), nullable=False),
+        sa.Column('middle_name', sa.String(length=20), nullable=True),
+        sa.Column('last_name', sa.String(length=20), nullable=True),
+        sa.Column('full_name', sa.String(length=63), nullable=True),
+        sa.Column('password', sa.String(length=150), nullable=False),
+        sa.Column('success', sa.Integer(), nullable=False),
+        sa.Column('failure', sa.Integer(), nullable=False),
+        sa.Column('pending', sa.Integer(), nullable=False),
+        sa.Column('admin', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_user_user_name', 'user', ['user_name'], unique=True, if_not_exists=True)
+    op.create_table(
+        'todo',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('todo_id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=100), nullable=False),
+        sa.Column('created_time', sa.DateTime(), nullable=True),
+        sa.Column('due_time', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=1), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('todo_id'),
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('todo')
+    op.drop_index('ix_user_user_name', table_name='user')
+    op.drop_table('user')
@@ -0,0 +1,32 @@
+"""user deadline counters
+
+Revision ID: 4710d6897ddb
+Revises: 4c8bf80e8fa0
+Create Date: 2026-10-18 05:45:33.988443
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4710d6897ddb'
+down_revision = '4c8bf80e8fa0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # `db.create_all()` already adds the columns on fresh databases; the deadline
+    # scheduler fills them in on its first run
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('user')]
+    with op.batch_alter_table('user') as batch_op:
+        for name in ('urgent', 'overdue'):
+            if name not in columns:
+                batch_op.add_column(sa.Column(name, sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('overdue')
+        batch_op.drop_column('urgent')
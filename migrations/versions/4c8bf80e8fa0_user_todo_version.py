@@ -0,0 +1,29 @@
+"""user todo version
+
+Revision ID: 4c8bf80e8fa0
+Revises: cb82fa300ec0
+Create Date: 2026-10-18 05:30:08.737498
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8bf80e8fa0'
+down_revision = 'cb82fa300ec0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # `db.create_all()` already adds the column on fresh databases
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('user')]
+    if 'todo_version' not in columns:
+        with op.batch_alter_table('user') as batch_op:
+            batch_op.add_column(sa.Column('todo_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('todo_version')
@@ -0,0 +1,25 @@
+"""todo status due index
+
+Revision ID: 9b1e5c2d7f40
+Revises: 4710d6897ddb
+Create Date: 2026-10-18 06:40:12.418503
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b1e5c2d7f40'
+down_revision = '4710d6897ddb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # `if_not_exists` because `db.create_all()` builds it on fresh databases
+    op.create_index('ix_todo_status_due', 'todo', ['status', 'due_time'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_todo_status_due', table_name='todo')
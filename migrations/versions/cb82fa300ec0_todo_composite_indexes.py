@@ -0,0 +1,27 @@
+"""todo composite indexes
+
+Revision ID: cb82fa300ec0
+Revises: 3c3586374a54
+Create Date: 2026-10-18 05:24:45.621252
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cb82fa300ec0'
+down_revision = '3c3586374a54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # `if_not_exists` because `db.create_all()` builds these on fresh databases
+    op.create_index('ix_todo_user_status_due', 'todo', ['user_id', 'status', 'due_time'], if_not_exists=True)
+    op.create_index('ix_todo_user_status_created', 'todo', ['user_id', 'status', 'created_time'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_todo_user_status_created', table_name='todo')
+    op.drop_index('ix_todo_user_status_due', table_name='todo')
@@ -0,0 +1,53 @@
+"""todo title search
+
+Revision ID: d2a7f3c91e65
+Revises: 9b1e5c2d7f40
+Create Date: 2026-10-18 07:35:48.203117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a7f3c91e65'
+down_revision = '9b1e5c2d7f40'
+branch_labels = None
+depends_on = None
+
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS todo_fts USING fts5("
+    "title, content='todo', content_rowid='todo_id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS todo_fts_insert AFTER INSERT ON todo BEGIN "
+    "INSERT INTO todo_fts(rowid, title) VALUES (new.todo_id, new.title); END",
+    "CREATE TRIGGER IF NOT EXISTS todo_fts_delete AFTER DELETE ON todo BEGIN "
+    "INSERT INTO todo_fts(todo_fts, rowid, title) VALUES ('delete', old.todo_id, old.title); END",
+    "CREATE TRIGGER IF NOT EXISTS todo_fts_update AFTER UPDATE OF title ON todo BEGIN "
+    "INSERT INTO todo_fts(todo_fts, rowid, title) VALUES ('delete', old.todo_id, old.title); "
+    "INSERT INTO todo_fts(rowid, title) VALUES (new.todo_id, new.title); END",
+)
+
+
+def upgrade():
+    # The app creates the same objects at startup (app/search.py), hence `IF NOT EXISTS`
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("CREATE INDEX IF NOT EXISTS ix_todo_title_fts ON todo USING gin (to_tsvector('simple', title))")
+    elif bind.dialect.name == 'sqlite':
+        if 'ENABLE_FTS5' not in bind.execute(sa.text("PRAGMA compile_options")).scalars().all():
+            return
+        exists = bind.execute(sa.text("SELECT 1 FROM sqlite_master WHERE name = 'todo_fts'")).first()
+        for statement in SQLITE_DDL:
+            op.execute(statement)
+        if not exists:
+            op.execute("INSERT INTO todo_fts(todo_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_todo_title_fts")
+    elif bind.dialect.name == 'sqlite':
+        for trigger in ('todo_fts_insert', 'todo_fts_delete', 'todo_fts_update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS todo_fts")
@@ -0,0 +1,42 @@
+"""todo archive
+
+Revision ID: e81c4f06b3a2
+Revises: d2a7f3c91e65
+Create Date: 2026-10-18 09:12:37.204815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81c4f06b3a2'
+down_revision = 'd2a7f3c91e65'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # `if_not_exists` because `db.create_all()` builds them on fresh databases
+    op.create_table(
+        'todo_archive',
+        sa.Column('archive_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('todo_id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=100), nullable=False),
+        sa.Column('created_time', sa.DateTime(), nullable=True),
+        sa.Column('due_time', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=1), nullable=False),
+        sa.Column('archived_time', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('archive_id'),
+        if_not_exists=True
+    )
+    op.create_index(
+        'ix_todo_archive_user_status_due', 'todo_archive', ['user_id', 'status', 'due_time'], if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_index('ix_todo_archive_user_status_due', table_name='todo_archive')
+    op.drop_table('todo_archive')
@@ -0,0 +1,42 @@
+"""purge job
+
+Revision ID: f3b9d27a4c18
+Revises: e81c4f06b3a2
+Create Date: 2026-10-18 10:04:51.733920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b9d27a4c18'
+down_revision = 'e81c4f06b3a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # `if_not_exists` because `db.create_all()` builds them on fresh databases
+    op.create_table(
+        'purge_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=5), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('up_to_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=8), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('deleted', sa.Integer(), nullable=False),
+        sa.Column('created_time', sa.DateTime(), nullable=False),
+        sa.Column('updated_time', sa.DateTime(), nullable=False),
+        sa.Column('finished_time', sa.DateTime(), nullable=True),
+        sa.Column('error', sa.String(length=200), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_purge_job_status', 'purge_job', ['status', 'id'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_purge_job_status', table_name='purge_job')
+    op.drop_table('purge_job')
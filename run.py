@@ -2,8 +2,11 @@
 Flask application entry point with Prometheus metrics setup.
 
 This module runs the Flask application created by the factory function
-and sets up Prometheus metrics exposure.
+and sets up Prometheus metrics exposure. It uses the Werkzeug development
+server and is meant for local development only; production serves `wsgi.py`
+with Gunicorn. The debugger and reloader are enabled with `FLASK_DEBUG=1`.
 """
+import os
 from app import create_app
 from prometheus_client import make_wsgi_app
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
@@ -21,4 +24,4 @@ app.wsgi_app = DispatcherMiddleware(app.wsgi_app, {
 if __name__ == "__main__":
     with app.app_context():
         # Run the application
-        app.run(host='0.0.0.0', port=9090, debug=True)
\ No newline at end of file
+        app.run(host='0.0.0.0', port=9090, debug=os.getenv('FLASK_DEBUG') == '1')
\ No newline at end of file
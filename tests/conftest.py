@@ -0,0 +1,53 @@
+"""
+Shared fixtures for the route tests.
+
+The app is created once per test session (`create_app()` registers process
+wide Prometheus metrics, so it cannot be built twice) with the `test`
+profile, against a throwaway SQLite file or the empty database given by
+`TEST_DATABASE_URL` (e.g. PostgreSQL in CI). Tests stay independent by each
+signing up their own user through `login`.
+"""
+
+import itertools
+import os
+import tempfile
+import pytest
+
+PASSWORD = 'Passw0rd!'
+
+_names = itertools.count()
+
+
+@pytest.fixture(scope='session')
+def app():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['APP_ENV'] = 'test'
+        # Every test signs up and logs in; full-strength hashing would dominate the run
+        os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+        os.environ['DATABASE_URL'] = os.getenv('TEST_DATABASE_URL') or f"sqlite:///{os.path.join(tmp, 'test.db')}"
+        from app import create_app, db
+        app = create_app()
+        yield app
+        with app.app_context():
+            db.engine.dispose()
+
+
+@pytest.fixture
+def login(app):
+    """Signs up a new user and returns a test client logged in as them."""
+    def login():
+        user_name = f"user{os.getpid()}x{next(_names)}"
+        client = app.test_client()
+        client.post('/signup', data={
+            'first_name': 'Test', 'last_name': 'User', 'user_name': user_name,
+            'password': PASSWORD, 'confirm_password': PASSWORD,
+        })
+        response = client.post('/login', json={'user_name': user_name, 'password': PASSWORD})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return client
+    return login
+
+
+@pytest.fixture
+def client(login):
+    return login()
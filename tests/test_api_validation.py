@@ -0,0 +1,69 @@
+"""Malformed but valid-JSON API requests get a 400, never a 500."""
+
+import pytest
+
+
+@pytest.fixture
+def todo_id(client):
+    response = client.post('/api/v1/todos', json={'title': 'validated', 'due_time': '2030-01-01T10:00'})
+    assert response.status_code == 201
+    return response.json['todo']['todo_id']
+
+
+@pytest.mark.parametrize('due_time', ['2030-01-01T10:00:00Z', '2030-01-01T10:00:00+02:00'])
+def test_create_accepts_offset_due_times(client, due_time):
+    response = client.post('/api/v1/todos', json={'title': 'with offset', 'due_time': due_time})
+    assert response.status_code == 201
+    assert '+' not in response.json['todo']['due_time']
+
+
+@pytest.mark.parametrize('body', [
+    [1, 2],
+    'title',
+    {'title': 12345, 'due_time': '2030-01-01T10:00'},
+    {'title': ['a list'], 'due_time': '2030-01-01T10:00'},
+    {'title': 'valid title', 'due_time': 20300101},
+    {'title': 'valid title', 'due_time': 'tomorrow'},
+])
+def test_create_rejects_malformed_bodies(client, body):
+    assert client.post('/api/v1/todos', json=body).status_code == 400
+
+
+@pytest.mark.parametrize('body', [[1, 2], {'title': 12345}, {'title': None}, {'due_time': None}])
+def test_patch_rejects_malformed_bodies(client, todo_id, body):
+    assert client.patch(f'/api/v1/todos/{todo_id}', json=body).status_code == 400
+    assert client.get(f'/api/v1/todos/{todo_id}').json['todo']['title'] == 'validated'
+
+
+def test_patch_accepts_offset_due_time(client, todo_id):
+    response = client.patch(f'/api/v1/todos/{todo_id}', json={'due_time': '2030-06-01T08:00:00Z'})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('body', [[1, 2], {'status': ['s']}, {'status': {'s': 1}}, {'status': 1}, {}])
+def test_status_rejects_malformed_bodies(client, todo_id, body):
+    assert client.put(f'/api/v1/todos/{todo_id}/status', json=body).status_code == 400
+
+
+@pytest.mark.parametrize('body', [
+    [1, 2],
+    {'status': ['s'], 'ids': [1]},
+    {'status': 's', 'ids': [True]},
+    {'status': 's', 'ids': 'all'},
+    {'status': 's', 'filter': ['p']},
+])
+def test_bulk_status_rejects_malformed_bodies(client, body):
+    assert client.post('/api/v1/todos/bulk/status', json=body).status_code == 400
+
+
+@pytest.mark.parametrize('body', [[1, 2], {'ids': [True, False]}, {'filter': {'p': 1}}])
+def test_bulk_delete_rejects_malformed_bodies(client, todo_id, body):
+    assert client.post('/api/v1/todos/bulk/delete', json=body).status_code == 400
+    assert client.get(f'/api/v1/todos/{todo_id}').status_code == 200
+
+
+def test_import_rejects_non_string_status(client):
+    body = '{"title": "imported", "due_time": "2030-01-01T10:00", "status": ["s"]}\n'
+    response = client.post('/api/v1/todos/import', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert response.json['rejected'] == 1
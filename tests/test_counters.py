@@ -0,0 +1,62 @@
+"""The stored per-status counters stay equal to COUNT(*) by status under concurrent writes."""
+
+import random
+import threading
+from datetime import datetime, timedelta
+
+from app import db, services
+from app.models import Todo, User
+
+THREADS = 8
+OPS = 40
+
+
+def stored_and_counted(user_id):
+    user = db.session.get(User, user_id)
+    stored = {'p': user.pending, 's': user.success, 'f': user.failure}
+    counted = {'p': 0, 's': 0, 'f': 0}
+    counted.update(db.session.execute(
+        db.select(Todo.status, db.func.count()).where(Todo.user_id == user_id).group_by(Todo.status)
+    ).all())
+    return stored, counted
+
+
+def test_counters_match_counts_after_concurrent_writes(app, client):
+    response = client.post('/api/v1/todos', json={'title': 'seed', 'due_time': '2030-01-01T10:00'})
+    assert response.status_code == 201
+    with app.app_context():
+        user_id = db.session.get(Todo, response.json['todo']['todo_id']).user_id
+        user = db.session.get(User, user_id)
+        due_time = datetime.now() + timedelta(days=1)
+        todo_ids = [services.create_todo(user, f'todo {i}', due_time).todo_id for i in range(20)]
+        db.session.remove()
+
+    errors = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        with app.app_context():
+            try:
+                for _ in range(OPS):
+                    user = db.session.get(User, user_id)
+                    todo_id = rng.choice(todo_ids)
+                    if rng.random() < 0.1:
+                        services.delete_todo(user, todo_id)
+                    else:
+                        services.change_status(user, todo_id, rng.choice('psf'))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    with app.app_context():
+        stored, counted = stored_and_counted(user_id)
+        db.session.remove()
+    assert stored == counted
@@ -0,0 +1,93 @@
+"""Events published by writes, broker selection, the per-process stream cap, and the dashboard's fallback poll against its own ETag."""
+
+import json
+import queue
+import re
+from datetime import datetime, timedelta
+import pytest
+
+from app import db, events, services
+from app.groupcommit import committer
+from app.models import Todo, User
+
+
+def user_id_of(app, client):
+    response = client.post('/api/v1/todos', json={'title': 'whose', 'due_time': '2030-01-01T10:00'})
+    assert response.status_code == 201
+    with app.app_context():
+        user_id = db.session.get(Todo, response.json['todo']['todo_id']).user_id
+        db.session.remove()
+    return user_id
+
+
+def page_etag(client):
+    response = client.get('/list?todo_status=p')
+    assert response.status_code == 200
+    match = re.search(r'const pageETag=(.*)', response.get_data(as_text=True))
+    return json.loads(match.group(1))
+
+
+def test_poll_is_not_modified_until_a_todo_changes(client):
+    etag = page_etag(client)
+    assert client.head('/list?todo_status=p', headers={'If-None-Match': etag}).status_code == 304
+    response = client.post('/api/v1/todos', json={'title': 'changed elsewhere', 'due_time': '2030-01-01T10:00'})
+    assert response.status_code == 201
+    assert client.head('/list?todo_status=p', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_memory_url_selects_the_local_broker(app, monkeypatch):
+    monkeypatch.setattr(events, 'broker', None)
+    monkeypatch.setitem(app.config, 'EVENTS_BROKER_URL', 'memory://')
+    events.init_events(app)
+    assert isinstance(events.broker, events.LocalBroker)
+
+
+def test_unsupported_broker_url(app, monkeypatch):
+    monkeypatch.setattr(events, 'broker', events.broker)
+    monkeypatch.setitem(app.config, 'EVENTS_BROKER_URL', 'kafka://localhost')
+    with pytest.raises(ValueError):
+        events.init_events(app)
+
+
+def test_streams_over_the_cap_get_503(login, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'EVENTS_MAX_STREAMS', 1)
+    first, second = login(), login()
+    stream = first.get('/events', buffered=False)
+    assert stream.status_code == 200
+    refused = second.get('/events', buffered=False)
+    assert refused.status_code == 503
+    assert 'Retry-After' in refused.headers
+    # Closing a stream, even one never read, frees its slot and its subscription
+    stream.close()
+    assert not events.broker.has_subscribers(user_id_of(app, first))
+    again = second.get('/events', buffered=False)
+    assert again.status_code == 200
+    again.close()
+
+
+@pytest.mark.parametrize('group_commit', [False, True])
+def test_writes_publish_todo_events_after_the_commit(app, client, monkeypatch, group_commit):
+    monkeypatch.setattr(committer, 'enabled', group_commit)
+    user_id = user_id_of(app, client)
+    q = events.broker.subscribe(user_id)
+    try:
+        with app.app_context():
+            todo = services.create_todo(db.session.get(User, user_id), 'watched', datetime.now() + timedelta(days=1))
+            event_type, data = q.get(timeout=5)
+            assert event_type == 'todo'
+            assert (data['action'], data['todo_id'], data['status']) == ('created', todo.todo_id, 'p')
+            assert data['counters']['pending'] == 2
+
+            services.change_status(db.session.get(User, user_id), todo.todo_id, 's')
+            event_type, data = q.get(timeout=5)
+            assert event_type == 'todo'
+            assert (data['action'], data['todo_id'], data['status']) == ('status', todo.todo_id, 's')
+            assert (data['counters']['pending'], data['counters']['success']) == (1, 1)
+            # Published after the commit: another connection already sees the change
+            with db.engine.connect() as connection:
+                assert connection.scalar(db.select(Todo.status).where(Todo.todo_id == todo.todo_id)) == 's'
+            with pytest.raises(queue.Empty):
+                q.get_nowait()
+            db.session.remove()
+    finally:
+        events.broker.unsubscribe(user_id, q)
@@ -0,0 +1,93 @@
+"""Group commit runs a batch of todo writes in a single transaction."""
+
+import itertools
+from datetime import datetime
+import pytest
+from app import db, services
+from app.groupcommit import committer, Mutation, WriteTimeout
+from app.models import User
+
+DUE_TIME = datetime(2030, 1, 1, 10, 0)
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def user_id(app):
+    with app.app_context():
+        user = User(
+            first_name='Group', middle_name='', last_name='Commit', user_name=f'batch{next(_names)}', password='Passw0rd!'
+        )
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def run_traced(app, mutations):
+    """Runs one batch and returns the statements SQLite executed for it."""
+    with app.app_context():
+        connection = db.session.connection()
+        if connection.dialect.name != 'sqlite':
+            pytest.skip("traces SQLite's statements")
+        driver_connection = connection.connection.driver_connection
+        statements = []
+        driver_connection.set_trace_callback(statements.append)
+        try:
+            committer.run_batch(mutations)
+        finally:
+            driver_connection.set_trace_callback(None)
+            db.session.remove()
+    return [statement.split()[0].upper() for statement in statements]
+
+
+def test_batch_commits_once(app, user_id):
+    mutations = [Mutation(services.insert_todo, (user_id, f'batched {i}', DUE_TIME)) for i in range(4)]
+    statements = run_traced(app, mutations)
+    assert statements.count('BEGIN') == 1
+    assert statements.count('COMMIT') == 1
+    assert statements.count('SAVEPOINT') == 4
+    assert all(mutation.done.is_set() and mutation.error is None for mutation in mutations)
+    with app.app_context():
+        assert db.session.get(User, user_id).pending == 4
+
+
+def test_failed_mutation_is_rolled_back_alone(app, user_id):
+    mutations = [
+        Mutation(services.insert_todo, (user_id, 'valid title', DUE_TIME)),
+        Mutation(services.insert_todo, (user_id, 'x', DUE_TIME)),
+        Mutation(services.insert_todo, (user_id, 'another valid title', DUE_TIME)),
+    ]
+    statements = run_traced(app, mutations)
+    assert statements.count('COMMIT') == 1
+    assert isinstance(mutations[1].error, ValueError)
+    assert mutations[0].error is None and mutations[2].error is None
+    with app.app_context():
+        assert db.session.get(User, user_id).pending == 2
+
+
+def test_withdrawn_mutation_is_skipped(app, user_id):
+    mutation = Mutation(services.insert_todo, (user_id, 'never applied', DUE_TIME))
+    assert mutation.cancel()
+    run_traced(app, [mutation])
+    assert not mutation.done.is_set()
+    with app.app_context():
+        assert db.session.get(User, user_id).pending == 0
+
+
+def test_write_timeout_answers_503(client, monkeypatch):
+    def submit(fn, *args):
+        raise WriteTimeout("Write was not started in time")
+    monkeypatch.setattr(committer, 'enabled', True)
+    monkeypatch.setattr(committer, 'submit', submit)
+    response = client.post('/api/v1/todos', json={'title': 'slow write', 'due_time': '2030-01-01T10:00'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert client.post('/create', data={'title': 'slow write', 'due_time': '2030-01-01T10:00'}).status_code == 503
+
+
+def test_api_writes_through_group_commit(client, monkeypatch):
+    monkeypatch.setattr(committer, 'enabled', True)
+    response = client.post('/api/v1/todos', json={'title': 'grouped', 'due_time': '2030-01-01T10:00'})
+    assert response.status_code == 201
+    todo_id = response.json['todo']['todo_id']
+    assert client.put(f'/api/v1/todos/{todo_id}/status', json={'status': 's'}).json['counters']['success'] == 1
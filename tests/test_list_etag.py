@@ -0,0 +1,30 @@
+"""The /list ETag and counters follow writes made by other processes, whatever the user cache holds."""
+
+from app import db, user_cache
+from app.models import Todo, User
+
+
+def test_write_by_another_process_changes_the_page(app, client):
+    response = client.post('/api/v1/todos', json={'title': 'first', 'due_time': '2030-01-01T10:00'})
+    assert response.status_code == 201
+    first = client.get('/list?todo_status=p')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    with app.app_context():
+        user_id = db.session.get(Todo, response.json['todo']['todo_id']).user_id
+        assert user_cache.local_cache.get(user_id) is not None
+        # Another worker's write: this process's cached user is left as it was
+        db.session.execute(
+            db.update(User).where(User.id == user_id)
+            .values(todo_version=User.todo_version + 1, pending=User.pending + 41)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        db.session.remove()
+    assert user_cache.local_cache.get(user_id) is not None
+
+    second = client.get('/list?todo_status=p', headers={'If-None-Match': etag})
+    assert second.status_code == 200
+    assert second.headers['ETag'] != etag
+    assert '</a> 42' in second.get_data(as_text=True)
@@ -0,0 +1,35 @@
+"""The /list dashboard runs a fixed number of SQL statements, however many todos it shows."""
+
+from prometheus_client import REGISTRY
+
+
+def list_queries(client, path='/list?todo_status=p'):
+    """SQL statements of one /list render, from the per-request instrumentation."""
+    labels = {'endpoint': 'main.list'}
+    before = REGISTRY.get_sample_value('request_sql_queries_sum', labels) or 0
+    response = client.get(path)
+    assert response.status_code == 200
+    return REGISTRY.get_sample_value('request_sql_queries_sum', labels) - before
+
+
+def create(client, count):
+    for i in range(count):
+        response = client.post('/api/v1/todos', json={'title': f'todo number {i}', 'due_time': '2030-01-01T10:00'})
+        assert response.status_code == 201
+
+
+def test_list_query_count_does_not_grow_with_todos(client):
+    create(client, 1)
+    one = list_queries(client)
+    create(client, 40)
+    many = list_queries(client)
+    assert many == one
+    assert many <= 3
+
+
+def test_list_query_count_for_completed_todos(client):
+    create(client, 3)
+    todo_ids = [todo['todo_id'] for todo in client.get('/api/v1/todos?todo_status=p').json['todos']]
+    for todo_id in todo_ids:
+        assert client.put(f'/api/v1/todos/{todo_id}/status', json={'status': 's'}).status_code == 200
+    assert list_queries(client, '/list?todo_status=s') <= 3
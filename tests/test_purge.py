@@ -0,0 +1,58 @@
+"""Purge jobs run in the request without a scheduler and give up on persistent errors; /delete_users is for admins only."""
+
+from sqlalchemy.exc import OperationalError
+
+from app import db, purge
+from app.models import PurgeJob
+
+
+def test_delete_runs_in_the_request_without_a_scheduler(client):
+    for i in range(3):
+        response = client.post('/api/v1/todos', json={'title': f'todo {i}', 'due_time': '2030-01-01T10:00'})
+        assert response.status_code == 201
+    response = client.get('/delete')
+    assert response.status_code == 202
+    job = client.get(response.headers['Location']).json
+    assert job['status'] == 'done'
+    assert job['deleted'] == 3
+    assert client.get('/api/v1/todos?todo_status=p').json['todos'] == []
+
+
+def test_delete_users_needs_a_login(app):
+    response = app.test_client().get('/delete_users')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+
+def test_delete_users_needs_an_admin(app, client):
+    with app.app_context():
+        jobs = db.session.query(PurgeJob).count()
+        assert client.get('/delete_users').status_code == 403
+        assert db.session.query(PurgeJob).count() == jobs
+
+
+def test_request_gives_up_a_job_that_keeps_failing(client, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(purge.time, 'sleep', sleeps.append)
+
+    def locked(self, now):
+        raise OperationalError("SELECT", {}, Exception("database is locked"))
+    monkeypatch.setattr(purge.PurgeRunner, 'claim', locked)
+
+    response = client.get('/delete')
+    assert response.status_code == 202
+    assert len(sleeps) == purge.MAX_ERRORS - 1
+    assert all(seconds >= purge.INLINE_RETRY_SECONDS for seconds in sleeps)
+    monkeypatch.undo()
+    job = client.get(response.headers['Location']).json
+    assert job['status'] == 'failed'
+    assert 'database is locked' in job['error']
+
+
+def test_users_job_progress_is_for_admins_only(app, client):
+    with app.app_context():
+        job = purge.queue_job('users', None, 0, 0)
+        url = f'/purges/{job.id}'
+        db.session.remove()
+    assert app.test_client().get(url).status_code == 302
+    assert client.get(url).status_code == 404
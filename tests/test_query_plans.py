@@ -0,0 +1,21 @@
+"""Every query /list can issue is an index search, never a table scan (SQLite `EXPLAIN QUERY PLAN`)."""
+
+from datetime import datetime
+import pytest
+
+from app import db
+from app.cli import explain_query_plan, is_table_scan, list_query_variants
+
+
+def test_list_queries_use_an_index(app):
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            pytest.skip("EXPLAIN QUERY PLAN is SQLite's")
+        scans = {}
+        for name, statement in list_query_variants(datetime.now()):
+            plan = explain_query_plan(statement)
+            assert plan, name
+            steps = [detail for detail in plan if is_table_scan(detail)]
+            if steps:
+                scans[name] = steps
+    assert not scans
@@ -0,0 +1,42 @@
+"""Login rate limits: per client IP, and per username across IPs for failed attempts."""
+
+import pytest
+from app import ratelimit
+from app.kvstore import MemoryStore
+from tests.conftest import PASSWORD
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(ratelimit, 'store', MemoryStore())
+    monkeypatch.setitem(ratelimit.limits, ('login', 'ip'), (5, 60))
+    monkeypatch.setitem(ratelimit.limits, ('login', 'username'), (2, 60))
+
+
+def attempt(app, user_name, ip, password='wrong'):
+    client = app.test_client()
+    client.environ_base['REMOTE_ADDR'] = ip
+    return client.post('/login', json={'user_name': user_name, 'password': password}).status_code
+
+
+def test_failed_logins_are_limited_per_username_across_ips(app, limits):
+    assert attempt(app, 'victim', '10.0.0.1') == 200
+    assert attempt(app, 'Victim', '10.0.0.2') == 200
+    assert attempt(app, 'victim', '10.0.0.3') == 429
+    assert attempt(app, 'someone', '10.0.0.3') == 200
+
+
+def test_successful_logins_do_not_drain_the_username_bucket(app, limits):
+    app.test_client().post('/signup', data={
+        'first_name': 'Rate', 'last_name': 'Limited', 'user_name': 'ratelimited',
+        'password': PASSWORD, 'confirm_password': PASSWORD,
+    })
+    assert [attempt(app, 'ratelimited', '10.0.2.1', PASSWORD) for _ in range(4)] == [200] * 4
+    assert attempt(app, 'ratelimited', '10.0.2.1') == 200
+
+
+def test_ip_bucket_is_charged_first(app, limits):
+    for i in range(5):
+        assert attempt(app, f'someone{i}', '10.0.1.1') == 200
+    assert attempt(app, 'victim', '10.0.1.1') == 429
+    assert attempt(app, 'victim', '10.0.1.2') == 200
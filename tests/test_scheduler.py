@@ -0,0 +1,87 @@
+"""Deadline scheduler: boundaries on a fake clock, targeted cache invalidation and the single-process rescan lock."""
+
+from datetime import datetime, timedelta
+import pytest
+
+from app import db, services, user_cache
+from app.events import LocalBroker
+from app.models import Todo, User
+from app.scheduler import DeadlineScheduler, RescanLock
+
+
+def create_urgent_todo(client):
+    due_time = (datetime.now() + timedelta(minutes=30)).strftime("%Y-%m-%dT%H:%M")
+    response = client.post('/api/v1/todos', json={'title': 'due soon', 'due_time': due_time})
+    assert response.status_code == 201
+    return db.session.get(Todo, response.json['todo']['todo_id']).user_id
+
+
+def test_rescan_invalidates_only_changed_users(app, login, monkeypatch):
+    with app.app_context():
+        stale, current = create_urgent_todo(login()), create_urgent_todo(login())
+        db.session.execute(db.update(User).where(User.id == stale).values(urgent=0))
+        db.session.commit()
+
+        invalidated = []
+        monkeypatch.setattr(user_cache, 'invalidate', lambda *ids: invalidated.extend(ids))
+        monkeypatch.setattr(user_cache, 'clear', lambda: pytest.fail("rescan cleared the whole user cache"))
+        DeadlineScheduler(LocalBroker()).update_counters(None, datetime.now())
+
+        assert stale in invalidated
+        assert current not in invalidated
+        assert db.session.get(User, stale).urgent == 1
+        db.session.remove()
+
+
+def test_only_one_holder_of_the_rescan_lock(app):
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name not in ('sqlite', 'postgresql'):
+        pytest.skip("no rescan lock on this backend")
+    first, second = RescanLock(), RescanLock()
+    try:
+        assert first.acquire(engine)
+        assert first.acquire(engine)
+        assert not second.acquire(engine)
+        first.release()
+        assert second.acquire(engine)
+    finally:
+        first.release()
+        second.release()
+
+
+def test_boundaries_with_a_fake_clock(app, client):
+    start = datetime.now()
+    clock = [start]
+    broker = LocalBroker()
+    scheduler = DeadlineScheduler(broker, clock=lambda: clock[0], rescan=3600)
+    response = client.post('/api/v1/todos', json={'title': 'far off', 'due_time': '2030-01-01T10:00'})
+    assert response.status_code == 201
+    with app.app_context():
+        user_id = db.session.get(Todo, response.json['todo']['todo_id']).user_id
+        services.create_todo(db.session.get(User, user_id), 'due in 61 minutes', start + timedelta(minutes=61))
+        q = broker.subscribe(user_id)
+
+        def counters():
+            db.session.rollback()
+            return db.session.execute(db.select(User.urgent, User.overdue, User.todo_version).where(User.id == user_id)).one()
+
+        try:
+            scheduler.run_pending()
+            urgent, overdue, version = counters()
+            assert (urgent, overdue) == (0, 0)
+            assert q.empty()
+
+            # Urgent from an hour before the due time, overdue once it passed
+            for minutes, expected in ((2, (1, 0)), (62, (0, 1))):
+                clock[0] = start + timedelta(minutes=minutes)
+                scheduler.run_pending()
+                urgent, overdue, bumped = counters()
+                assert (urgent, overdue) == expected
+                assert bumped == version + 1
+                assert q.get_nowait() == ('deadline', {'urgent': urgent, 'overdue': overdue})
+                version = bumped
+        finally:
+            broker.unsubscribe(user_id, q)
+            scheduler.rescan_lock.release()
+            db.session.remove()
@@ -0,0 +1,17 @@
+"""
+Production WSGI entry point.
+
+Serve with Gunicorn (see `gunicorn.conf.py`):
+    gunicorn --config gunicorn.conf.py wsgi:app
+
+Unlike `run.py`, this never enables the Werkzeug debugger or reloader, whatever
+`FLASK_DEBUG` says, and `/metrics` is served by the app's `PrometheusMetrics`,
+which aggregates all workers when `PROMETHEUS_MULTIPROC_DIR` is set.
+"""
+from app import create_app
+
+# Create the Flask application
+app = create_app()
+
+# The interactive debugger allows arbitrary code execution, never serve it
+app.debug = False